@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -7,15 +8,22 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User
+from app.core.config import settings
+from app.utils.ttl_cache import TTLCache
 
 # Configuration
 SECRET_KEY = "your-secret-key-change-this-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 security = HTTPBearer()
 
+# Verified token -> subject, kept until the token's own expiry
+token_cache = TTLCache(max_size=settings.AUTH_TOKEN_CACHE_SIZE, ttl_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# Subject -> detached User row
+user_cache = TTLCache(max_size=settings.AUTH_USER_CACHE_SIZE, ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -32,6 +40,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def verify_token(token: str) -> Optional[str]:
+    """Return the token's subject, decoding and verifying the JWT only on a cache miss"""
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username = payload.get("sub")
+    if username is None:
+        return None
+    exp = payload.get("exp")
+    ttl = exp - time.time() if exp is not None else None
+    if ttl is None or ttl > 0:
+        token_cache.set(token, username, ttl=ttl)
+    return username
+
+def invalidate_user(username: str):
+    """
+    Drop a cached principal; call whenever the user row changes.
+
+    Only this worker's cache is cleared: other workers keep serving the old row
+    for up to ``AUTH_USER_CACHE_TTL_SECONDS``.
+    """
+    user_cache.pop(username)
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -39,15 +71,26 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        username = verify_token(credentials.credentials)
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+    
     user = db.query(User).filter(User.username == username).first()
     if user is None:
         raise credentials_exception
+    # Detach so the cached row survives this request's session
+    db.expunge(user)
+    user_cache.set(username, user)
     return user
+
+def auth_cache_stats():
+    return {
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats(),
+    }
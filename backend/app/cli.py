@@ -0,0 +1,183 @@
+"""
+Maintenance commands for the Uni Chat database.
+
+Usage:
+    python -m app.cli backfill-search [--batch-size 1000] [--rebuild]
+    python -m app.cli recompress [--batch-size 200] [--vacuum]
+    python -m app.cli export-history --user NAME [--output history.ndjson]
+    python -m app.cli import-history --user NAME --input history.ndjson [--llm-config-id ID] [--batch-size 1000]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.crud import get_user_by_username, get_user_llm_configs
+from app.database import AsyncSessionLocal, SessionLocal, engine, init_db
+from app.services.history_transfer import history_transfer, split_lines
+from app.services.recompression import recompressor
+from app.services.search_index import search_index
+
+
+def backfill_search(args) -> int:
+    db = SessionLocal()
+    started = time.perf_counter()
+
+    def progress(added: int, last_id: int):
+        print(f"  indexed {added} messages (up to id {last_id}, {time.perf_counter() - started:.1f}s)")
+
+    try:
+        added = search_index.backfill(db, batch_size=args.batch_size, rebuild=args.rebuild, on_progress=progress)
+    except RuntimeError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    print(f"Search index backfill complete: {added} messages added in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def _file_size(db) -> int:
+    page_size = db.execute(text("PRAGMA page_size")).scalar()
+    pages = db.execute(text("PRAGMA page_count")).scalar() - db.execute(text("PRAGMA freelist_count")).scalar()
+    return pages * page_size
+
+
+def recompress(args) -> int:
+    if engine.dialect.name != "sqlite":
+        print("error: message compression only applies to SQLite databases", file=sys.stderr)
+        return 1
+    if recompressor.threshold <= 0:
+        print("error: MESSAGE_COMPRESSION_THRESHOLD_BYTES is 0, compression is disabled", file=sys.stderr)
+        return 1
+    recompressor.batch_size = args.batch_size
+    recompressor.pause = 0
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        before = _file_size(connection)
+
+    def progress(compressed: int, last_id: int):
+        print(f"  compressed {compressed} messages (up to id {last_id}, {time.perf_counter() - started:.1f}s)")
+
+    compressed = recompressor.run_once(on_progress=progress)
+    with engine.connect() as connection:
+        if args.vacuum:
+            connection.execute(text("VACUUM"))
+        after = _file_size(connection)
+    stats = recompressor.stats()
+    print(
+        f"Recompression complete: {compressed} messages, bodies {stats['bytes_before']} -> {stats['bytes_after']} bytes, "
+        f"database pages in use {before} -> {after} bytes in {time.perf_counter() - started:.1f}s"
+    )
+    if not args.vacuum:
+        print("Freed pages are reused by new writes; run with --vacuum to shrink the file")
+    return 0
+
+
+def _find_user(db, username: str):
+    user = get_user_by_username(db, username)
+    if user is None:
+        print(f"error: no user named {username!r}", file=sys.stderr)
+    return user
+
+
+def export_history(args) -> int:
+    db = SessionLocal()
+    started = time.perf_counter()
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        user = _find_user(db, args.user)
+        if user is None:
+            return 1
+        written = 0
+        for chunk in history_transfer.export_chunks(db, user.id):
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        db.close()
+    print(f"Exported {written} bytes in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+async def _file_chunks(path: str, size: int = 1024 * 1024):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def import_history(args) -> int:
+    db = SessionLocal()
+    try:
+        user = _find_user(db, args.user)
+        if user is None:
+            return 1
+        configs = get_user_llm_configs(db, user.id)
+        config_ids = [c.id for c in sorted(configs, key=lambda c: not c.is_default)]
+    finally:
+        db.close()
+    config_id = args.llm_config_id or (config_ids[0] if config_ids else None)
+    if config_id not in config_ids:
+        print(f"error: {args.user} has no LLM configuration {config_id or ''} to attach sessions to", file=sys.stderr)
+        return 1
+
+    def progress(state):
+        print(f"  {state['sessions']} sessions, {state['messages']} messages "
+              f"({state['messages'] / max(state['seconds'], 1e-9):.0f}/s, {state['rejected']} rejected)")
+
+    async def run():
+        async with AsyncSessionLocal() as adb:
+            lines = split_lines(_file_chunks(args.input), history_transfer.max_line_bytes)
+            return await history_transfer.import_lines(
+                adb, user.id, config_id, lines, batch_size=args.batch_size, on_progress=progress
+            )
+
+    result = asyncio.run(run())
+    for error in result["errors"]:
+        print(f"  rejected {error}", file=sys.stderr)
+    print(f"Import complete: {result['sessions']} sessions, {result['messages']} messages, "
+          f"{result['rejected']} lines rejected in {result['seconds']:.1f}s")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-search", help="index messages written before full-text search existed")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    backfill.add_argument("--rebuild", action="store_true", help="drop the index contents and rebuild from scratch")
+    backfill.set_defaults(handler=backfill_search)
+
+    pack = commands.add_parser("recompress", help="compress message bodies stored before compression was enabled")
+    pack.add_argument("--batch-size", type=int, default=200)
+    pack.add_argument("--vacuum", action="store_true", help="rebuild the database file afterwards to return freed space")
+    pack.set_defaults(handler=recompress)
+
+    export = commands.add_parser("export-history", help="write a user's sessions and messages as NDJSON")
+    export.add_argument("--user", required=True, help="username")
+    export.add_argument("--output", default="-", help="file to write (default: stdout)")
+    export.set_defaults(handler=export_history)
+
+    load = commands.add_parser("import-history", help="add the sessions of an NDJSON export to a user")
+    load.add_argument("--user", required=True, help="username")
+    load.add_argument("--input", required=True, help="NDJSON file from export-history or /users/me/history/export")
+    load.add_argument("--llm-config-id", type=int, help="config for the imported sessions (default: the user's default)")
+    load.add_argument("--batch-size", type=int, default=None, help="messages per transaction")
+    load.set_defaults(handler=import_history)
+
+    args = parser.parse_args(argv)
+    # Creates the FTS table on databases that predate it
+    init_db()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
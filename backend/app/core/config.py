@@ -5,12 +5,128 @@ load_dotenv()
 
 class Settings:
     GROQ_API_KEY: str = os.getenv('GROQ_API_KEY')
+    GROQ_API_BASE: str = os.getenv('GROQ_API_BASE', 'https://api.groq.com/openai/v1')
     
     # Server configuration
     PORT: int = int(os.getenv('PORT', 8000))
     HOST: str = os.getenv('HOST', '127.0.0.1')
+    # Worker processes for `start_server.py`; more than one switches to the production launch mode
+    WORKERS: int = int(os.getenv('WORKERS', 1))
     
     # Database configuration
     DATABASE_URL: str = os.getenv('DATABASE_URL', 'sqlite:///./uni_chat.db')
+    # Optional override for the asyncio engine; derived from DATABASE_URL when unset
+    ASYNC_DATABASE_URL: str = os.getenv('ASYNC_DATABASE_URL')
+    # SQLite settings that let several worker processes share one database file
+    SQLITE_JOURNAL_MODE: str = os.getenv('SQLITE_JOURNAL_MODE', 'wal')
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # Storage profile: 'tuned' (reader pool + single writer, tuned pragmas) or 'basic'
+    STORAGE_PROFILE: str = os.getenv('STORAGE_PROFILE', 'tuned')
+    SQLITE_SYNCHRONOUS: str = os.getenv('SQLITE_SYNCHRONOUS', 'normal')
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16 * 1024))
+    SQLITE_MMAP_SIZE_BYTES: int = int(os.getenv('SQLITE_MMAP_SIZE_BYTES', 256 * 1024 * 1024))
+    SQLITE_READER_POOL_SIZE: int = int(os.getenv('SQLITE_READER_POOL_SIZE', 8))
+    SQLITE_WRITER_TIMEOUT_SECONDS: float = float(os.getenv('SQLITE_WRITER_TIMEOUT_SECONDS', 30))
+
+    # LLM client pool configuration
+    LLM_CLIENT_CACHE_SIZE: int = int(os.getenv('LLM_CLIENT_CACHE_SIZE', 128))
+    LLM_CLIENT_TTL_SECONDS: float = float(os.getenv('LLM_CLIENT_TTL_SECONDS', 900))
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', 100))
+    LLM_HTTP_MAX_KEEPALIVE: int = int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', 20))
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', 60))
+
+    # Per-session conversation history cache
+    HISTORY_CACHE_MAX_BYTES: int = int(os.getenv('HISTORY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    # Context window budgeting
+    CONTEXT_DEFAULT_TOKEN_BUDGET: int = int(os.getenv('CONTEXT_DEFAULT_TOKEN_BUDGET', 8192))
+    CONTEXT_RESPONSE_RESERVE: int = int(os.getenv('CONTEXT_RESPONSE_RESERVE', 1024))
+
+    # WebSocket frame coalescing defaults (clients opt in with ?coalesce=1)
+    STREAM_COALESCE_MAX_BYTES: int = int(os.getenv('STREAM_COALESCE_MAX_BYTES', 512))
+    STREAM_COALESCE_MAX_MS: float = float(os.getenv('STREAM_COALESCE_MAX_MS', 50))
+
+    # Write-behind persistence of chat messages
+    MESSAGE_WRITE_INTERVAL_MS: float = float(os.getenv('MESSAGE_WRITE_INTERVAL_MS', 50))
+    MESSAGE_WRITE_MAX_BATCH: int = int(os.getenv('MESSAGE_WRITE_MAX_BATCH', 500))
+    # Wait for the commit before acknowledging each message
+    MESSAGE_WRITE_DURABLE: bool = os.getenv('MESSAGE_WRITE_DURABLE', 'false').lower() == 'true'
+
+    # Authentication caches (per worker; a changed user row is seen everywhere within the TTL)
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+    AUTH_USER_CACHE_SIZE: int = int(os.getenv('AUTH_USER_CACHE_SIZE', 10000))
+    AUTH_USER_CACHE_TTL_SECONDS: float = float(os.getenv('AUTH_USER_CACHE_TTL_SECONDS', 60))
+
+    # Password hashing
+    BCRYPT_ROUNDS: int = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 32))
+
+    # Exact-match response cache for temperature=0 completions (opt-in; entries are scoped to the API key)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 2048))
+    RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+    RESPONSE_CACHE_REPLAY_DELAY_MS: float = float(os.getenv('RESPONSE_CACHE_REPLAY_DELAY_MS', 0))
+
+    # API key validation
+    API_KEY_VALIDATION_TIMEOUT: float = float(os.getenv('API_KEY_VALIDATION_TIMEOUT', 5))
+    API_KEY_VALIDATION_CACHE_TTL: float = float(os.getenv('API_KEY_VALIDATION_CACHE_TTL', 600))
+    API_KEY_VALIDATION_CACHE_SIZE: int = int(os.getenv('API_KEY_VALIDATION_CACHE_SIZE', 1024))
+
+    # Provider routing: hedge to a fallback config when the first token is late
+    HEDGE_PERCENTILE: float = float(os.getenv('HEDGE_PERCENTILE', 95))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv('HEDGE_MIN_SAMPLES', 20))
+    HEDGE_DEFAULT_DELAY_MS: float = float(os.getenv('HEDGE_DEFAULT_DELAY_MS', 2000))
+    HEDGE_LATENCY_WINDOW: int = int(os.getenv('HEDGE_LATENCY_WINDOW', 200))
+
+    # Admission control for outbound generations (per worker: N workers admit N times these)
+    ADMISSION_MAX_CONCURRENT: int = int(os.getenv('ADMISSION_MAX_CONCURRENT', 64))
+    ADMISSION_USER_MAX_CONCURRENT: int = int(os.getenv('ADMISSION_USER_MAX_CONCURRENT', 2))
+    ADMISSION_KEY_RPM: float = float(os.getenv('ADMISSION_KEY_RPM', 120))  # 0 disables the key bucket
+    ADMISSION_KEY_BURST: float = float(os.getenv('ADMISSION_KEY_BURST', 20))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv('ADMISSION_MAX_QUEUE', 256))
+    ADMISSION_BACKOFF_BASE_MS: float = float(os.getenv('ADMISSION_BACKOFF_BASE_MS', 1000))
+    ADMISSION_BACKOFF_MAX_MS: float = float(os.getenv('ADMISSION_BACKOFF_MAX_MS', 60000))
+
+    # Resumable generations
+    GENERATION_REPLAY_BUFFER_CHARS: int = int(os.getenv('GENERATION_REPLAY_BUFFER_CHARS', 256 * 1024))
+    GENERATION_RETENTION_SECONDS: float = float(os.getenv('GENERATION_RETENTION_SECONDS', 300))
+    GENERATION_SHUTDOWN_GRACE_SECONDS: float = float(os.getenv('GENERATION_SHUTDOWN_GRACE_SECONDS', 10))
+    # Cancel a generation this long after its last reader disconnected, unless one reattached (negative disables)
+    GENERATION_DISCONNECT_GRACE_SECONDS: float = float(os.getenv('GENERATION_DISCONNECT_GRACE_SECONDS', 10))
+
+    # Single-flight de-duplication of identical concurrent generations
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLE_FLIGHT_BUFFER_CHARS: int = int(os.getenv('SINGLE_FLIGHT_BUFFER_CHARS', 256 * 1024))
+
+    # Cross-worker coordination of generations and session caches: 'inprocess' or 'local-socket'
+    COORDINATION_BACKEND: str = os.getenv('COORDINATION_BACKEND', 'inprocess')
+    # Unix socket path, or tcp://host:port
+    COORDINATION_ADDRESS: str = os.getenv('COORDINATION_ADDRESS', './uni_chat_coordinator.sock')
+    # How long a resume waits for a generation running on another worker to finish
+    COORDINATION_RESUME_WAIT_SECONDS: float = float(os.getenv('COORDINATION_RESUME_WAIT_SECONDS', 120))
+
+    # Full-text search over chat messages (SQLite FTS5)
+    SEARCH_ENABLED: bool = os.getenv('SEARCH_ENABLED', 'true').lower() == 'true'
+    SEARCH_SNIPPET_TOKENS: int = int(os.getenv('SEARCH_SNIPPET_TOKENS', 12))
+
+    # Message bodies of at least this many bytes are stored zlib-compressed (0 disables)
+    MESSAGE_COMPRESSION_THRESHOLD_BYTES: int = int(os.getenv('MESSAGE_COMPRESSION_THRESHOLD_BYTES', 1024))
+    MESSAGE_COMPRESSION_LEVEL: int = int(os.getenv('MESSAGE_COMPRESSION_LEVEL', 6))
+
+    # Background pass that compresses rows written before compression (0 disables)
+    RECOMPRESS_INTERVAL_SECONDS: float = float(os.getenv('RECOMPRESS_INTERVAL_SECONDS', 3600))
+    RECOMPRESS_BATCH_SIZE: int = int(os.getenv('RECOMPRESS_BATCH_SIZE', 200))
+    RECOMPRESS_PAUSE_MS: float = float(os.getenv('RECOMPRESS_PAUSE_MS', 50))
+
+    # Streaming NDJSON history export/import
+    HISTORY_IMPORT_BATCH_SIZE: int = int(os.getenv('HISTORY_IMPORT_BATCH_SIZE', 1000))
+    HISTORY_EXPORT_CHUNK_BYTES: int = int(os.getenv('HISTORY_EXPORT_CHUNK_BYTES', 64 * 1024))
+    HISTORY_IMPORT_MAX_LINE_BYTES: int = int(os.getenv('HISTORY_IMPORT_MAX_LINE_BYTES', 16 * 1024 * 1024))
+
+    # Server-Sent Events chat stream
+    SSE_HEARTBEAT_SECONDS: float = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_QUEUE_FRAMES: int = int(os.getenv('SSE_QUEUE_FRAMES', 16))
+    SSE_RETRY_MS: int = int(os.getenv('SSE_RETRY_MS', 2000))
 
 settings = Settings()
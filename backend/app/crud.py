@@ -1,8 +1,16 @@
-from sqlalchemy.orm import Session
-from app.models import User, UserLLMConfig, ChatSession, ChatMessage, LLMProvider
+import base64
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, case, delete, insert, select, tuple_, update
+from sqlalchemy.orm import Session, selectinload, undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import User, UserLLMConfig, ChatSession, ChatMessage, LLMProvider, CachedResponse
 from app.schemas import UserCreate, LLMConfigCreate, ChatSessionCreate, ChatMessageCreate
 from app.auth import get_password_hash
-from typing import Optional
+from app.services.search_index import search_index
+from app.utils.tokens import estimate_tokens
+from typing import Optional, List, Dict, Any, Tuple
 
 # User CRUD
 def create_user(db: Session, user: UserCreate):
@@ -23,6 +31,30 @@ def get_user_by_username(db: Session, username: str):
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
+async def create_user_async(db: AsyncSession, user: UserCreate, password_hash: str):
+    db_user = User(
+        username=user.username,
+        email=user.email,
+        password_hash=password_hash
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def get_user_by_username_async(db: AsyncSession, username: str):
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
+
+async def update_user_password_hash_async(db: AsyncSession, user: User, password_hash: str):
+    user.password_hash = password_hash
+    await db.commit()
+    return user
+
 # LLM Config CRUD
 def create_llm_config(db: Session, config: LLMConfigCreate, user_id: int):
     db_config = UserLLMConfig(
@@ -62,19 +94,290 @@ def create_chat_session(db: Session, session: ChatSessionCreate, user_id: int):
 def get_user_chat_sessions(db: Session, user_id: int):
     return db.query(ChatSession).filter(ChatSession.user_id == user_id).order_by(ChatSession.created_at.desc()).all()
 
+def encode_session_cursor(last_activity: datetime, session_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{last_activity.isoformat()}|{session_id}".encode()).decode()
+
+def decode_session_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of ``encode_session_cursor``; raises ValueError on anything else"""
+    try:
+        last_activity, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(last_activity), int(session_id)
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _session_summaries_query(user_id: int, limit: int, cursor: Optional[Tuple[datetime, int]]):
+    latest = (
+        select(ChatMessage.content)
+        .where(ChatMessage.session_id == ChatSession.id)
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        .limit(1)
+        .correlate(ChatSession)
+        .scalar_subquery()
+    )
+    query = (
+        select(
+            ChatSession.id, ChatSession.title, ChatSession.created_at, ChatSession.last_activity,
+            ChatSession.message_count, latest.label("preview"),
+        )
+        .where(ChatSession.user_id == user_id)
+        .order_by(ChatSession.last_activity.desc(), ChatSession.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        query = query.where(tuple_(ChatSession.last_activity, ChatSession.id) < tuple_(*cursor))
+    return query
+
+def get_user_session_summaries(
+    db: Session,
+    user_id: int,
+    limit: int = 20,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    preview_chars: int = 120,
+):
+    """
+    One page of a user's sessions, most recently active first, from a single query.
+
+    Each row carries the denormalized ``last_activity``/``message_count`` and the
+    latest message's text cut to ``preview_chars`` (the correlated subquery reads
+    one row through the session/timestamp index). ``cursor`` is the
+    ``(last_activity, id)`` of the previous page's last row. Returns the page
+    and the cursor of the next one, or None on the last page.
+    """
+    query = _session_summaries_query(user_id, limit, cursor)
+    rows = [dict(row) for row in db.execute(query).mappings()]
+    for row in rows:
+        preview = " ".join((row["preview"] or "").split())
+        row["preview"] = preview if len(preview) <= preview_chars else preview[:preview_chars - 1].rstrip() + "…"
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_session_cursor(last["last_activity"], last["id"])
+
 def get_chat_session(db: Session, session_id: int):
     return db.query(ChatSession).filter(ChatSession.id == session_id).first()
 
+_last_activity = bindparam("last_activity", type_=ChatSession.__table__.c.last_activity.type)
+_touch_session = (
+    update(ChatSession.__table__)
+    .where(ChatSession.__table__.c.id == bindparam("session_id"))
+    .values(
+        message_count=ChatSession.__table__.c.message_count + bindparam("added"),
+        # Never move backwards when another worker's batch (or an import) commits older messages later
+        last_activity=case(
+            (ChatSession.__table__.c.last_activity >= _last_activity, ChatSession.__table__.c.last_activity),
+            else_=_last_activity,
+        ),
+    )
+)
+
+def record_session_activity(db: Session, messages: List[ChatMessage]):
+    """Bump ``message_count``/``last_activity`` of the sessions of new messages, in the caller's transaction"""
+    activity: Dict[int, List[Any]] = defaultdict(lambda: [0, None])
+    for message in messages:
+        entry = activity[message.session_id]
+        entry[0] += 1
+        entry[1] = message.timestamp if entry[1] is None else max(entry[1], message.timestamp)
+    if activity:
+        db.execute(_touch_session, [
+            {"session_id": session_id, "added": added, "last_activity": last}
+            for session_id, (added, last) in activity.items()
+        ])
+
+def insert_chat_messages(db: Session, rows: List[Dict[str, Any]]) -> List[ChatMessage]:
+    """
+    Insert message rows with one executemany, in the caller's transaction.
+
+    SQLite can't return generated ids from a multi-row insert in a guaranteed
+    order, so the ORM would issue one INSERT per row. Instead the ids are read
+    back afterwards: the transaction holds the write lock, so the newest
+    ``len(rows)`` ids are these rows, in order. Returns detached ChatMessage
+    objects carrying the ids. Other databases use the ORM's batched RETURNING.
+    """
+    if not rows:
+        return []
+    if db.get_bind(clause=insert(ChatMessage)).dialect.name != "sqlite":
+        messages = [ChatMessage(**row) for row in rows]
+        db.add_all(messages)
+        db.flush()
+        return messages
+    db.execute(insert(ChatMessage.__table__), rows)
+    ids = db.execute(select(ChatMessage.id).order_by(ChatMessage.id.desc()).limit(len(rows))).scalars().all()
+    return [ChatMessage(id=message_id, **row) for message_id, row in zip(reversed(ids), rows)]
+
 def create_chat_message(db: Session, message: ChatMessageCreate, session_id: int):
     db_message = ChatMessage(
         session_id=session_id,
         role=message.role,
-        content=message.content
+        content=message.content,
+        token_count=estimate_tokens(message.content),
+        timestamp=datetime.now(timezone.utc),
     )
     db.add(db_message)
+    db.flush()
+    search_index.index(db, [db_message])
+    record_session_activity(db, [db_message])
     db.commit()
     db.refresh(db_message)
     return db_message
 
-def get_session_messages(db: Session, session_id: int):
-    return db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.timestamp.asc()).all()
+def search_user_messages(
+    db: Session,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    session_id: Optional[int] = None,
+):
+    """Ranked full-text matches among a user's messages; returns (page, has_more)"""
+    return search_index.search(db, user_id, query, limit=limit, offset=offset, session_id=session_id)
+
+def _message_cursor(message_id: int):
+    """(timestamp, id) of a message, matching the session/timestamp index order"""
+    cursor_timestamp = select(ChatMessage.timestamp).where(ChatMessage.id == message_id).scalar_subquery()
+    return tuple_(cursor_timestamp, message_id)
+
+def get_session_messages(
+    db: Session,
+    session_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    include_content: bool = True,
+):
+    """
+    Messages of a session in chronological order, optionally one keyset page.
+
+    ``after_id`` pages forward from a message, ``before_id`` pages backward and
+    returns the ``limit`` messages immediately preceding it (still oldest first).
+    Without ``include_content`` only the metadata columns are read.
+    """
+    position = tuple_(ChatMessage.timestamp, ChatMessage.id)
+    query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+    if include_content:
+        query = query.options(undefer(ChatMessage.content))
+    if after_id is not None:
+        query = query.filter(position > _message_cursor(after_id))
+    if before_id is not None:
+        query = query.filter(position < _message_cursor(before_id))
+
+    if before_id is not None and after_id is None and limit is not None:
+        page = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit).all()
+        return list(reversed(page))
+
+    query = query.order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def iter_session_messages(db: Session, session_id: int, batch_size: int = 500):
+    """Stream a session's messages in order without loading them all at once"""
+    query = (
+        select(ChatMessage)
+        .options(undefer(ChatMessage.content))
+        .filter(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+        .execution_options(yield_per=batch_size)
+    )
+    for message in db.execute(query).scalars():
+        yield message
+
+# Async CRUD (used by the WebSocket and async routes so they never block the event loop)
+async def create_llm_config_async(db: AsyncSession, config: LLMConfigCreate, user_id: int):
+    db_config = UserLLMConfig(
+        user_id=user_id,
+        provider_id=config.provider_id,
+        model_name=config.model_name,
+        api_key_encrypted=config.api_key,  # TODO: Add encryption
+        config_params=config.config_params,
+        is_default=config.is_default
+    )
+    db.add(db_config)
+    await db.commit()
+    await db.refresh(db_config)
+    return db_config
+
+async def get_user_llm_configs_async(db: AsyncSession, user_id: int):
+    result = await db.execute(select(UserLLMConfig).filter(UserLLMConfig.user_id == user_id))
+    return result.scalars().all()
+
+async def get_llm_config_by_id_async(db: AsyncSession, config_id: int):
+    result = await db.execute(
+        select(UserLLMConfig).options(selectinload(UserLLMConfig.provider)).filter(UserLLMConfig.id == config_id)
+    )
+    return result.scalars().first()
+
+async def get_llm_configs_by_ids_async(db: AsyncSession, user_id: int, config_ids: List[int]):
+    """A user's configs in the order of ``config_ids``; ids they do not own are skipped"""
+    if not config_ids:
+        return []
+    result = await db.execute(
+        select(UserLLMConfig)
+        .options(selectinload(UserLLMConfig.provider))
+        .filter(UserLLMConfig.user_id == user_id, UserLLMConfig.id.in_(config_ids))
+    )
+    by_id = {config.id: config for config in result.scalars().all()}
+    return [by_id[config_id] for config_id in config_ids if config_id in by_id]
+
+async def get_chat_session_async(db: AsyncSession, session_id: int):
+    result = await db.execute(select(ChatSession).filter(ChatSession.id == session_id))
+    return result.scalars().first()
+
+async def create_chat_message_async(db: AsyncSession, message: ChatMessageCreate, session_id: int):
+    db_message = ChatMessage(
+        session_id=session_id,
+        role=message.role,
+        content=message.content,
+        token_count=estimate_tokens(message.content),
+        timestamp=datetime.now(timezone.utc),
+    )
+    db.add(db_message)
+    await db.flush()
+    await db.run_sync(search_index.index, [db_message])
+    await db.run_sync(record_session_activity, [db_message])
+    await db.commit()
+    await db.refresh(db_message)
+    return db_message
+
+async def create_chat_messages_async(db: AsyncSession, messages: List[Dict[str, Any]]):
+    """Insert a batch of messages (and their search index rows) in a single transaction"""
+    db_messages = [ChatMessage(**values) for values in messages]
+    db.add_all(db_messages)
+    await db.flush()
+    await db.run_sync(search_index.index, db_messages)
+    await db.run_sync(record_session_activity, db_messages)
+    await db.commit()
+    return db_messages
+
+async def get_chat_message_async(db: AsyncSession, message_id: int):
+    result = await db.execute(
+        select(ChatMessage).options(undefer(ChatMessage.content)).filter(ChatMessage.id == message_id)
+    )
+    return result.scalars().first()
+
+async def get_session_messages_async(db: AsyncSession, session_id: int):
+    result = await db.execute(
+        select(ChatMessage)
+        .options(undefer(ChatMessage.content))
+        .filter(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+    )
+    return result.scalars().all()
+
+# Response cache CRUD
+async def get_cached_response_async(db: AsyncSession, key: str):
+    """Read-only lookup; hits are counted in memory so a read never takes the write lock"""
+    result = await db.execute(select(CachedResponse).filter(CachedResponse.key == key))
+    return result.scalars().first()
+
+async def save_cached_response_async(db: AsyncSession, key: str, model_name: str, response: str, token_count: int):
+    # Re-storing a key restarts its TTL
+    await db.merge(CachedResponse(
+        key=key, model_name=model_name, response=response, token_count=token_count, hit_count=0,
+        created_at=datetime.now(timezone.utc),
+    ))
+    await db.commit()
+
+async def delete_expired_cached_responses_async(db: AsyncSession, created_before: datetime) -> int:
+    result = await db.execute(delete(CachedResponse).where(CachedResponse.created_at < created_before))
+    await db.commit()
+    return result.rowcount
@@ -1,14 +1,33 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from app.models import Base, LLMProvider
 from app.core.config import settings
+from app.migrations import run_migrations
+from app.storage import Storage
 
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
+def _async_database_url(url: str) -> str:
+    """Map a sync database URL onto the matching asyncio driver"""
+    if url.startswith('sqlite:'):
+        return url.replace('sqlite:', 'sqlite+aiosqlite:', 1)
+    if url.startswith('postgresql:'):
+        return url.replace('postgresql:', 'postgresql+asyncpg:', 1)
+    return url
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_database_url(settings.DATABASE_URL)
+
+storage = Storage(
+    settings.DATABASE_URL,
+    ASYNC_DATABASE_URL,
+    profile=settings.STORAGE_PROFILE,
+    reader_pool_size=settings.SQLITE_READER_POOL_SIZE,
+    writer_timeout=settings.SQLITE_WRITER_TIMEOUT_SECONDS,
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Schema changes and other engine-level work go through the writers
+engine = storage.sync_writer
+async_engine = storage.async_writer
+
+SessionLocal = storage.SessionLocal
+AsyncSessionLocal = storage.AsyncSessionLocal
 
 def get_db():
     db = SessionLocal()
@@ -17,9 +36,14 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """Initialize database and create tables"""
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     
     # Create default LLM providers if they don't exist
     db = SessionLocal()
@@ -1,7 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import chat, auth, users
-from app.database import init_db
+from app.routers import chat, auth, users, stats
+from app.database import init_db, storage
+from app.services.llm_client_pool import shared_http_clients
+from app.services.message_writer import message_writer
+from app.services.password_service import password_hasher, PasswordPoolOverloaded
+from app.services.response_cache import response_cache
+from app.services.generation_manager import generation_manager
+from app.services.coordination import coordinator
+from app.services.recompression import recompressor
 
 app = FastAPI(title="Uni Chat API")
 
@@ -9,6 +17,32 @@ app = FastAPI(title="Uni Chat API")
 def startup_event():
     init_db()
 
+@app.on_event("startup")
+async def start_background_workers():
+    message_writer.start()
+    await coordinator.start(on_cancel=generation_manager.cancel_local)
+    recompressor.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Let in-flight answers finish, then drain queued chat messages before the engine goes away
+    await generation_manager.shutdown()
+    await recompressor.stop()
+    await coordinator.stop()
+    await message_writer.stop()
+    await response_cache.drain()
+    await shared_http_clients.aclose()
+    password_hasher.shutdown()
+    await storage.dispose()
+
+@app.exception_handler(PasswordPoolOverloaded)
+async def password_pool_overloaded_handler(request: Request, exc: PasswordPoolOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication is temporarily overloaded, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
 # Add CORS middleware for frontend dev
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +55,7 @@ app.add_middleware(
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(users.router, prefix="/users", tags=["users"])
 app.include_router(chat.router, tags=["chat"])
+app.include_router(stats.router, tags=["stats"])
 
 @app.get("/")
 def read_root():
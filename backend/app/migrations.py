@@ -0,0 +1,109 @@
+"""
+Lightweight schema migrations applied by ``init_db``.
+
+``Base.metadata.create_all`` only creates missing tables, so changes to existing
+tables are listed here. Each migration runs once, is recorded in
+``schema_migrations`` and must be idempotent, because fresh databases already
+get the new columns from ``create_all``.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    if not _has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _chat_messages_token_count(conn: Connection):
+    _add_column(conn, "chat_messages", "token_count", "INTEGER")
+
+
+def _chat_messages_session_timestamp_index(conn: Connection):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_chat_messages_session_id_timestamp "
+        "ON chat_messages (session_id, timestamp)"
+    ))
+
+
+# Contentless: the index holds tokens only, so compressed bodies aren't kept again in plain text
+_FTS_DEFINITION = "fts5(content, scope, content = '', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+
+
+def _chat_messages_fts(conn: Connection):
+    # Search index maintained by app.services.search_index; existing rows need `python -m app.cli backfill-search`
+    if conn.dialect.name != "sqlite":
+        return
+    if not conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+        # Chat keeps working, search stays unavailable
+        logger.warning("SQLite was built without FTS5; full-text search is disabled")
+        return
+    conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING {_FTS_DEFINITION}"))
+
+
+def _chat_sessions_activity(conn: Connection):
+    _add_column(conn, "chat_sessions", "last_activity", "DATETIME")
+    _add_column(conn, "chat_sessions", "message_count", "INTEGER NOT NULL DEFAULT 0")
+    # Backfilled in the format SQLAlchemy writes, so keyset cursors compare equal to stored values
+    last_activity = "COALESCE((SELECT MAX(m.timestamp) FROM chat_messages m WHERE m.session_id = chat_sessions.id), created_at)"
+    if conn.dialect.name == "sqlite":
+        last_activity = f"strftime('%Y-%m-%d %H:%M:%f000', {last_activity})"
+    conn.execute(text(
+        f"UPDATE chat_sessions SET last_activity = {last_activity}, "
+        "message_count = (SELECT COUNT(*) FROM chat_messages m WHERE m.session_id = chat_sessions.id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_id_last_activity "
+        "ON chat_sessions (user_id, last_activity)"
+    ))
+
+
+def _chat_messages_truncated(conn: Connection):
+    _add_column(conn, "chat_messages", "truncated", "BOOLEAN NOT NULL DEFAULT FALSE")
+
+
+def _chat_messages_fts_contentless(conn: Connection):
+    # Indexes created by 0003 before it was contentless stored every body in full
+    if conn.dialect.name != "sqlite":
+        return
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'chat_messages_fts'")).scalar()
+    if sql is None or "content = ''" in sql or "content=''" in sql:
+        return
+    conn.execute(text(f"CREATE VIRTUAL TABLE chat_messages_fts_new USING {_FTS_DEFINITION}"))
+    conn.execute(text(
+        "INSERT INTO chat_messages_fts_new (rowid, content, scope) SELECT rowid, content, scope FROM chat_messages_fts"
+    ))
+    conn.execute(text("DROP TABLE chat_messages_fts"))
+    conn.execute(text("ALTER TABLE chat_messages_fts_new RENAME TO chat_messages_fts"))
+
+
+MIGRATIONS = [
+    ("0001_chat_messages_token_count", _chat_messages_token_count),
+    ("0002_chat_messages_session_timestamp_index", _chat_messages_session_timestamp_index),
+    ("0003_chat_messages_fts", _chat_messages_fts),
+    ("0004_chat_sessions_activity", _chat_sessions_activity),
+    ("0005_chat_messages_truncated", _chat_messages_truncated),
+    ("0006_chat_messages_fts_contentless", _chat_messages_fts_contentless),
+]
+
+
+def run_migrations(engine: Engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(name VARCHAR PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT name FROM schema_migrations"))}
+        for name, migrate in MIGRATIONS:
+            if name in applied:
+                continue
+            migrate(conn)
+            conn.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
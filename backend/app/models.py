@@ -1,7 +1,11 @@
-from sqlalchemy import Column, Integer, String, Text, JSON, Boolean, DateTime, ForeignKey
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, String, Text, JSON, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
+from app.core.config import settings
+from app.utils.compression import CompressedText
 
 Base = declarative_base()
 
@@ -49,12 +53,19 @@ class UserLLMConfig(Base):
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        # Serves the keyset-paginated session list, most recently active first
+        Index("ix_chat_sessions_user_id_last_activity", "user_id", "last_activity"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     llm_config_id = Column(Integer, ForeignKey("user_llm_configs.id"), nullable=False)
     title = Column(String)  # Optional session title
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Denormalized from chat_messages; updated in the same transaction as every message insert
+    last_activity = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationships
     user = relationship("User", back_populates="chat_sessions")
@@ -63,12 +74,33 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Serves per-session history reads in order and keyset pagination
+        Index("ix_chat_messages_session_id_timestamp", "session_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
     role = Column(String, nullable=False)  # "user" or "assistant"
-    content = Column(Text, nullable=False)
+    # Large bodies are stored compressed; the column is only loaded by queries that ask for it (undefer)
+    content = deferred(Column(
+        CompressedText(settings.MESSAGE_COMPRESSION_THRESHOLD_BYTES, settings.MESSAGE_COMPRESSION_LEVEL),
+        nullable=False,
+    ))
+    token_count = Column(Integer)  # Estimated once on insert, reused when building context
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # An assistant answer that was stopped or cancelled before it finished
+    truncated = Column(Boolean, nullable=False, default=False, server_default="0")
     
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
+
+class CachedResponse(Base):
+    __tablename__ = "response_cache"
+    
+    key = Column(String, primary_key=True)  # sha256 of normalized (provider, model, params, messages)
+    model_name = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    token_count = Column(Integer)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
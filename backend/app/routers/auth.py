@@ -1,35 +1,48 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from app.database import get_db
+from app.database import get_async_db
 from app.schemas import UserCreate, UserResponse, LoginRequest, Token
-from app.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, verify_password
-from app.crud import create_user, get_user_by_username, get_user_by_email
+from app.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, invalidate_user
+from app.crud import create_user_async, get_user_by_username_async, get_user_by_email_async, update_user_password_hash_async
+from app.services.password_service import password_hasher
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user exists
-    if get_user_by_username(db, user.username):
+    if await get_user_by_username_async(db, user.username):
         raise HTTPException(status_code=400, detail="Username already registered")
-    if get_user_by_email(db, user.email):
+    if await get_user_by_email_async(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create user
-    db_user = create_user(db, user)
+    # Create user, hashing on the dedicated password pool
+    password_hash = await password_hasher.hash(user.password)
+    db_user = await create_user_async(db, user, password_hash)
     return db_user
 
 @router.post("/login", response_model=Token)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     # Authenticate user
-    user = get_user_by_username(db, login_data.username)
-    if not user or not verify_password(login_data.password, user.password_hash):
+    user = await get_user_by_username_async(db, login_data.username)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
         )
+    valid, new_hash = await password_hasher.verify_and_update(login_data.password, user.password_hash)
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password"
+        )
+    
+    # Transparently upgrade hashes made with a different bcrypt cost
+    if new_hash:
+        await update_user_password_hash_async(db, user, new_hash)
+        invalidate_user(user.username)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
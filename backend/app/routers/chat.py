@@ -1,13 +1,35 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends, Query, Request, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db, SessionLocal
 from app.auth import get_current_user
-from app.models import User
-from app.schemas import ChatSessionCreate, ChatSessionResponse, ChatMessageCreate
-from app.crud import create_chat_session, create_chat_message, get_session_messages, get_chat_session, get_llm_config_by_id
-from app.services.langchain_service import process_query_stream
+from app.models import User, ChatSession
+from app.schemas import (
+    ChatSessionCreate, ChatSessionResponse, ChatMessageResponse, ChatMessageSummary, MessageSearchResponse,
+)
+from app.core.config import settings
+from app.crud import (
+    create_chat_session, get_session_messages, iter_session_messages, get_chat_session,
+    get_chat_session_async, get_llm_config_by_id_async, get_llm_configs_by_ids_async,
+    get_session_messages_async, search_user_messages,
+)
+from app.services.langchain_service import process_query_stream, build_llm_config
+from app.services.llm_client_pool import resolve_llm_config
+from app.services.history_cache import history_cache
+from app.services.stream_coalescer import negotiate_coalescing, stream_frames, send_token_frame, end_frame
+from app.services.message_writer import message_writer
+from app.services.admission import admission_controller, AdmissionRejected
+from app.services.metrics import ACTIVE_WEBSOCKETS
+from app.services.generation_manager import generation_manager, Generation, GenerationNotFound
+from app.services.coordination import coordinator
+from app.services.search_index import search_index
+from app.services.sse import generation_events, parse_event_id, sse_stats
+from app.utils.stream_buffer import ReplayUnavailable
+from app.utils.tokens import estimate_tokens
 from app.utils.timer import timed
 from pydantic import BaseModel
+from typing import List, Optional
 import asyncio
 
 router = APIRouter()
@@ -23,9 +45,24 @@ def create_session(
 ):
     return create_chat_session(db, session, current_user.id)
 
+def _stream_session_messages(session_id: int):
+    """NDJSON lines for a whole session, read in batches on a dedicated DB session"""
+    db = SessionLocal()
+    try:
+        for message in iter_session_messages(db, session_id):
+            yield ChatMessageResponse.model_validate(message).model_dump_json() + "\n"
+    finally:
+        db.close()
+
 @router.get("/chat/sessions/{session_id}/messages")
 def get_session_messages_endpoint(
     session_id: int,
+    request: Request,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    stream: bool = False,
+    include_content: bool = True,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -34,64 +71,280 @@ def get_session_messages_endpoint(
     if not session or session.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    messages = get_session_messages(db, session_id)
+    # Full history can be streamed as NDJSON instead of one large JSON array
+    wants_stream = stream or "application/x-ndjson" in request.headers.get("accept", "")
+    if wants_stream and include_content and before_id is None and after_id is None and limit is None:
+        return StreamingResponse(_stream_session_messages(session_id), media_type="application/x-ndjson")
+    
+    messages = get_session_messages(
+        db, session_id, before_id=before_id, after_id=after_id, limit=limit, include_content=include_content
+    )
+    if not include_content:
+        # Bodies are never read (or decompressed) for a metadata-only listing
+        return [ChatMessageSummary.model_validate(m) for m in messages]
     return messages
 
+@router.get("/chat/search", response_model=MessageSearchResponse)
+def search_messages_endpoint(
+    q: str = Query(..., min_length=1, max_length=500),
+    session_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not search_index.available(db):
+        raise HTTPException(status_code=501, detail="Full-text search is not available on this database")
+    # Matches are scoped to the caller's own sessions inside the index query
+    hits, has_more = search_user_messages(db, current_user.id, q, limit=limit, offset=offset, session_id=session_id)
+    return {
+        "results": [
+            {
+                "message_id": hit["id"], "session_id": hit["session_id"], "session_title": hit["title"],
+                "role": hit["role"], "timestamp": hit["timestamp"], "snippet": hit["snippet"], "rank": hit["rank"],
+            }
+            for hit in hits
+        ],
+        "next_offset": offset + len(hits) if has_more else None,
+    }
+
+@router.delete("/chat/sessions/{session_id}/generations/{generation_id}")
+async def cancel_generation_endpoint(
+    session_id: int,
+    generation_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    session = await get_chat_session_async(db, session_id)
+    if not session or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    # The generation may be running on another worker; the coordinator forwards the cancel
+    try:
+        cancelled = await generation_manager.cancel(generation_id, session_id)
+    except GenerationNotFound:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    return {"cancelled": cancelled}
+
+async def _find_generation(generation_id: str, session_id: int) -> Generation:
+    """A generation to reattach to, here or (once saved) on another worker"""
+    try:
+        return generation_manager.resume(generation_id, session_id)
+    except GenerationNotFound:
+        # The reconnect may have landed on a different worker than the generation
+        return await generation_manager.resume_remote(generation_id, session_id)
+
+async def _start_generation(db: AsyncSession, session: ChatSession, message_data: str) -> Optional[Generation]:
+    """
+    Save the user's message and start the answer as a server-side generation.
+
+    Shared by the socket and the SSE endpoint. Returns None when the session's
+    LLM configuration is gone.
+    """
+    session_id = session.id
+    llm_config_record = await get_llm_config_by_id_async(db, session.llm_config_id)
+    if not llm_config_record:
+        return None
+    
+    # Prepare LLM config for the service, plus any fallbacks to hedge to
+    llm_config = build_llm_config(llm_config_record)
+    fallback_ids = (llm_config_record.config_params or {}).get('fallback_config_ids') or []
+    fallback_configs = [
+        build_llm_config(record)
+        for record in await get_llm_configs_by_ids_async(db, session.user_id, fallback_ids)
+        if record.id != llm_config_record.id
+    ]
+    
+    # Save user message
+    user_tokens = estimate_tokens(message_data)
+    await message_writer.write(
+        session_id, "user", message_data, token_count=user_tokens, durable=settings.MESSAGE_WRITE_DURABLE
+    )
+    
+    # Get chat history, rebuilding it from the database only on a cache miss
+    if await coordinator.claim_session(session_id):
+        # Another worker has written to this session since we cached it
+        history_cache.invalidate(session_id)
+    formatted_messages = history_cache.append(
+        session_id, {"role": "user", "content": message_data, "tokens": user_tokens}
+    )
+    if formatted_messages is None:
+        # The rebuild must see messages still waiting in the write-behind queue. Release
+        # our pooled connection first: the writer needs one from the same pool to flush
+        await db.commit()
+        await message_writer.flush()
+        messages = await get_session_messages_async(db, session_id)
+        formatted_messages = history_cache.load(
+            session_id,
+            [{"role": msg.role, "content": msg.content, "tokens": msg.token_count} for msg in messages]
+        )
+    # Hand the pooled connection back while the answer streams
+    await db.commit()
+    
+    # The answer is generated (and saved) by a server-side task that outlives this
+    # connection; the client can reattach with the generation id and an offset
+    # A copy: the cached list keeps growing while this prompt may still wait for admission
+    return generation_manager.start(
+        session_id, session.user_id, list(formatted_messages), llm_config, fallback_configs
+    )
+
+class StreamRequest(BaseModel):
+    message: str
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@router.api_route("/chat/sessions/{session_id}/stream", methods=["GET", "POST"])
+async def chat_stream_endpoint(
+    session_id: int,
+    request: Request,
+    body: Optional[StreamRequest] = None,
+    generation_id: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    auth_db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Stream one answer as Server-Sent Events, over plain HTTP instead of the socket.
+
+    ``POST {"message": ...}`` starts a turn. A reconnect (``Last-Event-ID``, which
+    browsers send automatically, or ``?generation_id=&offset=``) continues the
+    generation after the last event received instead of starting another one.
+    """
+    # The auth session outlives a streaming response; don't let it pin a pooled connection
+    auth_db.close()
+    session = await get_chat_session_async(db, session_id)
+    if not session or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    coalescing = negotiate_coalescing(request)
+    
+    if last_event_id:
+        try:
+            generation_id, offset = parse_event_id(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    if generation_id:
+        await db.commit()
+        try:
+            generation = await _find_generation(generation_id, session_id)
+        except GenerationNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        sse_stats.resumes += 1
+    else:
+        if request.method != "POST" or body is None or not body.message:
+            raise HTTPException(status_code=400, detail="No message provided")
+        generation = await _start_generation(db, session, body.message)
+        if generation is None:
+            raise HTTPException(status_code=404, detail="LLM configuration not found")
+    return StreamingResponse(
+        generation_events(generation, offset, coalescing), media_type="text/event-stream", headers=_SSE_HEADERS
+    )
+
+async def _send_queue_position(websocket: WebSocket, position: int):
+    await websocket.send_json({"queued": True, "position": position})
+
+async def _send_generation(websocket: WebSocket, generation: Generation, offset: int, coalescing):
+    follow = generation.follow(offset, on_queued=lambda position: _send_queue_position(websocket, position))
+    frames = stream_frames(follow, coalescing)
+    try:
+        async for frame in frames:
+            await send_token_frame(websocket, frame)
+    except (ReplayUnavailable, AdmissionRejected) as e:
+        error = {"error": str(e), "generation_id": generation.id}
+        if isinstance(e, AdmissionRejected):
+            error["retry_after"] = e.retry_after
+        await websocket.send_json(error)
+        return
+    finally:
+        # Stop counting as a reader right away, not when the generators are collected
+        await frames.aclose()
+        await follow.aclose()
+    await websocket.send_json(end_frame(generation))
+
+async def _receive_controls(websocket: WebSocket, generation: Generation, inbox: List[dict]):
+    """Read the socket while an answer streams: act on ``{"stop": true}``, keep other messages for later"""
+    while True:
+        data = await websocket.receive_json()
+        if isinstance(data, dict) and data.get("stop"):
+            generation_manager.cancel_local(generation.id, "stop")
+        else:
+            inbox.append(data)
+
+async def _relay_generation(
+    websocket: WebSocket, generation: Generation, offset: int, coalescing, inbox: List[dict]
+):
+    """
+    Send a generation to the socket from ``offset`` while listening for the client.
+
+    ``{"stop": true}`` cancels the generation; the turn then ends with a
+    ``"truncated": true`` end frame. A socket that closes mid-answer is noticed
+    at once rather than at the next failed send: the generation is released,
+    so it is cancelled unless a reconnect resumes it within the grace period.
+    """
+    await websocket.send_json({"generation_id": generation.id, "offset": offset})
+    sender = asyncio.ensure_future(_send_generation(websocket, generation, offset, coalescing))
+    receiver = asyncio.ensure_future(_receive_controls(websocket, generation, inbox))
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (sender, receiver):
+            task.cancel()
+        # Before awaiting: when the connection itself is cancelled, that await is too
+        if not generation.done:
+            generation_manager.release(generation)
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+    if receiver in done:
+        # The socket closed (or sent something unreadable) mid-answer
+        receiver.result()
+    sender.result()
+
 @router.websocket("/ws/chat/{session_id}")
-async def chat_websocket(session_id: int, websocket: WebSocket, db: Session = Depends(get_db)):
+async def chat_websocket(session_id: int, websocket: WebSocket, db: AsyncSession = Depends(get_async_db)):
     await websocket.accept()
+    coalescing = negotiate_coalescing(websocket)
+    ACTIVE_WEBSOCKETS.labels("chat").inc()
+    # Messages that arrived while an answer was streaming
+    inbox: List[dict] = []
     try:
         while True:
-            data = await websocket.receive_json()
-            message_data = data.get("message")
+            data = inbox.pop(0) if inbox else await websocket.receive_json()
+            if data.get("stop"):
+                # Nothing is streaming any more
+                continue
+            
+            # Reattach to a generation that outlived an earlier connection
+            if data.get("resume"):
+                try:
+                    generation = await _find_generation(str(data["resume"]), session_id)
+                except GenerationNotFound as e:
+                    await websocket.send_json({"error": str(e), "generation_id": data["resume"]})
+                    continue
+                await _relay_generation(websocket, generation, int(data.get("offset") or 0), coalescing, inbox)
+                continue
             
+            message_data = data.get("message")
             if not message_data:
                 await websocket.send_json({"error": "No message provided"})
                 continue
             
             # Verify session exists and get user's LLM config
-            session = get_chat_session(db, session_id)
+            session = await get_chat_session_async(db, session_id)
             if not session:
                 await websocket.send_json({"error": "Session not found"})
                 break
             
-            # Get the user's LLM configuration
-            llm_config_record = get_llm_config_by_id(db, session.llm_config_id)
-            if not llm_config_record:
+            # Saves the message and starts the answer; reattach with {"resume": generation_id, "offset": n}
+            generation = await _start_generation(db, session, message_data)
+            if generation is None:
                 await websocket.send_json({"error": "LLM configuration not found"})
                 break
-            
-            # Prepare LLM config for the service
-            llm_config = {
-                'api_key': llm_config_record.api_key_encrypted,  # TODO: Decrypt this
-                'model_name': llm_config_record.model_name,
-                'temperature': llm_config_record.config_params.get('temperature', 0),
-                'max_tokens': llm_config_record.config_params.get('max_tokens'),
-            }
-            
-            # Save user message
-            user_message = ChatMessageCreate(role="user", content=message_data)
-            create_chat_message(db, user_message, session_id)
-            
-            # Get chat history
-            messages = get_session_messages(db, session_id)
-            formatted_messages = [{"role": msg.role, "content": msg.content} for msg in messages]
-            
-            # Stream response with user's LLM config
-            assistant_response = ""
-            async for chunk in process_query_stream(formatted_messages, llm_config):
-                assistant_response += chunk
-                await websocket.send_json({"token": chunk})
-            
-            # Save assistant message
-            assistant_message = ChatMessageCreate(role="assistant", content=assistant_response)
-            create_chat_message(db, assistant_message, session_id)
-            
-            await websocket.send_json({"end": True})
+            await _relay_generation(websocket, generation, 0, coalescing, inbox)
     except WebSocketDisconnect:
         pass
     except Exception as e:
         await websocket.send_json({"error": str(e)})
+    finally:
+        ACTIVE_WEBSOCKETS.labels("chat").dec()
 
 # Keep the original endpoint for backward compatibility
 @router.post("/chat")
@@ -106,6 +359,8 @@ async def chat_endpoint(request: ChatRequest):
 @router.websocket("/ws/chat")
 async def chat_websocket_legacy(websocket: WebSocket):
     await websocket.accept()
+    coalescing = negotiate_coalescing(websocket)
+    ACTIVE_WEBSOCKETS.labels("legacy").inc()
     try:
         while True:
             data = await websocket.receive_json()
@@ -113,11 +368,22 @@ async def chat_websocket_legacy(websocket: WebSocket):
             if not messages or not isinstance(messages, list):
                 await websocket.send_json({"error": "No messages provided or invalid format."})
                 continue
-            async for chunk in process_query_stream(messages):
-                await websocket.send_json({"token": chunk})
+            # Legacy clients share the server key, so they are admitted per client address
+            client_id = f"ip:{websocket.client.host}" if websocket.client else "anonymous"
+            try:
+                async with admission_controller.admit(
+                    client_id, resolve_llm_config(), on_queued=lambda position: _send_queue_position(websocket, position)
+                ):
+                    async for frame in stream_frames(process_query_stream(messages), coalescing):
+                        await send_token_frame(websocket, frame)
+            except AdmissionRejected as e:
+                await websocket.send_json({"error": str(e), "retry_after": e.retry_after})
+                continue
             await websocket.send_json({"end": True})
     except WebSocketDisconnect:
         pass
     except Exception as e:
         await websocket.send_json({"error": str(e)})
         await websocket.close()
+    finally:
+        ACTIVE_WEBSOCKETS.labels("legacy").dec()
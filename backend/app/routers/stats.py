@@ -0,0 +1,57 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.auth import auth_cache_stats
+from app.services.llm_client_pool import client_registry
+from app.services.history_cache import history_cache
+from app.services.stream_coalescer import frame_stats
+from app.services.message_writer import message_writer
+from app.services.password_service import password_hasher
+from app.services.response_cache import response_cache
+from app.services.validation_service import verdict_cache
+from app.services.provider_router import provider_router
+from app.services.admission import admission_controller
+from app.services.generation_manager import generation_manager
+from app.services.single_flight import single_flight
+from app.services.coordination import coordinator
+from app.database import storage
+from app.services.search_index import search_index
+from app.services.recompression import recompressor
+from app.services.history_transfer import history_transfer
+from app.services.sse import sse_stats
+from app.services.metrics import registry, component_stats_lines
+from app.utils.metrics import CONTENT_TYPE
+
+router = APIRouter()
+
+def _component_stats():
+    return {
+        "llm_clients": client_registry.stats(),
+        "history_cache": history_cache.stats(),
+        "websocket_frames": frame_stats.stats(),
+        "message_writer": message_writer.stats(),
+        "auth": auth_cache_stats(),
+        "password_pool": password_hasher.stats(),
+        "response_cache": response_cache.stats(),
+        "api_key_validation": verdict_cache.stats(),
+        "provider_router": provider_router.stats(),
+        "admission": admission_controller.stats(),
+        "generations": generation_manager.stats(),
+        "single_flight": single_flight.stats(),
+        "coordination": coordinator.stats(),
+        "storage": storage.stats(),
+        "search": search_index.stats(),
+        "recompression": recompressor.stats(),
+        "history_transfer": history_transfer.stats(),
+        "sse": sse_stats.stats(),
+    }
+
+@router.get("/stats")
+def get_stats():
+    """Runtime counters for the in-process caches and pools"""
+    return _component_stats()
+
+@router.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of the stream/DB histograms and component counters"""
+    body = registry.render() + "\n".join(component_stats_lines(_component_stats())) + "\n"
+    return Response(content=body, media_type=CONTENT_TYPE)
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db, SessionLocal
 from app.auth import get_current_user
-from app.schemas import LLMConfigCreate, LLMConfigResponse, ChatSessionResponse, GroqSetupRequest
-from app.crud import create_llm_config, get_user_llm_configs, get_llm_providers, get_user_chat_sessions
+from app.schemas import LLMConfigCreate, LLMConfigResponse, ChatSessionResponse, ChatSessionPage, GroqSetupRequest
+from app.crud import (
+    create_llm_config, get_user_llm_configs, get_llm_providers, get_user_chat_sessions,
+    create_llm_config_async, get_user_llm_configs_async, get_user_session_summaries, decode_session_cursor,
+)
 from app.models import User
 from app.services.validation_service import validate_groq_api_key
-from typing import List
+from app.services.history_transfer import history_transfer, split_lines, LineTooLong
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -26,15 +32,71 @@ def get_providers(db: Session = Depends(get_db)):
 def get_my_chat_sessions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     return get_user_chat_sessions(db, current_user.id)
 
+@router.get("/me/chat-sessions/summaries", response_model=ChatSessionPage)
+def get_my_chat_session_summaries(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    preview_chars: int = Query(120, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Sessions by most recent activity with counts and a preview; pass ``next_cursor`` back for the next page"""
+    try:
+        position = decode_session_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    sessions, next_cursor = get_user_session_summaries(
+        db, current_user.id, limit=limit, cursor=position, preview_chars=preview_chars
+    )
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
+def _export_history(user_id: int):
+    """Export chunks read on a dedicated DB session that lives as long as the response"""
+    db = SessionLocal()
+    try:
+        yield from history_transfer.export_chunks(db, user_id)
+    finally:
+        db.close()
+
+@router.get("/me/history/export")
+def export_my_history(current_user: User = Depends(get_current_user)):
+    """All sessions and messages as chunked NDJSON, streamed in constant memory"""
+    return StreamingResponse(
+        _export_history(current_user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="uni-chat-{current_user.username}.ndjson"'},
+    )
+
+@router.post("/me/history/import")
+async def import_my_history(
+    request: Request,
+    llm_config_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Add the sessions of an NDJSON export (the request body) to the caller's history"""
+    configs = await get_user_llm_configs_async(db, current_user.id)
+    if llm_config_id is not None:
+        config = next((c for c in configs if c.id == llm_config_id), None)
+    else:
+        config = next((c for c in configs if c.is_default), configs[0] if configs else None)
+    if config is None:
+        raise HTTPException(status_code=400, detail="An LLM configuration is required to attach imported sessions to")
+    lines = split_lines(request.stream(), history_transfer.max_line_bytes)
+    try:
+        return await history_transfer.import_lines(db, current_user.id, config.id, lines)
+    except LineTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
 @router.post("/me/setup-default-groq")
 async def setup_default_groq_config(
     request: GroqSetupRequest,
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Setup default GROQ configuration for new users with API key validation"""
     # Check if user already has a GROQ config
-    existing_configs = get_user_llm_configs(db, current_user.id)
+    existing_configs = await get_user_llm_configs_async(db, current_user.id)
     groq_configs = [c for c in existing_configs if c.provider_id == 1]  # Assuming GROQ is provider_id 1
     
     if groq_configs:
@@ -65,7 +127,7 @@ async def setup_default_groq_config(
         is_default=True
     )
     
-    created_config = create_llm_config(db, config, current_user.id)
+    created_config = await create_llm_config_async(db, config, current_user.id)
     
     # Return success response with validation details
     return {
@@ -45,6 +45,18 @@ class ChatSessionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ChatSessionSummary(BaseModel):
+    id: int
+    title: Optional[str]
+    created_at: datetime
+    last_activity: Optional[datetime]
+    message_count: int
+    preview: str
+
+class ChatSessionPage(BaseModel):
+    sessions: List[ChatSessionSummary]
+    next_cursor: Optional[str] = None
+
 class ChatMessageCreate(BaseModel):
     role: str
     content: str
@@ -52,9 +64,33 @@ class ChatMessageCreate(BaseModel):
 class ChatMessageResponse(ChatMessageCreate):
     id: int
     timestamp: datetime
+    truncated: bool = False
     class Config:
         from_attributes = True
 
+class ChatMessageSummary(BaseModel):
+    """A message without its body, for listings that don't need the text"""
+    id: int
+    role: str
+    timestamp: datetime
+    token_count: Optional[int] = None
+    truncated: bool = False
+    class Config:
+        from_attributes = True
+
+class MessageSearchHit(BaseModel):
+    message_id: int
+    session_id: int
+    session_title: Optional[str]
+    role: str
+    timestamp: datetime
+    snippet: str
+    rank: float
+
+class MessageSearchResponse(BaseModel):
+    results: List[MessageSearchHit]
+    next_offset: Optional[int] = None
+
 # Authentication schemas
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,306 @@
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.llm_client_pool import api_key_fingerprint
+from app.services.metrics import ADMISSION_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of queueing when the admission queue is full"""
+
+    def __init__(self, message: str = "Too many pending generations, please retry shortly", retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def rate_limit_key(llm_config: Dict[str, Any]) -> str:
+    """Bucket identity of an upstream credential: provider plus API key fingerprint"""
+    return f"{llm_config.get('provider') or 'groq'}:{api_key_fingerprint(llm_config.get('api_key'))}"
+
+
+def upstream_status(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by a provider SDK / httpx error, if any"""
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Classic token bucket; ``rate`` tokens per second up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_in(self, now: float) -> float:
+        """Seconds until a token is available (0 when one is available now)"""
+        if self.rate <= 0:
+            return 0
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+
+class _KeyState:
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.blocked_until = 0.0
+        self.backoff_streak = 0
+        self.rate_limited = 0
+
+    def ready_in(self, now: float) -> float:
+        return max(self.blocked_until - now, self.bucket.ready_in(now))
+
+
+class _Waiter:
+    __slots__ = ("user_id", "key", "tag", "seq", "granted", "moved", "enqueued")
+
+    def __init__(self, user_id, key: str, tag: float, seq: int):
+        self.user_id = user_id
+        self.key = key
+        self.tag = tag
+        self.seq = seq
+        self.granted = False
+        self.moved = asyncio.Event()
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class AdmissionController:
+    """
+    Admission control in front of outbound LLM generations.
+
+    A generation needs a global slot (``max_concurrent``), a per-user slot
+    (``user_max_concurrent``) and a token from its API key's bucket; keys that
+    recently got a 429 are also held back with exponential backoff (honouring
+    ``Retry-After``). Requests that cannot start yet wait in a weighted-fair queue
+    ordered by virtual finish time, so one user's backlog is interleaved with
+    everyone else's rather than served first. Waiters that are only blocked by
+    their own user or key limit are skipped, not head-of-line blocking.
+
+    Every worker process has its own controller, so with N workers a user can
+    run N times ``user_max_concurrent`` generations and each key gets N buckets;
+    size the limits per worker.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        user_max_concurrent: int,
+        key_rate: float,
+        key_burst: float,
+        max_queue: int,
+        backoff_base: float,
+        backoff_max: float,
+    ):
+        self.max_concurrent = max_concurrent
+        self.user_max_concurrent = user_max_concurrent
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.max_queue = max_queue
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._queue: List[_Waiter] = []
+        self._keys: Dict[str, _KeyState] = {}
+        self._user_active: Dict[Any, int] = {}
+        self._last_tag: Dict[Any, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    def _key_state(self, key: str) -> _KeyState:
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState(self.key_rate, self.key_burst)
+        return state
+
+    def _eligible(self, waiter: _Waiter, now: float) -> float:
+        """0 when the waiter may start now, otherwise seconds to wait (inf = wait for a release)"""
+        if self._user_active.get(waiter.user_id, 0) >= self.user_max_concurrent:
+            return float("inf")
+        return self._key_state(waiter.key).ready_in(now)
+
+    def _grant(self, waiter: _Waiter, now: float):
+        self.active += 1
+        self.admitted += 1
+        self._user_active[waiter.user_id] = self._user_active.get(waiter.user_id, 0) + 1
+        self._key_state(waiter.key).bucket.take(now)
+        self._virtual_time = max(self._virtual_time, waiter.tag)
+        if self._last_tag.get(waiter.user_id, 0) <= self._virtual_time:
+            self._last_tag.pop(waiter.user_id, None)
+        waiter.granted = True
+        self.total_wait += now - waiter.enqueued
+        ADMISSION_WAIT_SECONDS.observe(now - waiter.enqueued)
+
+    def _dispatch(self):
+        self._timer = None
+        now = time.monotonic()
+        next_ready = float("inf")
+        changed = False
+        for waiter in list(self._queue):
+            if self.active >= self.max_concurrent:
+                break
+            wait = self._eligible(waiter, now)
+            if wait > 0:
+                next_ready = min(next_ready, wait)
+                continue
+            self._queue.remove(waiter)
+            self._grant(waiter, now)
+            waiter.moved.set()
+            changed = True
+        if changed:
+            for waiter in self._queue:
+                waiter.moved.set()
+        if next_ready != float("inf") and self.active < self.max_concurrent:
+            self._timer = asyncio.get_running_loop().call_later(next_ready, self._dispatch)
+
+    async def _acquire(self, user_id, key: str, weight: float, on_queued) -> _Waiter:
+        now = time.monotonic()
+        tag = max(self._virtual_time, self._last_tag.get(user_id, 0)) + 1 / max(weight, 1e-6)
+        waiter = _Waiter(user_id, key, tag, next(self._seq))
+
+        # Fast path: nothing queued and every limit has room
+        if not self._queue and self.active < self.max_concurrent and self._eligible(waiter, now) == 0:
+            self._grant(waiter, now)
+            return waiter
+
+        if len(self._queue) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected()
+        self._last_tag[user_id] = tag
+        self.queued += 1
+        bisect.insort(self._queue, waiter)
+        # Waiters behind a newcomer with an earlier virtual finish time moved back
+        for behind in self._queue[self._queue.index(waiter) + 1:]:
+            behind.moved.set()
+        self._schedule()
+        reported = None
+        try:
+            while not waiter.granted:
+                position = self._queue.index(waiter) + 1
+                if on_queued is not None and position != reported:
+                    reported = position
+                    await on_queued(position)
+                    continue
+                waiter.moved.clear()
+                await waiter.moved.wait()
+        except BaseException:
+            if waiter.granted:
+                self._release(waiter)
+            else:
+                self._queue.remove(waiter)
+                self._schedule()
+            raise
+        return waiter
+
+    def _schedule(self):
+        """Run a dispatch pass on the next loop iteration"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _release(self, waiter: _Waiter):
+        self.active -= 1
+        remaining = self._user_active.get(waiter.user_id, 1) - 1
+        if remaining:
+            self._user_active[waiter.user_id] = remaining
+        else:
+            self._user_active.pop(waiter.user_id, None)
+        if self._queue:
+            self._schedule()
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        user_id,
+        llm_config: Dict[str, Any],
+        weight: float = 1.0,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        """
+        Hold an admission slot for one generation.
+
+        ``on_queued(position)`` is awaited whenever the request's 1-based queue
+        position changes while it waits.
+        """
+        waiter = await self._acquire(user_id, rate_limit_key(llm_config), weight, on_queued)
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def record_outcome(self, llm_config: Dict[str, Any], exc: Optional[BaseException] = None):
+        """Feed upstream results back: 429s back the key off, successes reset it"""
+        state = self._key_state(rate_limit_key(llm_config))
+        if exc is None:
+            state.backoff_streak = 0
+            return
+        if upstream_status(exc) != 429:
+            return
+        state.rate_limited += 1
+        delay = _retry_after(exc)
+        if delay is None:
+            delay = min(self.backoff_base * (2 ** state.backoff_streak), self.backoff_max)
+        state.backoff_streak += 1
+        state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+        logger.warning(f"Upstream rate limit on {rate_limit_key(llm_config)}, backing off {delay:.1f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        keys = list(self._keys.values())
+        return {
+            "active": self.active,
+            "queued_now": len(self._queue),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "avg_wait_ms": self.total_wait / self.admitted * 1000 if self.admitted else 0.0,
+            "keys": len(keys),
+            "keys_backing_off": sum(1 for state in keys if state.blocked_until > now),
+            "upstream_rate_limited": sum(state.rate_limited for state in keys),
+        }
+
+
+admission_controller = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    user_max_concurrent=settings.ADMISSION_USER_MAX_CONCURRENT,
+    key_rate=settings.ADMISSION_KEY_RPM / 60,
+    key_burst=settings.ADMISSION_KEY_BURST,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    backoff_base=settings.ADMISSION_BACKOFF_BASE_MS / 1000,
+    backoff_max=settings.ADMISSION_BACKOFF_MAX_MS / 1000,
+)
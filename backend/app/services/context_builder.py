@@ -0,0 +1,71 @@
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.utils.tokens import estimate_tokens
+
+# Context window sizes (tokens) for the models seeded in init_db
+MODEL_CONTEXT_WINDOWS = {
+    "llama2-70b-4096": 4096,
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "gemma-7b-it": 8192,
+    "deepseek-r1-distill-llama-70b": 131072,
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "claude-3-sonnet-20240229": 200000,
+    "claude-3-opus-20240229": 200000,
+    "claude-3-haiku-20240307": 200000,
+}
+
+# Chat templates wrap every message in role markers
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Token cost of one history entry; the estimate is cached on the entry itself"""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = message["tokens"] = estimate_tokens(message["content"])
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+
+def get_token_budget(llm_config: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Prompt budget for a config: an explicit ``context_token_budget`` wins, otherwise
+    the model's context window minus room for the response.
+    """
+    llm_config = llm_config or {}
+    if llm_config.get('context_token_budget'):
+        return int(llm_config['context_token_budget'])
+    window = MODEL_CONTEXT_WINDOWS.get(llm_config.get('model_name'), settings.CONTEXT_DEFAULT_TOKEN_BUDGET)
+    reserve = llm_config.get('max_tokens') or settings.CONTEXT_RESPONSE_RESERVE
+    return max(window - reserve, 1)
+
+
+def fit_to_budget(messages: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """
+    Truncate history to the newest messages that fit in ``budget`` tokens.
+
+    Leading system messages are always kept, as is the latest message even if it
+    alone exceeds the budget. Only the kept suffix is walked, so the cost is
+    proportional to what is sent rather than to the session length.
+    """
+    system_end = 0
+    while system_end < len(messages) and messages[system_end]["role"] == "system":
+        system_end += 1
+    remaining = budget - sum(message_tokens(m) for m in messages[:system_end])
+
+    start = len(messages)
+    while start > system_end:
+        cost = message_tokens(messages[start - 1])
+        if cost > remaining and start < len(messages):
+            break
+        remaining -= cost
+        start -= 1
+
+    if start == system_end:
+        return messages
+    return messages[:system_end] + messages[start:]
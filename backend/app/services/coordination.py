@@ -0,0 +1,440 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CancelHandler = Callable[[str], bool]
+
+
+def _default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CoordinationState:
+    """
+    Cross-worker bookkeeping: which worker owns each generation, how it ended,
+    and which worker last wrote to each session.
+
+    ``deliver(owner, generation_id)`` hands a cancellation to the owning worker
+    and reports whether it got there.
+    """
+
+    def __init__(self, deliver: Callable[[str, str], bool]):
+        self.deliver = deliver
+        self.generations: Dict[str, Dict[str, Any]] = {}
+        self.latest: Dict[int, str] = {}
+        self.session_writers: Dict[int, str] = {}
+        self._watchers: Dict[str, List[Callable[[Optional[Dict[str, Any]]], None]]] = {}
+        self.cancels = 0
+        self.lost = 0
+
+    def register(self, worker_id: str, generation_id: str, session_id: int):
+        self.generations[generation_id] = {
+            "id": generation_id, "session_id": session_id, "owner": worker_id, "status": "running", "message_id": None,
+        }
+        self.latest[session_id] = generation_id
+
+    def finish(self, generation_id: str, status: str, message_id: Optional[int] = None):
+        record = self.generations.get(generation_id)
+        if record is None:
+            return
+        record["status"] = status
+        record["message_id"] = message_id
+        for callback in self._watchers.pop(generation_id, []):
+            callback(dict(record))
+
+    def forget(self, generation_id: str):
+        record = self.generations.pop(generation_id, None)
+        if record is not None and self.latest.get(record["session_id"]) == generation_id:
+            del self.latest[record["session_id"]]
+        for callback in self._watchers.pop(generation_id, []):
+            callback(None)
+
+    def locate(self, generation_id: str, session_id: int) -> Optional[Dict[str, Any]]:
+        """The generation's record if it belongs to ``session_id``; ``"latest"`` picks the session's newest"""
+        if generation_id == "latest":
+            generation_id = self.latest.get(session_id, "")
+        record = self.generations.get(generation_id)
+        if record is None or record["session_id"] != session_id:
+            return None
+        return dict(record)
+
+    def watch(self, generation_id: str, callback: Callable[[Optional[Dict[str, Any]]], None]) -> bool:
+        """Call ``callback`` with the record once the generation ends; False if it is not running"""
+        record = self.generations.get(generation_id)
+        if record is None or record["status"] != "running":
+            return False
+        self._watchers.setdefault(generation_id, []).append(callback)
+        return True
+
+    def cancel(self, generation_id: str) -> bool:
+        record = self.generations.get(generation_id)
+        if record is None or record["status"] != "running":
+            return False
+        self.cancels += 1
+        return self.deliver(record["owner"], generation_id)
+
+    def claim_session(self, worker_id: str, session_id: int) -> bool:
+        """Record ``worker_id`` as the session's writer; True if another worker wrote to it since"""
+        previous = self.session_writers.get(session_id)
+        self.session_writers[session_id] = worker_id
+        return previous is not None and previous != worker_id
+
+    def worker_lost(self, worker_id: str):
+        # Its session claims stay, so the next writer still drops its stale cache
+        for record in list(self.generations.values()):
+            if record["owner"] == worker_id and record["status"] == "running":
+                self.lost += 1
+                self.finish(record["id"], "lost")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generations": len(self.generations),
+            "running": sum(1 for r in self.generations.values() if r["status"] == "running"),
+            "sessions": len(self.session_writers),
+            "cancels": self.cancels,
+            "lost": self.lost,
+        }
+
+
+class InProcessCoordinator:
+    """
+    Coordination for a single worker process.
+
+    Every generation is local, so cancellations go straight to the handler and
+    the session cache never goes stale behind our back.
+    """
+
+    backend = "inprocess"
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or _default_worker_id()
+        self.state = CoordinationState(self._deliver)
+        self._on_cancel: Optional[CancelHandler] = None
+
+    def _deliver(self, owner: str, generation_id: str) -> bool:
+        return owner == self.worker_id and self._on_cancel is not None and self._on_cancel(generation_id)
+
+    async def start(self, on_cancel: Optional[CancelHandler] = None):
+        self._on_cancel = on_cancel
+
+    async def stop(self):
+        pass
+
+    async def register_generation(self, generation_id: str, session_id: int):
+        self.state.register(self.worker_id, generation_id, session_id)
+
+    async def finish_generation(self, generation_id: str, status: str, message_id: Optional[int] = None):
+        self.state.finish(generation_id, status, message_id)
+
+    async def forget_generation(self, generation_id: str):
+        self.state.forget(generation_id)
+
+    async def locate_generation(self, generation_id: str, session_id: int) -> Optional[Dict[str, Any]]:
+        return self.state.locate(generation_id, session_id)
+
+    async def wait_generation(self, generation_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """The generation's record once it has ended (or as it stands after ``timeout``)"""
+        future = asyncio.get_running_loop().create_future()
+
+        def resolve(record):
+            if not future.done():
+                future.set_result(record)
+
+        if self.state.watch(generation_id, resolve):
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+        record = self.state.generations.get(generation_id)
+        return dict(record) if record is not None else None
+
+    async def cancel_generation(self, generation_id: str) -> bool:
+        return self.state.cancel(generation_id)
+
+    async def claim_session(self, session_id: int) -> bool:
+        return self.state.claim_session(self.worker_id, session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "worker_id": self.worker_id, **self.state.stats()}
+
+
+async def _open_connection(address: str):
+    if address.startswith("tcp://"):
+        host, port = address[len("tcp://"):].rsplit(":", 1)
+        return await asyncio.open_connection(host, int(port))
+    return await asyncio.open_unix_connection(address)
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return (json.dumps(message) + "\n").encode()
+
+
+class LocalSocketCoordinator:
+    """
+    Coordination across the worker processes of one host, through a
+    ``CoordinatorServer`` on a Unix socket (or ``tcp://host:port``).
+
+    Requests are JSON lines answered in kind; the server pushes cancellations
+    for generations this worker owns. If the server is unreachable each call
+    logs and returns a conservative default (the session cache is treated as
+    stale, remote generations as unknown) instead of failing the chat.
+    """
+
+    backend = "local-socket"
+
+    def __init__(self, address: str, worker_id: Optional[str] = None, timeout: float = 5.0):
+        self.address = address
+        self.worker_id = worker_id or _default_worker_id()
+        self.timeout = timeout
+        self._on_cancel: Optional[CancelHandler] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self.requests = 0
+        self.errors = 0
+        self.cancels_received = 0
+
+    async def start(self, on_cancel: Optional[CancelHandler] = None):
+        self._on_cancel = on_cancel
+        self._connect_lock = asyncio.Lock()
+        try:
+            await self._connect()
+        except OSError as e:
+            logger.error(f"Coordinator at {self.address} is unreachable: {str(e)}")
+
+    async def stop(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._writer = None
+        self._reader_task = None
+
+    async def _connect(self):
+        reader, writer = await _open_connection(self.address)
+        writer.write(_encode({"op": "hello", "worker_id": self.worker_id}))
+        self._writer = writer
+        self._reader_task = asyncio.ensure_future(self._read_loop(reader, writer))
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("event") == "cancel":
+                    self.cancels_received += 1
+                    if self._on_cancel is not None:
+                        self._on_cancel(message["generation_id"])
+                    continue
+                future = self._pending.get(message.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(message.get("result"))
+        finally:
+            if self._writer is writer:
+                self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Coordinator connection closed"))
+
+    async def _call(self, op: str, default: Any = None, timeout: Optional[float] = None, **args) -> Any:
+        self.requests += 1
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            async with self._connect_lock:
+                if self._writer is None or self._writer.is_closing():
+                    await self._connect()
+            self._writer.write(_encode({"id": request_id, "op": op, **args}))
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+            self.errors += 1
+            logger.warning(f"Coordinator request {op} failed: {str(e) or type(e).__name__}")
+            return default
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def register_generation(self, generation_id: str, session_id: int):
+        await self._call("register", generation_id=generation_id, session_id=session_id)
+
+    async def finish_generation(self, generation_id: str, status: str, message_id: Optional[int] = None):
+        await self._call("finish", generation_id=generation_id, status=status, message_id=message_id)
+
+    async def forget_generation(self, generation_id: str):
+        await self._call("forget", generation_id=generation_id)
+
+    async def locate_generation(self, generation_id: str, session_id: int) -> Optional[Dict[str, Any]]:
+        return await self._call("locate", generation_id=generation_id, session_id=session_id)
+
+    async def wait_generation(self, generation_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """The generation's record once it has ended; None if that takes longer than ``timeout``"""
+        return await self._call("wait", timeout=timeout, generation_id=generation_id)
+
+    async def cancel_generation(self, generation_id: str) -> bool:
+        return bool(await self._call("cancel", False, generation_id=generation_id))
+
+    async def claim_session(self, session_id: int) -> bool:
+        return bool(await self._call("claim_session", True, session_id=session_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "worker_id": self.worker_id,
+            "connected": self._writer is not None and not self._writer.is_closing(),
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancels_received": self.cancels_received,
+        }
+
+
+class CoordinatorServer:
+    """Serves one ``CoordinationState`` to every worker over a local socket"""
+
+    def __init__(self, address: str):
+        self.address = address
+        self.state = CoordinationState(self._deliver)
+        self._workers: Dict[str, asyncio.StreamWriter] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if self.address.startswith("tcp://"):
+            host, port = self.address[len("tcp://"):].rsplit(":", 1)
+            self._server = await asyncio.start_server(self._handle, host, int(port))
+            return
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # left behind by a previous run
+        self._server = await asyncio.start_unix_server(self._handle, self.address)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in list(self._workers.values()):
+            writer.close()
+        if not self.address.startswith("tcp://") and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _deliver(self, owner: str, generation_id: str) -> bool:
+        writer = self._workers.get(owner)
+        if writer is None or writer.is_closing():
+            return False
+        writer.write(_encode({"event": "cancel", "generation_id": generation_id}))
+        return True
+
+    @staticmethod
+    def _reply(writer: asyncio.StreamWriter, request_id: Any, result: Any):
+        if not writer.is_closing():
+            writer.write(_encode({"id": request_id, "result": result}))
+
+    def _dispatch(self, worker_id: str, op: str, message: Dict[str, Any]) -> Any:
+        state = self.state
+        if op == "register":
+            return state.register(worker_id, message["generation_id"], message["session_id"])
+        if op == "finish":
+            return state.finish(message["generation_id"], message["status"], message.get("message_id"))
+        if op == "forget":
+            return state.forget(message["generation_id"])
+        if op == "locate":
+            return state.locate(message["generation_id"], message["session_id"])
+        if op == "cancel":
+            return state.cancel(message["generation_id"])
+        if op == "claim_session":
+            return state.claim_session(worker_id, message["session_id"])
+        if op == "stats":
+            return state.stats()
+        raise ValueError(f"Unknown coordinator operation: {op}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker_id = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "hello":
+                    worker_id = message["worker_id"]
+                    self._workers[worker_id] = writer
+                    continue
+                request_id = message.get("id")
+                if op == "wait":
+                    generation_id = message["generation_id"]
+                    watching = self.state.watch(
+                        generation_id, lambda record, rid=request_id: self._reply(writer, rid, record)
+                    )
+                    if not watching:
+                        record = self.state.generations.get(generation_id)
+                        self._reply(writer, request_id, dict(record) if record is not None else None)
+                    continue
+                try:
+                    result = self._dispatch(worker_id, op, message)
+                except (KeyError, ValueError) as e:
+                    logger.warning(f"Bad coordinator request from {worker_id}: {str(e)}")
+                    result = None
+                self._reply(writer, request_id, result)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Coordinator connection from {worker_id} failed: {str(e)}")
+        finally:
+            if worker_id is not None and self._workers.get(worker_id) is writer:
+                del self._workers[worker_id]
+                self.state.worker_lost(worker_id)
+            writer.close()
+
+
+def serve_in_thread(address: str) -> threading.Thread:
+    """Run a ``CoordinatorServer`` on a daemon thread of the launcher; returns once it is listening"""
+    ready = threading.Event()
+    failure: List[BaseException] = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = CoordinatorServer(address)
+        try:
+            loop.run_until_complete(server.start())
+        except BaseException as e:
+            failure.append(e)
+            ready.set()
+            return
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(server.stop())
+            loop.close()
+
+    thread = threading.Thread(target=run, name="coordinator", daemon=True)
+    thread.start()
+    ready.wait()
+    if failure:
+        raise failure[0]
+    return thread
+
+
+def create_coordinator(backend: str, address: str):
+    if backend == "inprocess":
+        return InProcessCoordinator()
+    if backend == "local-socket":
+        return LocalSocketCoordinator(address)
+    raise ValueError(f"Unknown coordination backend: {backend}")
+
+
+coordinator = create_coordinator(settings.COORDINATION_BACKEND, settings.COORDINATION_ADDRESS)
@@ -0,0 +1,93 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+
+class FakeProviderError(Exception):
+    """Injected upstream failure"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeChunk:
+    __slots__ = ("content",)
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+DEFAULT_RESPONSE = (
+    "This is a simulated answer from the local fake provider. It streams word by word "
+    "with a configurable time to first token and token rate, so the chat path can be "
+    "exercised and measured without a real API key."
+)
+
+
+class FakeChatModel:
+    """
+    Local stand-in for a LangChain chat model, selected with provider ``fake``.
+
+    Behaviour is driven by the config's ``provider_options``:
+      ttft_ms          - delay before the first token
+      tokens_per_sec   - steady token rate after the first token (0 = no delay)
+      error_rate       - probability of failing before the first token
+      fail_after_tokens- fail mid-stream after this many tokens
+      status_code      - status carried by injected errors (e.g. 429)
+      response         - text to stream (defaults to a canned answer)
+      echo             - stream the last user message back instead
+    """
+
+    def __init__(self, model: str, options: Optional[Dict[str, Any]] = None):
+        options = options or {}
+        self.model = model
+        self.ttft = float(options.get("ttft_ms", 50)) / 1000
+        rate = float(options.get("tokens_per_sec", 200))
+        self.token_interval = 1 / rate if rate > 0 else 0
+        self.error_rate = float(options.get("error_rate", 0))
+        self.fail_after_tokens = options.get("fail_after_tokens")
+        self.status_code = int(options.get("status_code", 500))
+        self.response = options.get("response", DEFAULT_RESPONSE)
+        self.echo = bool(options.get("echo", False))
+        self._rng = random.Random(options.get("seed"))
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+
+    def _text_for(self, messages) -> str:
+        if self.echo and messages:
+            return str(messages[-1][1])
+        return self.response
+
+    def _maybe_fail(self):
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise FakeProviderError("Injected fake provider error", self.status_code)
+
+    def invoke(self, messages):
+        time.sleep(self.ttft)
+        self._maybe_fail()
+        return FakeMessage(self._text_for(messages))
+
+    async def astream(self, messages):
+        self.started += 1
+        words = self._text_for(messages).split(" ")
+        try:
+            await asyncio.sleep(self.ttft)
+            self._maybe_fail()
+            for i, word in enumerate(words):
+                if self.fail_after_tokens is not None and i >= int(self.fail_after_tokens):
+                    raise FakeProviderError("Injected fake provider error mid-stream", self.status_code)
+                if i and self.token_interval:
+                    await asyncio.sleep(self.token_interval)
+                yield FakeChunk(word if i == 0 else " " + word)
+            self.completed += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
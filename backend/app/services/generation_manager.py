@@ -0,0 +1,366 @@
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.crud import get_chat_message_async
+from app.database import AsyncSessionLocal
+from app.services.admission import admission_controller
+from app.services.coordination import coordinator
+from app.services.history_cache import history_cache
+from app.services.langchain_service import process_query_stream
+from app.services.message_writer import message_writer
+from app.services.metrics import CANCELLED_TOKENS_SAVED, GENERATIONS_CANCELLED
+from app.utils.stream_buffer import StreamBuffer
+from app.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest completed answer in a model's expected answer length
+_ANSWER_TOKENS_ALPHA = 0.2
+
+
+class GenerationNotFound(Exception):
+    """Unknown or expired generation id"""
+
+
+class Generation(StreamBuffer):
+    """
+    One assistant answer being produced independently of any socket.
+
+    The most recent ``buffer_chars`` characters can be replayed to a resuming
+    client; the full text is only kept until the message has been persisted.
+    """
+
+    def __init__(self, session_id: int, user_id: Any, buffer_chars: int):
+        super().__init__(buffer_chars)
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.user_id = user_id
+        self.status = "running"
+        self.message_id: Optional[int] = None
+        self.queue_position: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_reason: Optional[str] = None
+        self._parts: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def append(self, text: str):
+        if text:
+            self._parts.append(text)
+        super().append(text)
+
+    def set_queue_position(self, position: Optional[int]):
+        self.queue_position = position
+        self.notify()
+
+    async def report_queue_position(self, position: int):
+        self.set_queue_position(position)
+
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def finish(self, status: str, error: Optional[BaseException] = None):
+        self.status = status
+        self.queue_position = None
+        self._parts = []
+        super().finish(error)
+
+    async def follow(
+        self, offset: int = 0, on_queued: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> AsyncIterator[str]:
+        """The answer from ``offset`` on, reporting queue positions while it waits for admission"""
+        reported = None
+
+        async def report_position() -> bool:
+            nonlocal reported
+            if on_queued is None or self.queue_position is None or self.queue_position == reported:
+                return False
+            reported = self.queue_position
+            await on_queued(reported)
+            return True
+
+        follow = super().follow(offset, report_position)
+        try:
+            async for text in follow:
+                yield text
+        finally:
+            await follow.aclose()
+
+
+class GenerationManager:
+    """
+    Runs generations as server-side tasks so an answer survives its socket.
+
+    The task owns the admission slot, streams the answer into the generation's
+    replay buffer and persists the assistant message whether or not anyone is
+    still listening. Finished generations stay resumable for ``retention_seconds``.
+
+    Ownership is published to the coordination backend, so with several workers
+    a generation can be cancelled from any of them, and resumed from any of them
+    once its message is saved.
+
+    A generation nobody reattaches to within ``disconnect_grace`` seconds of its
+    last reader leaving is cancelled, like an explicit stop. Cancelling stops the
+    upstream stream at once and saves what was streamed so far as a truncated
+    answer.
+    """
+
+    def __init__(
+        self, buffer_chars: int, retention_seconds: float, shutdown_grace: float, remote_wait: float,
+        disconnect_grace: float,
+    ):
+        self.buffer_chars = buffer_chars
+        self.retention_seconds = retention_seconds
+        self.shutdown_grace = shutdown_grace
+        self.remote_wait = remote_wait
+        self.disconnect_grace = disconnect_grace
+        self._generations: Dict[str, Generation] = {}
+        self._latest: Dict[int, str] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.completed_unattended = 0
+        self.resumes = 0
+        self.remote_resumes = 0
+        self.cancel_reasons: Counter = Counter()
+        self.truncated_saved = 0
+        self.tokens_saved = 0.0
+        # (provider, model) -> moving average of completed answer tokens
+        self._answer_tokens: Dict[Tuple[Any, Any], float] = {}
+
+    def start(
+        self,
+        session_id: int,
+        user_id: Any,
+        messages: List[Dict[str, Any]],
+        llm_config: Dict[str, Any],
+        fallback_configs: Optional[List[Dict[str, Any]]] = None,
+    ) -> Generation:
+        generation = Generation(session_id, user_id, self.buffer_chars)
+        self._generations[generation.id] = generation
+        self._latest[session_id] = generation.id
+        self.started += 1
+        generation.task = asyncio.ensure_future(self._run(generation, messages, llm_config, fallback_configs))
+        return generation
+
+    def get(self, generation_id: str, session_id: Optional[int] = None) -> Generation:
+        """A live or recently finished generation; ``"latest"`` picks the session's newest"""
+        if generation_id == "latest" and session_id is not None:
+            generation_id = self._latest.get(session_id, "")
+        generation = self._generations.get(generation_id)
+        if generation is None or (session_id is not None and generation.session_id != session_id):
+            raise GenerationNotFound("Generation not found")
+        return generation
+
+    def resume(self, generation_id: str, session_id: int) -> Generation:
+        generation = self.get(generation_id, session_id)
+        self.resumes += 1
+        return generation
+
+    async def resume_remote(self, generation_id: str, session_id: int) -> Generation:
+        """
+        Replay a generation owned by another worker from its saved message.
+
+        Live tokens stay on the owning worker, so a running generation is waited
+        for (up to ``remote_wait``) and then sent in one piece.
+        """
+        record = await coordinator.locate_generation(generation_id, session_id)
+        if record is None:
+            raise GenerationNotFound("Generation not found")
+        if record["status"] == "running":
+            record = await coordinator.wait_generation(record["id"], self.remote_wait)
+            if record is None or record["status"] == "running":
+                raise GenerationNotFound("Generation is still running on another worker")
+        replay = Generation(session_id, None, self.buffer_chars)
+        replay.id = record["id"]
+        content = None
+        if record["status"] == "completed" and record.get("message_id") is not None:
+            async with AsyncSessionLocal() as db:
+                message = await get_chat_message_async(db, record["message_id"])
+            content = message.content if message is not None else None
+        if content is None:
+            replay.finish(record["status"], RuntimeError(f"Generation {record['status']} on another worker"))
+        else:
+            replay.append(content)
+            replay.finish("completed")
+        self.remote_resumes += 1
+        return replay
+
+    def cancel_local(self, generation_id: str, reason: str = "request") -> bool:
+        """Cancel a generation running in this worker"""
+        generation = self._generations.get(generation_id)
+        if generation is None or generation.done or generation.task is None:
+            return False
+        generation.cancel_reason = generation.cancel_reason or reason
+        generation.task.cancel()
+        return True
+
+    def release(self, generation: Generation):
+        """A reader left early: cancel the generation unless someone reattaches within ``disconnect_grace``"""
+        if self.disconnect_grace < 0 or generation.done or generation.task is None:
+            return
+        asyncio.get_running_loop().call_later(self.disconnect_grace, self._cancel_if_abandoned, generation)
+
+    def _cancel_if_abandoned(self, generation: Generation):
+        if not generation.subscribers:
+            self.cancel_local(generation.id, "disconnect")
+
+    async def cancel(self, generation_id: str, session_id: int) -> bool:
+        """Cancel a running generation on whichever worker owns it; False if it already ended"""
+        try:
+            generation = self.get(generation_id, session_id)
+        except GenerationNotFound:
+            record = await coordinator.locate_generation(generation_id, session_id)
+            if record is None:
+                raise
+            return await coordinator.cancel_generation(record["id"])
+        return self.cancel_local(generation.id)
+
+    async def _run(self, generation: Generation, messages, llm_config, fallback_configs):
+        saved = None
+        outcome: Dict[str, Any] = {}
+        try:
+            await coordinator.register_generation(generation.id, generation.session_id)
+            async with admission_controller.admit(
+                generation.user_id, llm_config, on_queued=generation.report_queue_position
+            ):
+                generation.set_queue_position(None)
+                async for chunk in process_query_stream(messages, llm_config, fallback_configs, outcome):
+                    generation.append(chunk)
+            answer = generation.text()
+            tokens = estimate_tokens(answer)
+            saved = message_writer.submit(generation.session_id, "assistant", answer, token_count=tokens)
+            if settings.MESSAGE_WRITE_DURABLE:
+                generation.message_id = await asyncio.shield(saved)
+            if await coordinator.claim_session(generation.session_id):
+                # Another worker wrote to this session since we cached it
+                history_cache.invalidate(generation.session_id)
+            else:
+                history_cache.append(generation.session_id, {"role": "assistant", "content": answer, "tokens": tokens})
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            if saved is None:
+                # Still streaming: keep what the client already saw and count what we didn't pay for
+                self._record_cancel(generation, llm_config, outcome.get("upstream_cancelled", False))
+                saved = self._save_truncated(generation)
+            generation.finish("cancelled")
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Generation {generation.id} failed: {str(e)}")
+            generation.finish("failed", e)
+        else:
+            self.completed += 1
+            if not generation.subscribers:
+                self.completed_unattended += 1
+            self._record_answer(llm_config, tokens)
+            generation.finish("completed")
+        finally:
+            self._spawn(self._announce(generation, saved))
+            asyncio.get_running_loop().call_later(self.retention_seconds, self._forget, generation.id)
+
+    def _save_truncated(self, generation: Generation) -> Optional[asyncio.Future]:
+        """Queue the part of a cancelled answer streamed so far, flagged as truncated"""
+        answer = generation.text()
+        if not answer:
+            return None
+        tokens = estimate_tokens(answer)
+        history_cache.append(generation.session_id, {"role": "assistant", "content": answer, "tokens": tokens})
+        self.truncated_saved += 1
+        return message_writer.submit(generation.session_id, "assistant", answer, token_count=tokens, truncated=True)
+
+    def _record_answer(self, llm_config: Dict[str, Any], tokens: int):
+        key = (llm_config.get("provider"), llm_config.get("model_name"))
+        average = self._answer_tokens.get(key)
+        self._answer_tokens[key] = tokens if average is None else average + _ANSWER_TOKENS_ALPHA * (tokens - average)
+
+    def _record_cancel(self, generation: Generation, llm_config: Dict[str, Any], upstream_cancelled: bool):
+        """
+        Count a cancellation and estimate the completion tokens it saved.
+
+        Tokens are only saved when the provider stream was actually closed: not
+        when single-flight kept it running for other subscribers, nor for a
+        replayed cached answer. The rest of the answer is never seen, so it is
+        estimated as the model's average completed answer (capped by
+        ``max_tokens``) minus what was already streamed.
+        """
+        reason = generation.cancel_reason or "shutdown"
+        self.cancel_reasons[reason] += 1
+        GENERATIONS_CANCELLED.labels(reason).inc()
+        if not upstream_cancelled:
+            return
+        provider, model = llm_config.get("provider"), llm_config.get("model_name")
+        expected = self._answer_tokens.get((provider, model))
+        budget = llm_config.get("max_tokens")
+        if expected is None or (budget and budget < expected):
+            expected = budget or 0
+        saved = max(expected - estimate_tokens(generation.text()), 0)
+        self.tokens_saved += saved
+        CANCELLED_TOKENS_SAVED.labels(str(provider or "default"), str(model or "default")).inc(saved)
+
+    async def _announce(self, generation: Generation, saved: Optional[asyncio.Future]):
+        """Publish how the generation ended once its message (if any) is committed"""
+        status, message_id = generation.status, generation.message_id
+        if saved is not None and message_id is None:
+            try:
+                message_id = await asyncio.shield(saved)
+            except Exception:
+                status = "failed"
+        await coordinator.finish_generation(generation.id, status, message_id)
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _forget(self, generation_id: str):
+        generation = self._generations.pop(generation_id, None)
+        if generation is not None and self._latest.get(generation.session_id) == generation_id:
+            del self._latest[generation.session_id]
+        self._spawn(coordinator.forget_generation(generation_id))
+
+    async def shutdown(self):
+        """Let running generations finish (up to the grace period), then cancel the rest"""
+        tasks = [g.task for g in self._generations.values() if g.task is not None and not g.task.done()]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.shutdown_grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        # Publish the outcomes before the coordinator connection goes away
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        generations = list(self._generations.values())
+        return {
+            "running": sum(1 for g in generations if not g.done),
+            "retained": len(generations),
+            "subscribers": sum(g.subscribers for g in generations),
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "completed_unattended": self.completed_unattended,
+            "resumes": self.resumes,
+            "remote_resumes": self.remote_resumes,
+            "cancel_reasons": dict(self.cancel_reasons),
+            "truncated_saved": self.truncated_saved,
+            "tokens_saved": round(self.tokens_saved),
+        }
+
+
+generation_manager = GenerationManager(
+    buffer_chars=settings.GENERATION_REPLAY_BUFFER_CHARS,
+    retention_seconds=settings.GENERATION_RETENTION_SECONDS,
+    shutdown_grace=settings.GENERATION_SHUTDOWN_GRACE_SECONDS,
+    remote_wait=settings.COORDINATION_RESUME_WAIT_SECONDS,
+    disconnect_grace=settings.GENERATION_DISCONNECT_GRACE_SECONDS,
+)
@@ -0,0 +1,112 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+# Rough per-message overhead of the dict holding role/content
+_MESSAGE_OVERHEAD = sys.getsizeof({"role": "", "content": ""})
+
+
+def _message_size(message: Dict[str, Any]) -> int:
+    return _MESSAGE_OVERHEAD + sys.getsizeof(message["role"]) + sys.getsizeof(message["content"])
+
+
+class _Entry:
+    __slots__ = ("messages", "size")
+
+    def __init__(self, messages: List[Dict[str, Any]]):
+        self.messages = messages
+        self.size = sum(_message_size(m) for m in messages)
+
+
+class SessionHistoryCache:
+    """
+    In-process cache of formatted chat history per session.
+
+    Resident sessions grow by appending new messages in place; cold sessions are
+    evicted least-recently-used first once the resident size exceeds ``max_bytes``.
+    The returned lists are shared with the cache and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: int) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry.messages
+
+    def append(self, session_id: int, message: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Append to a resident session and return its history, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            size = _message_size(message)
+            entry.messages.append(message)
+            entry.size += size
+            self.resident_bytes += size
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            self._evict()
+            return entry.messages
+
+    def load(self, session_id: int, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Populate a session from the database rows; returns the list either way"""
+        entry = _Entry(messages)
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            if previous is not None:
+                self.resident_bytes -= previous.size
+            if entry.size <= self.max_bytes:
+                self._entries[session_id] = entry
+                self.resident_bytes += entry.size
+                self._evict()
+        return messages
+
+    def invalidate(self, session_id: int):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self.resident_bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.resident_bytes = 0
+
+    def _evict(self):
+        while self.resident_bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.resident_bytes -= entry.size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+history_cache = SessionHistoryCache(max_bytes=settings.HISTORY_CACHE_MAX_BYTES)
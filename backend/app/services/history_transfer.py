@@ -0,0 +1,258 @@
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import insert_chat_messages, iter_session_messages, record_session_activity
+from app.models import ChatSession
+from app.services.search_index import search_index
+from app.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+_ROLES = {"user", "assistant", "system"}
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def split_lines(chunks: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """
+    Lines of a streamed body; only the current partial line is buffered.
+
+    Chunks are appended in place and only the new bytes are searched for a
+    newline, so a long line arriving in many chunks costs linear time.
+    """
+    buffer = bytearray()
+    async for chunk in chunks:
+        start = 0
+        scanned = len(buffer)
+        buffer += chunk
+        newline = buffer.find(b"\n", scanned)
+        while newline != -1:
+            yield bytes(buffer[start:newline])
+            start = newline + 1
+            newline = buffer.find(b"\n", start)
+        if start:
+            del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(f"Line longer than {max_line_bytes} bytes")
+    if buffer:
+        yield bytes(buffer)
+
+
+def _timestamp(value: Any) -> datetime:
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class HistoryTransfer:
+    """
+    Streaming NDJSON export and import of a user's chat history.
+
+    The file starts with an ``export`` header, then each session is a
+    ``session`` record followed by its ``message`` records in order. Export
+    reads sessions in id batches and messages with ``yield_per``, so memory
+    stays flat however large the history is. Import buffers at most
+    ``batch_size`` messages and inserts them (with their sessions, search index
+    rows and session counters) in one short transaction per batch, so the
+    single writer is not held while the upload is still arriving.
+    """
+
+    def __init__(self, batch_size: int, chunk_bytes: int, max_line_bytes: int):
+        self.batch_size = batch_size
+        self.chunk_bytes = chunk_bytes
+        self.max_line_bytes = max_line_bytes
+        self.exports = 0
+        self.exported_messages = 0
+        self.imports = 0
+        self.imports_running = 0
+        self.imported_sessions = 0
+        self.imported_messages = 0
+        self.rejected_lines = 0
+
+    def export_lines(self, db: Session, user_id: int, session_batch: int = 100) -> Iterator[str]:
+        """NDJSON lines of every session and message of a user"""
+        self.exports += 1
+        yield json.dumps({
+            "type": "export", "version": FORMAT_VERSION, "exported_at": datetime.now(timezone.utc).isoformat(),
+        }) + "\n"
+        last_id = 0
+        while True:
+            sessions = db.execute(
+                select(ChatSession.id, ChatSession.title, ChatSession.created_at)
+                .where(ChatSession.user_id == user_id, ChatSession.id > last_id)
+                .order_by(ChatSession.id)
+                .limit(session_batch)
+            ).all()
+            if not sessions:
+                break
+            for session_id, title, created_at in sessions:
+                yield json.dumps({
+                    "type": "session", "id": session_id, "title": title,
+                    "created_at": created_at.isoformat() if created_at else None,
+                }, ensure_ascii=False) + "\n"
+                for message in iter_session_messages(db, session_id):
+                    self.exported_messages += 1
+                    yield json.dumps({
+                        "type": "message", "session_id": session_id, "role": message.role,
+                        "content": message.content, "token_count": message.token_count,
+                        "truncated": bool(message.truncated),
+                        "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+                    }, ensure_ascii=False) + "\n"
+                # End the read transaction between sessions so a long export doesn't pin the WAL
+                db.commit()
+            last_id = sessions[-1][0]
+
+    def export_chunks(self, db: Session, user_id: int) -> Iterator[bytes]:
+        """``export_lines`` grouped into ``chunk_bytes`` chunks for a chunked response"""
+        pending: List[bytes] = []
+        size = 0
+        for line in self.export_lines(db, user_id):
+            encoded = line.encode("utf-8")
+            pending.append(encoded)
+            size += len(encoded)
+            if size >= self.chunk_bytes:
+                yield b"".join(pending)
+                pending, size = [], 0
+        if pending:
+            yield b"".join(pending)
+
+    async def import_lines(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        llm_config_id: int,
+        lines: AsyncIterable[bytes],
+        batch_size: Optional[int] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Import NDJSON records as new sessions of ``user_id`` on ``llm_config_id``.
+
+        Malformed records, and messages whose session was not declared earlier
+        in the stream, are skipped and reported. Batches commit as they go, so
+        an interrupted import keeps what was already inserted.
+        """
+        batch_size = batch_size or self.batch_size
+        result: Dict[str, Any] = {"sessions": 0, "messages": 0, "rejected": 0, "errors": []}
+        session_ids: Dict[Any, Optional[int]] = {}
+        new_sessions: Dict[Any, ChatSession] = {}
+        pending: List[Dict[str, Any]] = []
+        started = time.perf_counter()
+
+        def reject(line_number: int, reason: str):
+            result["rejected"] += 1
+            self.rejected_lines += 1
+            if len(result["errors"]) < 20:
+                result["errors"].append(f"line {line_number}: {reason}")
+
+        async def flush():
+            if not pending and not new_sessions:
+                return
+            # Sessions without a created_at start at their earliest message; record_session_activity
+            # only ever moves last_activity forward, up to the latest one
+            earliest: Dict[Any, datetime] = {}
+            for values in pending:
+                if values["key"] not in earliest or values["timestamp"] < earliest[values["key"]]:
+                    earliest[values["key"]] = values["timestamp"]
+            for key, chat_session in new_sessions.items():
+                if chat_session.last_activity is None:
+                    chat_session.last_activity = earliest.get(key, datetime.now(timezone.utc))
+            db.add_all(new_sessions.values())
+            await db.flush()
+            for key, chat_session in new_sessions.items():
+                session_ids[key] = chat_session.id
+            rows = [dict(values, session_id=session_ids[values.pop("key")]) for values in pending]
+            messages = await db.run_sync(insert_chat_messages, rows)
+            await db.run_sync(search_index.index, messages)
+            await db.run_sync(record_session_activity, messages)
+            await db.commit()
+            db.expunge_all()
+            result["sessions"] += len(new_sessions)
+            result["messages"] += len(messages)
+            self.imported_sessions += len(new_sessions)
+            self.imported_messages += len(messages)
+            new_sessions.clear()
+            pending.clear()
+            if on_progress is not None:
+                on_progress({**result, "seconds": time.perf_counter() - started})
+
+        self.imports += 1
+        self.imports_running += 1
+        try:
+            line_number = 0
+            async for line in lines:
+                line_number += 1
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    kind = record.get("type")
+                    if kind == "session":
+                        key = record["id"]
+                        if key in session_ids:
+                            raise ValueError(f"duplicate session {key}")
+                        chat_session = ChatSession(user_id=user_id, llm_config_id=llm_config_id, title=record.get("title"))
+                        if record.get("created_at"):
+                            chat_session.created_at = chat_session.last_activity = _timestamp(record["created_at"])
+                        session_ids[key] = None
+                        new_sessions[key] = chat_session
+                    elif kind == "message":
+                        key = record["session_id"]
+                        if key not in session_ids:
+                            raise ValueError(f"unknown session {key}")
+                        role, content = record["role"], record["content"]
+                        if role not in _ROLES or not isinstance(content, str):
+                            raise ValueError("invalid role or content")
+                        pending.append({
+                            "key": key,
+                            "role": role,
+                            "content": content,
+                            "token_count": record.get("token_count") or estimate_tokens(content),
+                            "truncated": bool(record.get("truncated")),
+                            "timestamp": _timestamp(record["timestamp"]) if record.get("timestamp")
+                            else datetime.now(timezone.utc),
+                        })
+                    elif kind != "export":
+                        raise ValueError(f"unknown record type {kind!r}")
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    reject(line_number, str(e))
+                    continue
+                if len(pending) >= batch_size:
+                    await flush()
+            await flush()
+        finally:
+            self.imports_running -= 1
+        result["seconds"] = time.perf_counter() - started
+        logger.info(
+            f"Imported {result['sessions']} sessions / {result['messages']} messages for user {user_id} "
+            f"({result['rejected']} lines rejected) in {result['seconds']:.1f}s"
+        )
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "exports": self.exports,
+            "exported_messages": self.exported_messages,
+            "imports": self.imports,
+            "imports_running": self.imports_running,
+            "imported_sessions": self.imported_sessions,
+            "imported_messages": self.imported_messages,
+            "rejected_lines": self.rejected_lines,
+        }
+
+
+history_transfer = HistoryTransfer(
+    batch_size=settings.HISTORY_IMPORT_BATCH_SIZE,
+    chunk_bytes=settings.HISTORY_EXPORT_CHUNK_BYTES,
+    max_line_bytes=settings.HISTORY_IMPORT_MAX_LINE_BYTES,
+)
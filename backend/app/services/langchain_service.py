@@ -1,22 +1,12 @@
-import time
-from langchain_groq import ChatGroq
-from app.core.config import settings
-import asyncio
+from app.services.llm_client_pool import get_llm_client, resolve_llm_config
+from app.services.context_builder import fit_to_budget, get_token_budget
+from app.services.response_cache import response_cache, request_fingerprint, is_cacheable, replay
+from app.services.provider_router import provider_router
+from app.services.single_flight import single_flight
 
 
 def process_query(query: str, llm_config=None):
-    api_key = llm_config.get('api_key') if llm_config else settings.GROQ_API_KEY
-    model = llm_config.get('model_name', 'deepseek-r1-distill-llama-70b') if llm_config else 'deepseek-r1-distill-llama-70b'
-    
-    llm = ChatGroq(
-        model=model,
-        temperature=llm_config.get('temperature', 0) if llm_config else 0,
-        max_tokens=llm_config.get('max_tokens') if llm_config else None,
-        reasoning_format="parsed",
-        timeout=None,
-        max_retries=2,
-        api_key=api_key,
-    )
+    llm = get_llm_client(llm_config)
     messages = [
         ("system", "You are a helpful assistant. Answer the user's question."),
         ("human", query),
@@ -26,21 +16,58 @@ def process_query(query: str, llm_config=None):
         "response": ai_msg.content
     }
 
-# Accepts a list of messages (dicts with 'role' and 'content') and LLM config
-async def process_query_stream(messages, llm_config=None):
-    api_key = llm_config.get('api_key') if llm_config else settings.GROQ_API_KEY
-    model = llm_config.get('model_name', 'deepseek-r1-distill-llama-70b') if llm_config else 'deepseek-r1-distill-llama-70b'
+def build_llm_config(record):
+    """Service-level config dict for a stored UserLLMConfig (provider must be loaded)"""
+    params = record.config_params or {}
+    return {
+        'provider': record.provider.name if record.provider else None,
+        'api_key': record.api_key_encrypted,  # TODO: Decrypt this
+        'model_name': record.model_name,
+        'temperature': params.get('temperature', 0),
+        'max_tokens': params.get('max_tokens'),
+        'context_token_budget': params.get('context_token_budget'),
+        'response_cache': params.get('response_cache', True),
+        'provider_options': params.get('provider_options'),
+    }
+
+def _prompt_for(messages, llm_config):
+    # Keep the prompt inside the model's token budget, as (role, content) pairs
+    fitted = fit_to_budget(messages, get_token_budget(llm_config))
+    return fitted, [(m['role'], m['content']) for m in fitted]
+
+# Accepts a list of messages (dicts with 'role' and 'content'), the LLM config and
+# optional fallback configs that are hedged to when the primary is slow or failing.
+# ``outcome`` is filled with how the stream ended (e.g. ``upstream_cancelled``).
+async def process_query_stream(messages, llm_config=None, fallback_configs=None, outcome=None):
+    llm_config = resolve_llm_config(llm_config)
+    messages, formatted_messages = _prompt_for(messages, llm_config)
+    
+    # Deterministic requests may be answered from the response cache
+    cache_key = request_fingerprint(messages, llm_config) if is_cacheable(llm_config) else None
+    if cache_key:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            async for piece in replay(cached):
+                yield piece
+            return
+    
+    candidates = [(llm_config, formatted_messages)]
+    for fallback in fallback_configs or ():
+        fallback = resolve_llm_config(fallback)
+        candidates.append((fallback, _prompt_for(messages, fallback)[1]))
+    
+    # Identical concurrent requests on the same API key share one upstream stream
+    flight_key = None
+    if single_flight.enabled:
+        flight_key = cache_key or request_fingerprint(messages, llm_config)
+    outcome = {} if outcome is None else outcome
+    chunks = []
+    async for token in single_flight.stream(
+        flight_key, lambda flight_outcome: provider_router.stream(candidates, flight_outcome), outcome
+    ):
+        chunks.append(token)
+        yield token
     
-    llm = ChatGroq(
-        model=model,
-        temperature=llm_config.get('temperature', 0) if llm_config else 0,
-        max_tokens=llm_config.get('max_tokens') if llm_config else None,
-        reasoning_format="parsed",
-        timeout=None,
-        max_retries=2,
-        api_key=api_key,
-    )
-    # Convert messages to the format expected by the LLM: list of (role, content)
-    formatted_messages = [(m['role'], m['content']) for m in messages]
-    async for chunk in llm.astream(formatted_messages):
-        yield chunk.content
+    # Only the primary's answer is stored under the primary's fingerprint (and only once per flight)
+    if cache_key and outcome.get('config') is llm_config:
+        response_cache.put(cache_key, llm_config['model_name'], "".join(chunks))
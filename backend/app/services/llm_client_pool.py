@@ -0,0 +1,279 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from langchain_groq import ChatGroq
+from app.core.config import settings
+
+DEFAULT_MODEL = 'deepseek-r1-distill-llama-70b'
+
+
+class ConnectionStats:
+    """Counts outbound requests and the TCP connections opened to serve them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(self.requests - self.connections_opened, 0),
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+def _sync_trace(event_name: str, info: Dict[str, Any]):
+    if event_name == "connection.connect_tcp.complete":
+        connection_stats.record_connect()
+
+
+async def _async_trace(event_name: str, info: Dict[str, Any]):
+    if event_name == "connection.connect_tcp.complete":
+        connection_stats.record_connect()
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        connection_stats.record_request()
+        request.extensions["trace"] = _sync_trace
+        return super().handle_request(request)
+
+
+class _AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        connection_stats.record_request()
+        request.extensions["trace"] = _async_trace
+        return await super().handle_async_request(request)
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+class SharedHTTPClients:
+    """Lazily created keep-alive httpx clients shared by every pooled LLM client"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                self._sync_client = httpx.Client(
+                    transport=_CountingTransport(limits=_http_limits()),
+                    timeout=None,
+                )
+            return self._sync_client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None or self._async_client.is_closed:
+                self._async_client = httpx.AsyncClient(
+                    transport=_AsyncCountingTransport(limits=_http_limits()),
+                    timeout=None,
+                )
+            return self._async_client
+
+    async def aclose(self):
+        with self._lock:
+            sync_client, async_client = self._sync_client, self._async_client
+            self._sync_client = self._async_client = None
+        if sync_client is not None:
+            sync_client.close()
+        if async_client is not None:
+            await async_client.aclose()
+
+
+shared_http_clients = SharedHTTPClients()
+
+
+def api_key_fingerprint(api_key: Optional[str]) -> str:
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+
+def _params_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def _build_groq_client(api_key: Optional[str], model: str, params: Dict[str, Any]):
+    return ChatGroq(
+        model=model,
+        temperature=params.get('temperature', 0),
+        max_tokens=params.get('max_tokens'),
+        reasoning_format="parsed",
+        timeout=None,
+        max_retries=2,
+        api_key=api_key,
+        http_client=shared_http_clients.sync_client,
+        http_async_client=shared_http_clients.async_client,
+    )
+
+
+def _build_openai_client(api_key: Optional[str], model: str, params: Dict[str, Any]):
+    try:
+        from langchain_openai import ChatOpenAI
+    except ImportError:
+        raise ValueError("The openai provider requires the langchain-openai package")
+    return ChatOpenAI(
+        model=model,
+        temperature=params.get('temperature', 0),
+        max_tokens=params.get('max_tokens'),
+        timeout=None,
+        max_retries=2,
+        api_key=api_key,
+        http_client=shared_http_clients.sync_client,
+        http_async_client=shared_http_clients.async_client,
+    )
+
+
+def _build_anthropic_client(api_key: Optional[str], model: str, params: Dict[str, Any]):
+    try:
+        from langchain_anthropic import ChatAnthropic
+    except ImportError:
+        raise ValueError("The anthropic provider requires the langchain-anthropic package")
+    kwargs = {'max_tokens': params['max_tokens']} if params.get('max_tokens') else {}
+    return ChatAnthropic(
+        model=model,
+        temperature=params.get('temperature', 0),
+        timeout=None,
+        max_retries=2,
+        api_key=api_key,
+        **kwargs,
+    )
+
+
+def _build_fake_client(api_key: Optional[str], model: str, params: Dict[str, Any]):
+    from app.services.fake_provider import FakeChatModel
+    return FakeChatModel(model, params.get('provider_options'))
+
+
+CLIENT_BUILDERS = {
+    "groq": _build_groq_client,
+    "openai": _build_openai_client,
+    "anthropic": _build_anthropic_client,
+    "fake": _build_fake_client,
+}
+
+
+class LLMClientRegistry:
+    """LRU/TTL registry of LLM clients keyed by (provider, api key, model, params)"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clients: "OrderedDict[Tuple[str, str, str, str], Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, provider: str, api_key: Optional[str], model: str, params: Optional[Dict[str, Any]] = None):
+        params = params or {}
+        key = (provider, api_key_fingerprint(api_key), model, _params_key(params))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                client, created_at = entry
+                if now - created_at < self.ttl_seconds:
+                    self._clients.move_to_end(key)
+                    self.hits += 1
+                    return client
+                del self._clients[key]
+                self.evictions += 1
+            self.misses += 1
+
+        builder = CLIENT_BUILDERS.get(provider)
+        if builder is None:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        client = builder(api_key, model, params)
+
+        with self._lock:
+            self._clients[key] = (client, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                **connection_stats.snapshot(),
+            }
+
+
+client_registry = LLMClientRegistry(
+    max_size=settings.LLM_CLIENT_CACHE_SIZE,
+    ttl_seconds=settings.LLM_CLIENT_TTL_SECONDS,
+)
+
+
+def resolve_llm_config(llm_config=None) -> Dict[str, Any]:
+    """Fill in defaults, falling back to the server Groq key when no config is given"""
+    if not llm_config:
+        return {
+            'provider': 'groq',
+            'api_key': settings.GROQ_API_KEY,
+            'model_name': DEFAULT_MODEL,
+            'temperature': 0,
+            'max_tokens': None,
+        }
+    return {
+        **llm_config,
+        'provider': llm_config.get('provider') or 'groq',
+        'model_name': llm_config.get('model_name') or DEFAULT_MODEL,
+        'temperature': llm_config.get('temperature', 0),
+        'max_tokens': llm_config.get('max_tokens'),
+    }
+
+
+def client_params(llm_config: Dict[str, Any]) -> Dict[str, Any]:
+    """The generation parameters that distinguish one pooled client from another"""
+    params = {'temperature': llm_config['temperature'], 'max_tokens': llm_config['max_tokens']}
+    if llm_config.get('provider_options'):
+        params['provider_options'] = llm_config['provider_options']
+    return params
+
+
+def get_llm_client(llm_config=None):
+    """Return a pooled client for the given LLM config"""
+    config = resolve_llm_config(llm_config)
+    return client_registry.get(config['provider'], config.get('api_key'), config['model_name'], client_params(config))
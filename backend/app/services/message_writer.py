@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.crud import create_chat_messages_async
+from app.database import AsyncSessionLocal
+from app.services.metrics import MESSAGE_WRITE_QUEUE_SECONDS
+from app.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def _consume_exception(future: asyncio.Future):
+    # Fire-and-forget writes are logged by the writer; keep asyncio from warning twice
+    if not future.cancelled():
+        future.exception()
+
+
+class MessageWriter:
+    """
+    Write-behind queue for chat messages.
+
+    Messages submitted within one flush interval are inserted in a single
+    transaction, so concurrent streams share one commit (and one fsync on SQLite)
+    instead of paying for one each. ``write(..., durable=True)`` waits for the
+    commit; ``flush()`` waits for everything queued so far; ``stop()`` drains the
+    queue before shutdown.
+    """
+
+    def __init__(self, flush_interval_ms: float, max_batch: int, window_seconds: int = 10):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.window_seconds = window_seconds
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._inflight: List[asyncio.Future] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._commit_times = deque()
+        self.commits = 0
+        self.rows = 0
+        self.failed_rows = 0
+        self.last_batch_rows = 0
+        self.max_batch_rows = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._flush_now = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._closing = True
+        self._flush_now.set()
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    def submit(self, session_id: int, role: str, content: str, token_count: Optional[int] = None,
+               truncated: bool = False) -> asyncio.Future:
+        """Queue a message; the returned future resolves to its id once committed"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        values = {
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "token_count": token_count if token_count is not None else estimate_tokens(content),
+            "truncated": truncated,
+            # Stamped at submit time so batched rows keep their arrival order
+            "timestamp": datetime.now(timezone.utc),
+        }
+        self._pending.append((values, future))
+        self._wakeup.set()
+        return future
+
+    async def write(self, session_id: int, role: str, content: str, token_count: Optional[int] = None,
+                    durable: bool = False) -> Optional[int]:
+        future = self.submit(session_id, role, content, token_count)
+        if durable:
+            return await asyncio.shield(future)
+        return None
+
+    async def flush(self):
+        """Wait until every message queued so far has been committed (or failed)"""
+        futures = [f for _, f in self._pending] + list(self._inflight)
+        if not futures:
+            return
+        self._flush_now.set()
+        await asyncio.gather(*futures, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._pending:
+                self._wakeup.clear()
+                if self._closing:
+                    return
+                continue
+            if not self._closing and not self._flush_now.is_set() and len(self._pending) < self.max_batch:
+                # Let concurrent writers pile into the same transaction
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            if not self._closing:
+                self._flush_now.clear()
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if not self._pending and not self._closing:
+                self._wakeup.clear()
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        futures = [f for _, f in batch]
+        self._inflight = futures
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = await create_chat_messages_async(db, [values for values, _ in batch])
+        except Exception as e:
+            self.failed_rows += len(batch)
+            logger.error(f"Failed to persist {len(batch)} chat messages: {str(e)}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self._record_commit(len(rows))
+            committed = datetime.now(timezone.utc)
+            for values, _ in batch:
+                MESSAGE_WRITE_QUEUE_SECONDS.observe((committed - values["timestamp"]).total_seconds())
+            for future, row in zip(futures, rows):
+                if not future.done():
+                    future.set_result(row.id)
+        finally:
+            self._inflight = []
+
+    def _record_commit(self, nrows: int):
+        now = time.monotonic()
+        self.commits += 1
+        self.rows += nrows
+        self.last_batch_rows = nrows
+        self.max_batch_rows = max(self.max_batch_rows, nrows)
+        self._commit_times.append(now)
+        while self._commit_times and self._commit_times[0] < now - self.window_seconds:
+            self._commit_times.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        cutoff = time.monotonic() - self.window_seconds
+        recent_commits = sum(1 for t in self._commit_times if t >= cutoff)
+        return {
+            "pending": len(self._pending),
+            "commits": self.commits,
+            "rows": self.rows,
+            "failed_rows": self.failed_rows,
+            "rows_per_commit": self.rows / self.commits if self.commits else 0.0,
+            "last_batch_rows": self.last_batch_rows,
+            "max_batch_rows": self.max_batch_rows,
+            # Every commit is one fsync of the SQLite journal
+            "commits_per_sec": recent_commits / self.window_seconds,
+        }
+
+
+message_writer = MessageWriter(
+    flush_interval_ms=settings.MESSAGE_WRITE_INTERVAL_MS,
+    max_batch=settings.MESSAGE_WRITE_MAX_BATCH,
+)
@@ -0,0 +1,141 @@
+import re
+import time
+from typing import Dict, Iterable, List
+
+from sqlalchemy import event
+
+from app.utils.metrics import Registry
+
+registry = Registry()
+
+# Stream timing, labelled by the provider/model that served the answer
+TTFT_SECONDS = registry.histogram(
+    "unichat_ttft_seconds", "Time from starting an upstream stream to its first token",
+    ("provider", "model"), buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 30),
+)
+INTER_TOKEN_SECONDS = registry.histogram(
+    "unichat_inter_token_gap_seconds", "Gap between consecutive upstream tokens",
+    ("provider", "model"), buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+TOKENS_PER_SECOND = registry.histogram(
+    "unichat_stream_tokens_per_second", "Upstream tokens per second after the first token, per stream",
+    ("provider", "model"), buckets=(5, 10, 20, 50, 100, 200, 500, 1000, 2000),
+)
+UPSTREAM_REQUESTS = registry.counter(
+    "unichat_upstream_requests_total", "Upstream streams started", ("provider", "model"),
+)
+UPSTREAM_ERRORS = registry.counter(
+    "unichat_upstream_errors_total", "Upstream streams that failed", ("provider", "model"),
+)
+GENERATIONS_CANCELLED = registry.counter(
+    "unichat_generations_cancelled_total", "Generations cancelled before their answer finished", ("reason",),
+)
+CANCELLED_TOKENS_SAVED = registry.counter(
+    "unichat_cancelled_tokens_saved_total",
+    "Estimated completion tokens not generated because the generation was cancelled", ("provider", "model"),
+)
+
+# Database and queueing
+DB_QUERY_SECONDS = registry.histogram(
+    "unichat_db_query_seconds", "Database statement latency", ("engine", "operation"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+POOL_WAIT_SECONDS = registry.histogram(
+    "unichat_db_pool_wait_seconds", "Time spent waiting for a pooled database connection", ("pool",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+MESSAGE_WRITE_QUEUE_SECONDS = registry.histogram(
+    "unichat_message_write_queue_seconds", "Time a chat message waits in the write-behind queue until committed",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    "unichat_admission_wait_seconds", "Time a generation waits for admission",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+# Connections
+ACTIVE_WEBSOCKETS = registry.gauge(
+    "unichat_active_websockets", "Open chat WebSocket connections", ("endpoint",),
+)
+ACTIVE_SSE_STREAMS = registry.gauge(
+    "unichat_active_sse_streams", "Open chat Server-Sent Events streams", ("endpoint",),
+)
+
+
+class StreamMeter:
+    """Per-stream timing; ``token()`` is called once per upstream chunk"""
+
+    __slots__ = ("_gap", "_rate", "first_at", "last_at", "tokens")
+
+    def __init__(self, provider: str, model: str, started: float):
+        labels = (provider, model)
+        TTFT_SECONDS.labels(*labels).observe(time.monotonic() - started)
+        self._gap = INTER_TOKEN_SECONDS.labels(*labels)
+        self._rate = TOKENS_PER_SECOND.labels(*labels)
+        self.first_at = self.last_at = time.monotonic()
+        self.tokens = 1
+
+    def token(self):
+        now = time.monotonic()
+        self._gap.observe(now - self.last_at)
+        self.last_at = now
+        self.tokens += 1
+
+    def finish(self):
+        elapsed = self.last_at - self.first_at
+        if self.tokens > 1 and elapsed > 0:
+            self._rate.observe((self.tokens - 1) / elapsed)
+
+
+def record_upstream_start(provider: str, model: str):
+    UPSTREAM_REQUESTS.labels(provider, model).inc()
+
+
+def record_upstream_error(provider: str, model: str):
+    UPSTREAM_ERRORS.labels(provider, model).inc()
+
+
+def _operation(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def instrument_engine(engine, name: str):
+    """Time every statement on a (sync) engine into ``unichat_db_query_seconds``"""
+    children: Dict[str, object] = {}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        operation = _operation(statement)
+        child = children.get(operation)
+        if child is None:
+            child = children[operation] = DB_QUERY_SECONDS.labels(name, operation)
+        child.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        if context.connection is not None:
+            stack = context.connection.info.get("query_start")
+            if stack:
+                stack.pop()
+
+
+_UNSAFE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def component_stats_lines(components: Dict[str, Dict]) -> Iterable[str]:
+    """Expose the numeric top-level values of each component's ``stats()`` as gauges"""
+    lines: List[str] = []
+    for component, values in components.items():
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = _UNSAFE.sub("_", f"unichat_{component}_{key}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return lines
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from app.auth import pwd_context
+from app.core.config import settings
+
+
+class PasswordPoolOverloaded(Exception):
+    """Raised instead of queueing when the password pool is at capacity"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt work on a dedicated, bounded thread pool.
+
+    bcrypt releases the GIL, so threads give real parallelism while keeping
+    password work off the event loop and out of the shared threadpool that serves
+    sync routes. Once ``workers + max_queue`` operations are outstanding, new
+    requests fail fast with ``PasswordPoolOverloaded`` instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._outstanding >= self.capacity:
+                self.rejected += 1
+                raise PasswordPoolOverloaded()
+            self._outstanding += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+            executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also returns a new hash when the stored cost is outdated"""
+        valid, new_hash = await self._run(pwd_context.verify_and_update, password, hashed)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "outstanding": self._outstanding,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.llm_client_pool import get_llm_client
+from app.services.admission import admission_controller
+from app.services.metrics import StreamMeter, record_upstream_start, record_upstream_error
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of a non-empty sample"""
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class LatencyTracker:
+    """Rolling time-to-first-token samples and error counts per (provider, model)"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._lock = threading.Lock()
+        self._ttft: Dict[Tuple[str, str], Deque[float]] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+
+    def record_ttft(self, key: Tuple[str, str], seconds: float):
+        with self._lock:
+            samples = self._ttft.get(key)
+            if samples is None:
+                samples = self._ttft[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def record_error(self, key: Tuple[str, str]):
+        with self._lock:
+            self._errors[key] = self._errors.get(key, 0) + 1
+
+    def ttft_percentile(self, key: Tuple[str, str], pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = list(self._ttft.get(key, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        return percentile(samples, pct)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = set(self._ttft) | set(self._errors)
+            data = {key: (list(self._ttft.get(key, ())), self._errors.get(key, 0)) for key in keys}
+        result = {}
+        for (provider, model), (samples, errors) in sorted(data.items()):
+            result[f"{provider}/{model}"] = {
+                "samples": len(samples),
+                "ttft_p50_ms": percentile(samples, 50) * 1000 if samples else None,
+                "ttft_p95_ms": percentile(samples, 95) * 1000 if samples else None,
+                "errors": errors,
+            }
+        return result
+
+
+def _route_key(llm_config: Dict[str, Any]) -> Tuple[str, str]:
+    return (llm_config['provider'], llm_config['model_name'])
+
+
+async def _provider_stream(llm_config: Dict[str, Any], messages) -> AsyncIterator[str]:
+    llm = get_llm_client(llm_config)
+    async for chunk in llm.astream(messages):
+        # Role-only/empty chunks are not the first token
+        if chunk.content:
+            yield chunk.content
+
+
+class _Attempt:
+    """One in-flight stream whose first token is being awaited"""
+
+    def __init__(self, llm_config: Dict[str, Any], messages, hedge: bool):
+        self.config = llm_config
+        self.key = _route_key(llm_config)
+        self.hedge = hedge
+        self.started = time.monotonic()
+        record_upstream_start(*self.key)
+        self.stream = _provider_stream(llm_config, messages)
+        self.first = asyncio.ensure_future(self.stream.__anext__())
+
+    async def cancel(self):
+        self.first.cancel()
+        await asyncio.gather(self.first, return_exceptions=True)
+        try:
+            await self.stream.aclose()
+        except Exception:
+            pass
+
+
+class ProviderRouter:
+    """
+    Latency-aware routing across a primary config and its fallbacks.
+
+    The primary is asked first. If its first token has not arrived by the
+    ``hedge_percentile`` of its recent TTFT (or ``default_hedge_delay`` while there
+    are too few samples), the next fallback is started in parallel; whichever
+    produces a token first wins and the other stream is cancelled. A failure
+    before the first token fails over immediately. Once a token has been sent the
+    answer stays on that provider.
+    """
+
+    def __init__(self, hedge_percentile: float, min_samples: int, default_hedge_delay: float, window: int):
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.default_hedge_delay = default_hedge_delay
+        self.latency = LatencyTracker(window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.cancelled = 0
+
+    def hedge_delay(self, llm_config: Dict[str, Any]) -> float:
+        """Seconds to wait for a first token before hedging to the next config"""
+        observed = self.latency.ttft_percentile(_route_key(llm_config), self.hedge_percentile, self.min_samples)
+        return observed if observed is not None else self.default_hedge_delay
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    async def stream(
+        self,
+        candidates: List[Tuple[Dict[str, Any], Any]],
+        outcome: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream an answer from the first of ``candidates`` to produce a token.
+
+        ``candidates`` are ``(llm_config, messages)`` pairs, primary first. When
+        given, ``outcome['config']`` is set to the config that served the answer.
+        """
+        self._count(requests=1)
+        if len(candidates) == 1:
+            async for token in self._single(candidates[0], outcome):
+                yield token
+            return
+        pending = list(candidates)
+        attempts: List[_Attempt] = []
+        last_error: Optional[BaseException] = None
+        winner: Optional[_Attempt] = None
+        first_token = None
+
+        def launch(hedge: bool):
+            config, messages = pending.pop(0)
+            attempts.append(_Attempt(config, messages, hedge))
+
+        launch(hedge=False)
+        try:
+            while winner is None:
+                if not attempts:
+                    if not pending:
+                        raise last_error or RuntimeError("No provider produced a response")
+                    self._count(failovers=1)
+                    launch(hedge=False)
+                    continue
+                timeout = self.hedge_delay(attempts[-1].config) if pending else None
+                if timeout is not None:
+                    timeout = max(timeout - (time.monotonic() - attempts[-1].started), 0)
+                done, _ = await asyncio.wait(
+                    [attempt.first for attempt in attempts], timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self._count(hedges=1)
+                    logger.info(f"Hedging {attempts[-1].key}: no first token within its hedge delay")
+                    launch(hedge=True)
+                    continue
+                for attempt in [a for a in attempts if a.first in done]:
+                    attempts.remove(attempt)
+                    try:
+                        token = attempt.first.result()
+                    except StopAsyncIteration:
+                        # An empty answer still counts as an answer
+                        token = ""
+                    except Exception as e:
+                        self.latency.record_error(attempt.key)
+                        record_upstream_error(*attempt.key)
+                        admission_controller.record_outcome(attempt.config, e)
+                        logger.warning(f"Provider {attempt.key} failed before the first token: {str(e)}")
+                        last_error = e
+                        continue
+                    if winner is None:
+                        winner, first_token = attempt, token
+                        self.latency.record_ttft(attempt.key, time.monotonic() - attempt.started)
+                        meter = StreamMeter(*attempt.key, attempt.started)
+                    else:
+                        attempts.append(attempt)
+        finally:
+            # Losers (or everything, if the caller went away) are cancelled
+            for attempt in attempts:
+                self._count(cancelled=1)
+                await attempt.cancel()
+
+        if winner.hedge:
+            self._count(hedge_wins=1)
+        if outcome is not None:
+            outcome['config'] = winner.config
+        if first_token:
+            yield first_token
+        try:
+            async for token in winner.stream:
+                meter.token()
+                yield token
+        except Exception as e:
+            self.latency.record_error(winner.key)
+            record_upstream_error(*winner.key)
+            admission_controller.record_outcome(winner.config, e)
+            raise
+        finally:
+            await winner.stream.aclose()
+        meter.finish()
+        admission_controller.record_outcome(winner.config)
+
+    async def _single(self, candidate: Tuple[Dict[str, Any], Any], outcome: Optional[Dict[str, Any]]):
+        """Nothing to hedge to: stream directly, still recording TTFT and errors"""
+        config, messages = candidate
+        key = _route_key(config)
+        if outcome is not None:
+            outcome['config'] = config
+        started = time.monotonic()
+        record_upstream_start(*key)
+        meter = None
+        try:
+            async for token in _provider_stream(config, messages):
+                if meter is None:
+                    self.latency.record_ttft(key, time.monotonic() - started)
+                    meter = StreamMeter(*key, started)
+                else:
+                    meter.token()
+                yield token
+        except Exception as e:
+            self.latency.record_error(key)
+            record_upstream_error(*key)
+            admission_controller.record_outcome(config, e)
+            raise
+        if meter is not None:
+            meter.finish()
+        admission_controller.record_outcome(config)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failovers": self.failovers,
+                "cancelled": self.cancelled,
+            }
+        return {**counters, "providers": self.latency.snapshot()}
+
+
+provider_router = ProviderRouter(
+    hedge_percentile=settings.HEDGE_PERCENTILE,
+    min_samples=settings.HEDGE_MIN_SAMPLES,
+    default_hedge_delay=settings.HEDGE_DEFAULT_DELAY_MS / 1000,
+    window=settings.HEDGE_LATENCY_WINDOW,
+)
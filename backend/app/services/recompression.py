@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import LargeBinary, cast, func, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.database import SessionLocal, engine
+from app.models import ChatMessage
+from app.utils.compression import compress_text
+
+logger = logging.getLogger(__name__)
+
+
+class Recompressor:
+    """
+    Background job that compresses message bodies stored as plain text.
+
+    Rows written before compression was enabled (or under a higher threshold)
+    are rewritten in small committed batches with a pause in between, so the
+    sync writer never holds SQLite's write lock for long against the asyncio
+    writer that commits chat messages. Only rows that are still
+    TEXT and at least ``threshold`` bytes are read. The last scanned id is kept
+    in memory: after one sweep only newer rows are looked at, and a restart
+    sweeps once more from the start. Compression (and the ``typeof`` filter)
+    only exists on SQLite; on other databases the job never runs.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        threshold: int,
+        level: int,
+        batch_size: int,
+        interval: float,
+        pause_ms: float,
+        dialect: str,
+    ):
+        self.session_factory = session_factory
+        self.supported = dialect == "sqlite"
+        self.threshold = threshold
+        self.level = level
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause_ms / 1000
+        self.last_id = 0
+        self._task: Optional[asyncio.Task] = None
+        self.passes = 0
+        self.scanned = 0
+        self.compressed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.failures = 0
+
+    def run_once(self, on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        Sweep from the last scanned id to the end of the table; returns the
+        number of rows compressed. ``on_progress(compressed, last_id)`` runs per batch.
+        """
+        if self.threshold <= 0 or not self.supported:
+            return 0
+        compressed = 0
+        db = self.session_factory()
+        try:
+            while True:
+                rows = db.execute(
+                    select(ChatMessage.id, ChatMessage.content)
+                    .where(
+                        ChatMessage.id > self.last_id,
+                        func.typeof(ChatMessage.content) == "text",
+                        func.length(cast(ChatMessage.content, LargeBinary)) >= self.threshold,
+                    )
+                    .order_by(ChatMessage.id)
+                    .limit(self.batch_size)
+                ).all()
+                if not rows:
+                    break
+                updates = []
+                for message_id, content in rows:
+                    self.scanned += 1
+                    packed = compress_text(content, self.threshold, self.level)
+                    if isinstance(packed, bytes):
+                        updates.append({"id": message_id, "content": packed})
+                        self.bytes_before += len(content.encode("utf-8"))
+                        self.bytes_after += len(packed)
+                if updates:
+                    db.execute(update(ChatMessage), updates)
+                db.commit()
+                self.last_id = rows[-1][0]
+                compressed += len(updates)
+                self.compressed += len(updates)
+                if on_progress is not None:
+                    on_progress(compressed, self.last_id)
+                if len(rows) < self.batch_size:
+                    break
+                time.sleep(self.pause)
+        finally:
+            db.close()
+        self.passes += 1
+        return compressed
+
+    def start(self):
+        if not self.supported or self.interval <= 0 or self.threshold <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                count = await asyncio.to_thread(self.run_once)
+                if count:
+                    logger.info(f"Recompressed {count} chat messages (up to id {self.last_id})")
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Message recompression pass failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "supported": self.supported,
+            "threshold_bytes": self.threshold,
+            "passes": self.passes,
+            "scanned": self.scanned,
+            "compressed": self.compressed,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "ratio": self.bytes_after / self.bytes_before if self.bytes_before else 0.0,
+            "last_id": self.last_id,
+            "failures": self.failures,
+        }
+
+
+recompressor = Recompressor(
+    SessionLocal,
+    threshold=settings.MESSAGE_COMPRESSION_THRESHOLD_BYTES,
+    level=settings.MESSAGE_COMPRESSION_LEVEL,
+    batch_size=settings.RECOMPRESS_BATCH_SIZE,
+    interval=settings.RECOMPRESS_INTERVAL_SECONDS,
+    pause_ms=settings.RECOMPRESS_PAUSE_MS,
+    dialect=engine.dialect.name,
+)
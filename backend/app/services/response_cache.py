@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.crud import delete_expired_cached_responses_async, get_cached_response_async, save_cached_response_async
+from app.database import AsyncSessionLocal
+from app.services.llm_client_pool import api_key_fingerprint, client_params
+from app.utils.tokens import estimate_tokens
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Word-sized pieces with their trailing whitespace, used to replay cached answers
+_REPLAY_PIECES = re.compile(r"\s*\S+\s*|\s+")
+
+
+def request_fingerprint(messages: List[Dict[str, Any]], llm_config: Dict[str, Any]) -> str:
+    """
+    Stable hash of the normalized (provider, API key, model, params, messages) of a request
+
+    The key is part of it so answers are only shared between requests on the same
+    credential: a hit (and its latency) never reveals another account's prompts.
+    """
+    params = {k: v for k, v in client_params(llm_config).items() if v is not None}
+    normalized = {
+        "provider": llm_config['provider'],
+        "key": api_key_fingerprint(llm_config.get('api_key')),
+        "model": llm_config['model_name'],
+        "params": params,
+        "messages": [[m["role"].lower(), m["content"].strip()] for m in messages],
+    }
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def is_cacheable(llm_config: Dict[str, Any]) -> bool:
+    """Only deterministic completions are cached, and configs can opt out"""
+    return (
+        settings.RESPONSE_CACHE_ENABLED
+        and llm_config.get('response_cache') is not False
+        and not llm_config.get('temperature')
+    )
+
+
+async def replay(text: str) -> AsyncIterator[str]:
+    """Re-emit a cached answer as a token-like stream so clients see the usual protocol"""
+    delay = settings.RESPONSE_CACHE_REPLAY_DELAY_MS / 1000
+    for piece in _REPLAY_PIECES.findall(text):
+        yield piece
+        await asyncio.sleep(delay)
+
+
+class ResponseCache:
+    """
+    Two-tier exact-match cache of completed answers.
+
+    An in-memory LRU sits in front of the ``response_cache`` table, which survives
+    restarts. Entries older than ``ttl_seconds`` are treated as misses in both tiers;
+    storing a key again restarts its TTL, and at most every ``sweep_interval``
+    seconds a store also deletes the expired rows so the table stays bounded.
+    The LRU is per worker; the table is shared, so another worker's answers are
+    found there on an LRU miss.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, sweep_interval: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self.memory = TTLCache(max_size=max_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._pending_writes = set()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.tokens_saved = 0
+        self.expired_deleted = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is not None:
+            self._record_hit(text, persistent=False)
+            return text
+        try:
+            async with AsyncSessionLocal() as db:
+                cached = await get_cached_response_async(db, key)
+        except Exception as e:
+            logger.error(f"Response cache lookup failed: {str(e)}")
+            cached = None
+        if cached is not None and not self._expired(cached.created_at):
+            self.memory.set(key, cached.response)
+            self._record_hit(cached.response, persistent=True)
+            return cached.response
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, model_name: str, text: str):
+        """Store an answer; the persistent write runs in the background"""
+        if not text.strip():
+            return
+        self.memory.set(key, text)
+        with self._lock:
+            self.stores += 1
+        task = asyncio.ensure_future(self._persist(key, model_name, text))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+    async def drain(self):
+        if self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes), return_exceptions=True)
+
+    async def _persist(self, key: str, model_name: str, text: str):
+        try:
+            async with AsyncSessionLocal() as db:
+                await save_cached_response_async(db, key, model_name, text, estimate_tokens(text))
+                if time.monotonic() >= self._next_sweep:
+                    self._next_sweep = time.monotonic() + self.sweep_interval
+                    cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+                    deleted = await delete_expired_cached_responses_async(db, cutoff)
+                    with self._lock:
+                        self.expired_deleted += deleted
+        except Exception as e:
+            logger.error(f"Response cache store failed: {str(e)}")
+
+    def _expired(self, created_at: Optional[datetime]) -> bool:
+        if created_at is None:
+            return False
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - created_at > timedelta(seconds=self.ttl_seconds)
+
+    def _record_hit(self, text: str, persistent: bool):
+        with self._lock:
+            if persistent:
+                self.persistent_hits += 1
+            else:
+                self.memory_hits += 1
+            self.tokens_saved += estimate_tokens(text)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.persistent_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": settings.RESPONSE_CACHE_ENABLED,
+                "memory_entries": len(self.memory),
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "tokens_saved": self.tokens_saved,
+                "expired_deleted": self.expired_deleted,
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+)
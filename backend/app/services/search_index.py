@@ -0,0 +1,236 @@
+import re
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, select, text
+from sqlalchemy.orm import Session, undefer
+
+from app.core.config import settings
+from app.utils.compression import decompress_text
+
+FTS_TABLE = "chat_messages_fts"
+
+# Bare words (letters/digits in any script), optionally ending in * for a prefix search
+_TERM = re.compile(r"\w+\*?", re.UNICODE)
+# Tokens as the unicode61 tokenizer sees them: runs of letters and digits
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+_INDEX_SQL = text(f"INSERT INTO {FTS_TABLE} (rowid, content, scope) VALUES (:id, :content, :scope)")
+
+# The scope column only narrows the match; bm25 ranks on the message text alone. The index is
+# contentless, so the text for snippets comes from chat_messages (possibly compressed)
+_SEARCH_SQL = text(f"""
+    SELECT m.id, m.session_id, s.title, m.role, m.timestamp, m.content,
+           bm25({FTS_TABLE}, 1.0, 0.0) AS rank
+    FROM {FTS_TABLE}
+    JOIN chat_messages m ON m.id = {FTS_TABLE}.rowid
+    JOIN chat_sessions s ON s.id = m.session_id
+    WHERE {FTS_TABLE} MATCH :match
+    ORDER BY rank, m.id DESC
+    LIMIT :limit OFFSET :offset
+""").columns(timestamp=DateTime)
+
+_EXISTS_SQL = text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name").columns()
+
+
+def _terms(query: str, max_terms: int = 16) -> List[Tuple[str, bool]]:
+    return [(term.rstrip("*"), term.endswith("*")) for term in _TERM.findall(query)[:max_terms]]
+
+
+def match_query(query: str, max_terms: int = 16) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query that cannot be a syntax error.
+
+    Every word is quoted and all of them must match; a trailing ``*`` keeps
+    prefix search. Returns None when there is nothing to search for.
+    """
+    terms = [f'"{word}"*' if prefix else f'"{word}"' for word, prefix in _terms(query, max_terms)]
+    return " ".join(terms) or None
+
+
+def _fold(word: str) -> str:
+    # Case and diacritics folded like `unicode61 remove_diacritics 2`
+    decomposed = unicodedata.normalize("NFKD", word)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def highlight_snippet(
+    content: str, terms: Sequence[Tuple[str, bool]], open_mark: str, close_mark: str, tokens: int
+) -> str:
+    """
+    The ``tokens``-word window of ``content`` holding the most distinct query
+    terms, with matches wrapped in the marks and ``…`` where text was cut.
+    Stands in for FTS5 ``snippet()``, which needs the text stored in the index.
+    """
+    folded_terms = [(_fold(word), prefix) for word, prefix in terms]
+    words = list(_TOKEN.finditer(content))
+    if not words:
+        return content
+    tokens = max(tokens, 1)
+
+    def term_of(match) -> Optional[int]:
+        word = _fold(match.group())
+        for i, (term, prefix) in enumerate(folded_terms):
+            if word == term or (prefix and word.startswith(term)):
+                return i
+        return None
+
+    hits = {i: term for i, term in ((i, term_of(m)) for i, m in enumerate(words)) if term is not None}
+    start, best = 0, -1
+    for hit in sorted(hits):
+        # A little context before the first match
+        candidate = max(0, min(hit - tokens // 4, len(words) - tokens))
+        found = len({term for i, term in hits.items() if candidate <= i < candidate + tokens})
+        if found > best:
+            start, best = candidate, found
+    end = min(start + tokens, len(words))
+
+    parts = ["…" if start > 0 else content[:words[0].start()]]
+    position = words[start].start()
+    for i in range(start, end):
+        match = words[i]
+        parts.append(content[position:match.start()])
+        parts.append(f"{open_mark}{match.group()}{close_mark}" if i in hits else match.group())
+        position = match.end()
+    parts.append("…" if end < len(words) else content[position:])
+    return "".join(parts)
+
+
+class SearchIndex:
+    """
+    SQLite FTS5 index over chat message text, kept in sync by the CRUD inserts.
+
+    Rows are added in the same transaction as their message. Each row carries
+    a ``scope`` of ``u<user_id> s<session_id>`` so a search only ranks the
+    caller's own messages. The table is contentless: it keeps only the
+    tokens, not a second (uncompressed) copy of every body. On databases without the FTS table (not SQLite,
+    or SQLite built without FTS5) indexing is a no-op and search is unavailable.
+    """
+
+    def __init__(self, enabled: bool, snippet_tokens: int):
+        self.enabled = enabled
+        self.snippet_tokens = snippet_tokens
+        self._available: Optional[bool] = None
+        self.indexed = 0
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.backfilled = 0
+
+    def available(self, db: Session) -> bool:
+        if self._available is None:
+            if not self.enabled or db.get_bind(clause=_EXISTS_SQL).dialect.name != "sqlite":
+                self._available = False
+            else:
+                self._available = db.execute(_EXISTS_SQL, {"name": FTS_TABLE}).first() is not None
+        return self._available
+
+    def index(self, db: Session, messages: Sequence[Any]):
+        """Add flushed ChatMessage rows to the index, inside the caller's transaction"""
+        if not messages or not self.available(db):
+            return
+        from app.models import ChatSession
+
+        session_ids = {m.session_id for m in messages}
+        owners = dict(db.execute(
+            select(ChatSession.id, ChatSession.user_id).where(ChatSession.id.in_(session_ids))
+        ).all())
+        db.execute(_INDEX_SQL, [
+            {"id": m.id, "content": m.content, "scope": f"u{owners.get(m.session_id)} s{m.session_id}"}
+            for m in messages
+        ])
+        self.indexed += len(messages)
+
+    def search(
+        self,
+        db: Session,
+        user_id: int,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        session_id: Optional[int] = None,
+        highlight: Tuple[str, str] = ("<mark>", "</mark>"),
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Best matches first, one page at a time; returns the page and whether more follow"""
+        terms = match_query(query)
+        if terms is None:
+            return [], False
+        words = _terms(query)
+        scope = f'scope:"u{user_id}"'
+        if session_id is not None:
+            scope += f' AND scope:"s{session_id}"'
+        started = time.perf_counter()
+        rows = db.execute(_SEARCH_SQL, {
+            # The user's terms only match the message text, never the scope tokens
+            "match": f"{scope} AND content : ({terms})",
+            "limit": limit + 1,
+            "offset": offset,
+        }).mappings().all()
+        hits = []
+        for row in rows[:limit]:
+            hit = dict(row)
+            content = decompress_text(hit.pop("content"))
+            hit["snippet"] = highlight_snippet(content, words, highlight[0], highlight[1], self.snippet_tokens)
+            hits.append(hit)
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return hits, len(rows) > limit
+
+    def backfill(
+        self,
+        db: Session,
+        batch_size: int = 1000,
+        rebuild: bool = False,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        Index existing messages that are missing from the index, one committed
+        batch at a time. ``rebuild`` empties the index first. Returns the number
+        of rows added; ``on_progress(added, last_message_id)`` runs per batch.
+        """
+        from app.models import ChatMessage
+
+        if not self.available(db):
+            raise RuntimeError("Full-text search is not available on this database")
+        if rebuild:
+            # Contentless tables can't DELETE rows one by one
+            db.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('delete-all')"))
+            db.commit()
+        added = 0
+        last_id = 0
+        while True:
+            batch = (
+                db.query(ChatMessage).options(undefer(ChatMessage.content)).filter(ChatMessage.id > last_id)
+                .order_by(ChatMessage.id).limit(batch_size).all()
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            indexed = {
+                row[0] for row in db.execute(
+                    text(f"SELECT rowid FROM {FTS_TABLE} WHERE rowid BETWEEN :first AND :last").columns(),
+                    {"first": batch[0].id, "last": last_id},
+                )
+            }
+            missing = [m for m in batch if m.id not in indexed]
+            self.index(db, missing)
+            db.commit()
+            db.expunge_all()
+            added += len(missing)
+            self.backfilled += len(missing)
+            if on_progress is not None:
+                on_progress(added, last_id)
+        return added
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "available": bool(self._available),
+            "indexed": self.indexed,
+            "backfilled": self.backfilled,
+            "searches": self.searches,
+            "avg_search_ms": self.search_seconds / self.searches * 1000 if self.searches else 0.0,
+        }
+
+
+search_index = SearchIndex(enabled=settings.SEARCH_ENABLED, snippet_tokens=settings.SEARCH_SNIPPET_TOKENS)
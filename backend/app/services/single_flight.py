@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.utils.stream_buffer import StreamBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight(StreamBuffer):
+    def __init__(self, key: str, max_chars: int):
+        super().__init__(max_chars)
+        self.key = key
+        self.outcome: Dict[str, Any] = {}
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent upstream streams into one.
+
+    The first request for a key starts the upstream stream in its own task and
+    every request for the same key, while it runs, subscribes to it instead. Late
+    joiners are caught up from the flight's buffer as long as it still holds the
+    start of the answer. The upstream stream is cancelled once its last
+    subscriber leaves. Flights are per worker: identical requests that land on
+    different workers each make their own upstream call.
+    """
+
+    def __init__(self, buffer_chars: int, enabled: bool = True):
+        self.buffer_chars = buffer_chars
+        self.enabled = enabled
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.joins = 0
+        self.late_joins = 0
+        self.abandoned = 0
+
+    async def stream(
+        self,
+        key: Optional[str],
+        factory: Callable[[Dict[str, Any]], AsyncIterator[str]],
+        outcome: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream ``factory(outcome)`` once per key, fanning the chunks out to every caller.
+
+        Only the caller that started the flight gets its ``outcome`` filled in. A
+        ``None`` key (or a disabled layer) streams straight through. A caller that
+        leaves early finds ``upstream_cancelled`` set in its ``outcome`` only if
+        the upstream stream was closed because of it, not kept for other subscribers.
+        """
+        if not self.enabled or key is None:
+            outcome = outcome if outcome is not None else {}
+            try:
+                async for text in factory(outcome):
+                    yield text
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome["upstream_cancelled"] = True
+                raise
+            return
+
+        flight = self._flights.get(key)
+        leader = flight is None or flight.replayable_from() > 0
+        if leader:
+            flight = self._flights[key] = _Flight(key, self.buffer_chars)
+            flight.task = asyncio.ensure_future(self._pump(flight, factory))
+            self.leaders += 1
+        else:
+            self.joins += 1
+            if flight.length:
+                self.late_joins += 1
+
+        follow = flight.follow(0)
+        try:
+            async for text in follow:
+                yield text
+        finally:
+            # Close the reader now (not at garbage collection) so the subscriber count is current
+            await follow.aclose()
+            if not flight.finished and not flight.subscribers:
+                # Nobody is listening any more; stop paying for the upstream stream
+                self.abandoned += 1
+                flight.task.cancel()
+                if outcome is not None:
+                    outcome["upstream_cancelled"] = True
+        if leader and outcome is not None:
+            outcome.update(flight.outcome)
+
+    async def _pump(self, flight: _Flight, factory):
+        try:
+            async for text in factory(flight.outcome):
+                flight.append(text)
+        except asyncio.CancelledError:
+            flight.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.leaders + self.joins
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "upstream_streams": self.leaders,
+            "upstream_calls_saved": self.joins,
+            "late_joins": self.late_joins,
+            "abandoned": self.abandoned,
+            "dedup_rate": self.joins / requests if requests else 0.0,
+        }
+
+
+single_flight = SingleFlight(
+    buffer_chars=settings.SINGLE_FLIGHT_BUFFER_CHARS,
+    enabled=settings.SINGLE_FLIGHT_ENABLED,
+)
@@ -0,0 +1,135 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.admission import AdmissionRejected
+from app.services.generation_manager import Generation, generation_manager
+from app.services.metrics import ACTIVE_SSE_STREAMS
+from app.services.stream_coalescer import end_frame, frame_stats, stream_frames
+
+_END = object()
+
+
+def format_event(data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """One SSE event whose data is the same JSON frame the chat socket sends"""
+    payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return (f"id: {event_id}\n" if event_id is not None else "") + f"data: {payload}\n\n"
+
+
+def event_id(generation_id: str, offset: int) -> str:
+    return f"{generation_id}:{offset}"
+
+
+def parse_event_id(value: str) -> Tuple[str, int]:
+    """``(generation_id, offset)`` from a ``Last-Event-ID``; raises ValueError when malformed"""
+    generation_id, _, offset = value.strip().rpartition(":")
+    if not generation_id or not offset.isdigit():
+        raise ValueError(f"Invalid event id: {value}")
+    return generation_id, int(offset)
+
+
+class SSEStats:
+    def __init__(self):
+        self.streams = 0
+        self.open = 0
+        self.resumes = 0
+        self.heartbeats = 0
+        self.stalls = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams": self.streams,
+            "open": self.open,
+            "resumes": self.resumes,
+            "heartbeats": self.heartbeats,
+            "stalls": self.stalls,
+        }
+
+
+sse_stats = SSEStats()
+
+
+async def generation_events(
+    generation: Generation,
+    offset: int = 0,
+    coalescing: Optional[Tuple[int, float]] = None,
+    heartbeat: float = settings.SSE_HEARTBEAT_SECONDS,
+    queue_frames: int = settings.SSE_QUEUE_FRAMES,
+) -> AsyncIterator[str]:
+    """
+    SSE events for ``generation`` from ``offset``: the frames of the chat socket,
+    each token event tagged with ``<generation_id>:<offset>`` for ``Last-Event-ID``.
+
+    A pump reads the generation into a queue of at most ``queue_frames`` frames
+    and blocks when it is full. The response only pulls the next event once the
+    previous write has drained, so a slow client leaves its backlog in the
+    generation's shared replay buffer (coalesced into larger frames when
+    negotiated) instead of in per-connection memory. Comment lines keep idle
+    connections open through proxies. Leaving early releases the generation:
+    it is cancelled unless a reconnect resumes it within the grace period.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(queue_frames, 1))
+
+    async def on_queued(position: int):
+        await queue.put({"queued": True, "position": position})
+
+    async def pump():
+        follow = generation.follow(offset, on_queued=on_queued)
+        frames = stream_frames(follow, coalescing)
+        try:
+            async for frame in frames:
+                if queue.full():
+                    sse_stats.stalls += 1
+                await queue.put(frame)
+            await queue.put(_END)
+        except Exception as e:
+            # Rejected, no longer replayable, or failed (upstream error, lost remote generation)
+            error = {"error": str(e), "generation_id": generation.id}
+            if isinstance(e, AdmissionRejected):
+                error["retry_after"] = e.retry_after
+            await queue.put(error)
+        finally:
+            await frames.aclose()
+            await follow.aclose()
+
+    sse_stats.streams += 1
+    sse_stats.open += 1
+    ACTIVE_SSE_STREAMS.labels("chat").inc()
+    task = asyncio.ensure_future(pump())
+    try:
+        yield f"retry: {int(settings.SSE_RETRY_MS)}\n" + format_event(
+            {"generation_id": generation.id, "offset": offset}, event_id(generation.id, offset)
+        )
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                if task.done() and queue.empty():
+                    # The pump ended without a final event; don't keep an orphaned stream open
+                    error = task.exception() if not task.cancelled() else None
+                    yield format_event({"error": str(error or "Stream ended"), "generation_id": generation.id})
+                    return
+                sse_stats.heartbeats += 1
+                yield ": keep-alive\n\n"
+                continue
+            if item is _END:
+                yield format_event(end_frame(generation), event_id(generation.id, generation.length))
+                return
+            if isinstance(item, dict):
+                yield format_event(item)
+                if "error" in item:
+                    return
+                continue
+            offset += len(item)
+            event = format_event({"token": item}, event_id(generation.id, offset))
+            frame_stats.record(len(event.encode()))
+            yield event
+    finally:
+        task.cancel()
+        if not generation.done:
+            # The client went away mid-answer
+            generation_manager.release(generation)
+        await asyncio.gather(task, return_exceptions=True)
+        sse_stats.open -= 1
+        ACTIVE_SSE_STREAMS.labels("chat").dec()
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import WebSocket
+from starlette.requests import HTTPConnection
+from app.core.config import settings
+
+MAX_FRAME_BYTES = 64 * 1024
+MAX_FRAME_MS = 1000
+
+
+def negotiate_coalescing(connection: HTTPConnection) -> Optional[Tuple[int, float]]:
+    """
+    Read the per-connection frame policy from the socket's (or SSE request's) query string.
+
+    Clients opt in with ``?coalesce=1`` and may tune ``max_bytes``/``max_ms``;
+    connections that do not ask keep receiving one frame per token.
+    """
+    params = connection.query_params
+    if params.get("coalesce", "").lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        max_bytes = int(params.get("max_bytes", settings.STREAM_COALESCE_MAX_BYTES))
+        max_ms = float(params.get("max_ms", settings.STREAM_COALESCE_MAX_MS))
+    except ValueError:
+        max_bytes, max_ms = settings.STREAM_COALESCE_MAX_BYTES, settings.STREAM_COALESCE_MAX_MS
+    return min(max(max_bytes, 1), MAX_FRAME_BYTES), min(max(max_ms, 0.0), MAX_FRAME_MS)
+
+
+async def coalesce(chunks: AsyncIterator[str], max_bytes: int, max_ms: float) -> AsyncIterator[str]:
+    """
+    Merge chunks into frames, flushing after ``max_bytes`` or ``max_ms``, whichever comes first.
+
+    A single pump task drains the upstream iterator into a buffer and a timer armed
+    on the first buffered chunk forces the time-based flush, so the per-chunk cost
+    is an append rather than a task or a wait. A full buffer pauses the pump until
+    the consumer has taken it, which keeps backpressure on the upstream stream.
+    """
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    drained = asyncio.Event()
+    buffer = []
+    size = 0
+    done = False
+    error: Optional[BaseException] = None
+    timer: Optional[asyncio.TimerHandle] = None
+
+    async def pump():
+        nonlocal size, done, error, timer
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if not buffer:
+                    timer = loop.call_later(max_ms / 1000, ready.set)
+                buffer.append(chunk)
+                size += len(chunk.encode())
+                if size >= max_bytes:
+                    ready.set()
+                    drained.clear()
+                    await drained.wait()
+        except Exception as e:
+            error = e
+        finally:
+            done = True
+            ready.set()
+
+    task = asyncio.ensure_future(pump())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if timer is not None:
+                timer.cancel()
+                timer = None
+            finished = done
+            if buffer:
+                frame = "".join(buffer)
+                buffer.clear()
+                size = 0
+                drained.set()
+                yield frame
+            if finished:
+                if error is not None:
+                    raise error
+                break
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if not task.done():
+            task.cancel()
+
+
+async def stream_frames(chunks: AsyncIterator[str], coalescing: Optional[Tuple[int, float]]) -> AsyncIterator[str]:
+    """Pass chunks through unchanged, or coalesced when the connection negotiated it"""
+    if coalescing is None:
+        async for chunk in chunks:
+            yield chunk
+    else:
+        async for frame in coalesce(chunks, *coalescing):
+            yield frame
+
+
+def end_frame(generation) -> dict:
+    """The frame that ends a turn on either transport; a stopped or cancelled answer is marked truncated"""
+    frame = {"end": True, "generation_id": generation.id, "length": generation.length}
+    if generation.status == "cancelled":
+        frame["truncated"] = True
+    return frame
+
+
+class FrameStats:
+    """Frame and byte totals plus rates over a short sliding window"""
+
+    def __init__(self, window_seconds: int = 10):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._buckets = deque()  # [second, frames, bytes]
+        self.frames = 0
+        self.bytes = 0
+
+    def record(self, nbytes: int):
+        second = int(time.monotonic())
+        with self._lock:
+            self.frames += 1
+            self.bytes += nbytes
+            if self._buckets and self._buckets[-1][0] == second:
+                bucket = self._buckets[-1]
+                bucket[1] += 1
+                bucket[2] += nbytes
+            else:
+                self._buckets.append([second, 1, nbytes])
+                while self._buckets and self._buckets[0][0] <= second - self.window_seconds:
+                    self._buckets.popleft()
+
+    def stats(self) -> Dict[str, float]:
+        cutoff = int(time.monotonic()) - self.window_seconds
+        with self._lock:
+            recent = [b for b in self._buckets if b[0] > cutoff]
+            return {
+                "frames": self.frames,
+                "bytes": self.bytes,
+                "frames_per_sec": sum(b[1] for b in recent) / self.window_seconds,
+                "bytes_per_sec": sum(b[2] for b in recent) / self.window_seconds,
+            }
+
+
+frame_stats = FrameStats()
+
+
+async def send_token_frame(websocket: WebSocket, frame: str):
+    payload = json.dumps({"token": frame}, separators=(",", ":"), ensure_ascii=False)
+    await websocket.send_text(payload)
+    frame_stats.record(len(payload.encode()))
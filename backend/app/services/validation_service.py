@@ -1,72 +1,104 @@
-from app.services.langchain_service import process_query
+import httpx
+from app.core.config import settings
+from app.services.llm_client_pool import shared_http_clients, api_key_fingerprint
+from app.utils.ttl_cache import TTLCache
 from typing import Dict, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Definitive verdicts per (key fingerprint, model); transient failures are never cached
+verdict_cache = TTLCache(
+    max_size=settings.API_KEY_VALIDATION_CACHE_SIZE,
+    ttl_seconds=settings.API_KEY_VALIDATION_CACHE_TTL,
+)
+
+def _http_client() -> httpx.AsyncClient:
+    return shared_http_clients.async_client
+
 async def validate_groq_api_key(api_key: str, model_name: str = "deepseek-r1-distill-llama-70b") -> Dict[str, Any]:
     """
-    Validate GROQ API key by testing it with the existing langchain service
-    
+    Validate GROQ API key by listing the models it can access
+
+    The model list is a free, non-generating call, so it checks both the key and
+    the model without waiting for a completion. Runs on the shared async HTTP pool
+    with a short timeout.
+
     Args:
         api_key: The GROQ API key to validate
-        model_name: The model to test with
-    
+        model_name: The model to check access for
+
     Returns:
         Dict with validation result and details
     """
+    cache_key = (api_key_fingerprint(api_key), model_name)
+    cached = verdict_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
     try:
-        # Create a temporary LLM config for testing
-        test_config = {
-            "api_key": api_key,
-            "model_name": model_name,
-            "temperature": 0,
-            "max_tokens": 50
+        response = await _http_client().get(
+            f"{settings.GROQ_API_BASE}/models",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=settings.API_KEY_VALIDATION_TIMEOUT,
+        )
+    except httpx.TimeoutException:
+        logger.error("GROQ API key validation timed out")
+        return {
+            "valid": False,
+            "message": "Timed out while contacting GROQ. Please try again.",
+            "error_type": "timeout"
+        }
+    except httpx.HTTPError as e:
+        logger.error(f"GROQ API key validation failed: {str(e)}")
+        return {
+            "valid": False,
+            "message": f"API validation failed: {str(e)}",
+            "error_type": "unknown"
         }
-        
-        # Test with a simple message using the existing function
-        test_message = "Hi"
-        response = process_query(test_message, test_config)
-        
-        if response and response.get("response") and response["response"].strip():
+
+    if response.status_code in (401, 403):
+        result = {
+            "valid": False,
+            "message": "Invalid API key. Please check your GROQ API key and try again.",
+            "error_type": "authentication"
+        }
+    elif response.status_code == 429:
+        return {
+            "valid": False,
+            "message": "API key has reached its usage limit or quota.",
+            "error_type": "quota"
+        }
+    elif response.status_code >= 400:
+        logger.error(f"GROQ API key validation failed with status {response.status_code}")
+        return {
+            "valid": False,
+            "message": f"API validation failed: HTTP {response.status_code}",
+            "error_type": "unknown"
+        }
+    else:
+        try:
+            available = {model.get("id") for model in response.json().get("data", [])}
+        except (ValueError, AttributeError, TypeError):
+            # Not the model list we asked for (e.g. an HTML page from a proxy)
+            logger.error("GROQ API key validation got an unreadable model list")
             return {
+                "valid": False,
+                "message": "API validation failed: unexpected response from GROQ",
+                "error_type": "unknown"
+            }
+        if model_name in available:
+            result = {
                 "valid": True,
                 "message": "API key is valid and model is accessible",
                 "model_tested": model_name,
-                "test_response": response["response"][:100] + "..." if len(response["response"]) > 100 else response["response"]
             }
         else:
-            return {
-                "valid": False,
-                "message": "API key validation failed: No response received",
-                "model_tested": model_name
-            }
-            
-    except Exception as e:
-        logger.error(f"GROQ API key validation failed: {str(e)}")
-        error_msg = str(e).lower()
-        
-        if "authentication" in error_msg or "unauthorized" in error_msg or "invalid" in error_msg or "api_key" in error_msg:
-            return {
-                "valid": False,
-                "message": "Invalid API key. Please check your GROQ API key and try again.",
-                "error_type": "authentication"
-            }
-        elif "model" in error_msg or "not found" in error_msg:
-            return {
+            result = {
                 "valid": False,
                 "message": f"Model '{model_name}' is not accessible with this API key.",
                 "error_type": "model_access"
             }
-        elif "quota" in error_msg or "limit" in error_msg or "rate" in error_msg:
-            return {
-                "valid": False,
-                "message": "API key has reached its usage limit or quota.",
-                "error_type": "quota"
-            }
-        else:
-            return {
-                "valid": False,
-                "message": f"API validation failed: {str(e)}",
-                "error_type": "unknown"
-            }
+
+    verdict_cache.set(cache_key, result)
+    return result
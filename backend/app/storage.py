@@ -0,0 +1,213 @@
+"""
+SQLite storage profile.
+
+``Storage`` builds the sync and asyncio engines for one database URL. With the
+``tuned`` profile on a SQLite file each driver gets:
+
+- a reader pool whose connections are ``query_only``;
+- a single writer connection (pool of one), so writes queue in the pool instead
+  of contending on SQLite's lock;
+- WAL, ``synchronous``, page cache and mmap pragmas on every connection.
+
+Sessions route SELECTs (including ``text(...).columns()``) to the readers and
+everything else to the writer; once
+a transaction has written it stays on the writer until it ends, so it reads its
+own writes. The ``basic`` profile (and any other database) keeps one pool per
+driver with only the journal mode and busy timeout set.
+
+"Single writer" is per driver, not per process: the sync writer (request
+handlers on ``get_db``, the recompressor, the CLI) and the asyncio writer (the
+message queue, generations, the response cache, imports) are two connections,
+and every worker has its own pair. Writes queue in-process only behind their
+own driver's writer; between the two, and across workers, SQLite's write lock
+and ``busy_timeout`` decide who goes next. Background writers on the sync side
+therefore commit in short batches.
+"""
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.selectable import TextualSelect
+
+from app.core.config import settings
+from app.services.metrics import POOL_WAIT_SECONDS, instrument_engine
+
+PROFILES = ("tuned", "basic")
+
+# Statements that may go to a reader: ORM/core SELECTs and text() declared as a query with .columns()
+_READS = (Select, TextualSelect)
+
+
+def _timed_pool(base, name: str):
+    """``base`` pool class that records how long each checkout waited"""
+    wait = POOL_WAIT_SECONDS.labels(name)
+
+    class TimedPool(base):
+        checkouts = 0
+        wait_seconds = 0.0
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                elapsed = time.perf_counter() - started
+                wait.observe(elapsed)
+                type(self).checkouts += 1
+                type(self).wait_seconds += elapsed
+
+    TimedPool.__name__ = f"{base.__name__}_{name}"
+    return TimedPool
+
+
+def _is_file_sqlite(url: str) -> bool:
+    return url.startswith('sqlite') and ':memory:' not in url and not url.rstrip('/').endswith(':')
+
+
+def _pragmas(profile: str, read_only: bool):
+    pragmas = [
+        # WAL lets readers run alongside the writer, in this process and in other workers
+        f"journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        # Wait for another connection's write lock instead of failing with "database is locked"
+        f"busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+    ]
+    if profile == "tuned":
+        pragmas += [
+            # With WAL, NORMAL only risks the last commits on power loss, not corruption
+            f"synchronous={settings.SQLITE_SYNCHRONOUS}",
+            f"cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}",
+            f"mmap_size={int(settings.SQLITE_MMAP_SIZE_BYTES)}",
+            "temp_store=memory",
+        ]
+    if read_only:
+        pragmas.append("query_only=on")
+    return pragmas
+
+
+def _set_pragmas(engine: Engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def _configure(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(f"PRAGMA {pragma}")
+        finally:
+            cursor.close()
+
+
+class RoutingSession(Session):
+    """Session that reads from ``reader`` and writes (then stays) on ``writer``"""
+
+    def __init__(self, *args, reader: Optional[Engine] = None, writer: Optional[Engine] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reader = reader
+        self.writer = writer
+        self.on_writer = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.writer is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        if self.on_writer or self._flushing or not isinstance(clause, _READS):
+            self.on_writer = True
+            return self.writer
+        return self.reader
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _leave_writer(session, transaction):
+    if transaction.parent is None:
+        session.on_writer = False
+
+
+class Storage:
+    """Engines, pools and session factories for one database"""
+
+    def __init__(
+        self,
+        url: str,
+        async_url: str,
+        profile: str = "tuned",
+        reader_pool_size: int = 8,
+        writer_timeout: float = 30,
+    ):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown storage profile: {profile}")
+        self.profile = profile
+        self.engines: Dict[str, Any] = {}
+        split = profile == "tuned" and _is_file_sqlite(url) and _is_file_sqlite(async_url)
+
+        if split:
+            self.sync_writer = self._engine("sync_writer", url, QueuePool, 1, 0, writer_timeout, False)
+            self.sync_reader = self._engine("sync_reader", url, QueuePool, reader_pool_size, reader_pool_size, 30, True)
+            self.async_writer = self._engine(
+                "async_writer", async_url, AsyncAdaptedQueuePool, 1, 0, writer_timeout, False
+            )
+            self.async_reader = self._engine(
+                "async_reader", async_url, AsyncAdaptedQueuePool, reader_pool_size, reader_pool_size, 30, True
+            )
+        else:
+            self.sync_writer = self.sync_reader = self._engine("sync", url, QueuePool, 5, 10, 30, False)
+            self.async_writer = self.async_reader = self._engine(
+                "async", async_url, AsyncAdaptedQueuePool, 5, 10, 30, False
+            )
+        self.split = split
+
+        self.SessionLocal = sessionmaker(
+            class_=RoutingSession, autocommit=False, autoflush=False,
+            reader=self.sync_reader, writer=self.sync_writer,
+        )
+        self.AsyncSessionLocal = async_sessionmaker(
+            class_=AsyncSession, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False,
+            reader=self.async_reader.sync_engine, writer=self.async_writer.sync_engine,
+        )
+
+    def _engine(self, name: str, url: str, pool, size: int, overflow: int, timeout: float, read_only: bool):
+        is_async = name.startswith("async")
+        sqlite = url.startswith('sqlite')
+        kwargs: Dict[str, Any] = {"connect_args": {"check_same_thread": False} if sqlite else {}}
+        if not sqlite or _is_file_sqlite(url):
+            # In-memory SQLite keeps SQLAlchemy's single-connection pool
+            kwargs.update(
+                poolclass=_timed_pool(pool, name), pool_size=size, max_overflow=overflow, pool_timeout=timeout
+            )
+        engine = create_async_engine(url, **kwargs) if is_async else create_engine(url, **kwargs)
+        sync_engine = engine.sync_engine if is_async else engine
+        if sqlite:
+            _set_pragmas(sync_engine, _pragmas(self.profile, read_only))
+        instrument_engine(sync_engine, name)
+        self.engines[name] = engine
+        return engine
+
+    async def dispose(self):
+        for engine in self.engines.values():
+            if hasattr(engine, "sync_engine"):
+                await engine.dispose()
+            else:
+                engine.dispose()
+
+    def stats(self) -> Dict[str, Any]:
+        pools = {}
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue
+            pools[name] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "checkouts": type(pool).checkouts,
+                "wait_seconds": type(pool).wait_seconds,
+            }
+        return {
+            "profile": self.profile,
+            "split": self.split,
+            "checked_out": sum(p["checked_out"] for p in pools.values()),
+            "checkouts": sum(p["checkouts"] for p in pools.values()),
+            "wait_seconds": sum(p["wait_seconds"] for p in pools.values()),
+            "pools": pools,
+        }
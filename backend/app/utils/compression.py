@@ -0,0 +1,58 @@
+import zlib
+from typing import Optional, Union
+
+from sqlalchemy.types import Text, TypeDecorator
+
+# Keep the compressed form only when it saves at least this fraction
+_MIN_SAVING = 0.1
+
+
+def compress_text(text: str, threshold: int, level: int = 6) -> Union[str, bytes]:
+    """
+    zlib-compressed UTF-8 for bodies of ``threshold`` bytes or more, else ``text`` unchanged.
+
+    Text that barely shrinks is also returned as is. A threshold of 0 disables compression.
+    """
+    if threshold <= 0:
+        return text
+    encoded = text.encode("utf-8")
+    if len(encoded) < threshold:
+        return text
+    compressed = zlib.compress(encoded, level)
+    if len(compressed) > len(encoded) * (1 - _MIN_SAVING):
+        return text
+    return compressed
+
+
+def decompress_text(value: Union[str, bytes, None]) -> Optional[str]:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column that stores large bodies zlib-compressed.
+
+    On SQLite, whose columns accept any storage class, bodies of ``threshold``
+    bytes or more are written as compressed BLOBs and everything else stays
+    TEXT; reads accept both, so existing rows need no migration. Other
+    databases store plain text.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def __init__(self, threshold: int, level: int = 6):
+        super().__init__()
+        self.threshold = threshold
+        self.level = level
+
+    def process_bind_param(self, value, dialect):
+        # Bytes were compressed by the caller (the recompression job) and are stored as given
+        if value is None or dialect.name != "sqlite" or isinstance(value, bytes):
+            return value
+        return compress_text(value, self.threshold, self.level)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
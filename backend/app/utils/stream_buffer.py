@@ -0,0 +1,100 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Optional, Tuple
+
+
+class ReplayUnavailable(Exception):
+    """The requested offset has already left the replay buffer"""
+
+
+class StreamBuffer:
+    """
+    Append-only text stream with a bounded replay window and any number of readers.
+
+    Offsets are positions in the text, counted in characters (code points). Only
+    the most recent ``max_chars`` characters are kept (always at least the last
+    chunk). Readers track chunk sequence numbers, so tailing a live stream costs
+    O(1) per chunk.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.length = 0
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._buffer: Deque[Tuple[int, str]] = deque()
+        self._first_seq = 0  # sequence number of the oldest buffered chunk
+        self._buffered = 0
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        """Wake every reader"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, text: str):
+        if not text:
+            return
+        self._buffer.append((self.length, text))
+        self.length += len(text)
+        self._buffered += len(text)
+        while self._buffered - len(self._buffer[0][1]) >= self.max_chars and len(self._buffer) > 1:
+            self._buffered -= len(self._buffer.popleft()[1])
+            self._first_seq += 1
+        self.notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.finished = True
+        self.error = error
+        self.notify()
+
+    def replayable_from(self) -> int:
+        """Oldest offset still in the buffer"""
+        return self._buffer[0][0] if self._buffer else self.length
+
+    def _seek(self, offset: int) -> Tuple[str, int]:
+        """Buffered text from ``offset`` to the end, and the next chunk's sequence number"""
+        if offset < self.replayable_from():
+            raise ReplayUnavailable(f"Offset {offset} is no longer buffered (oldest is {self.replayable_from()})")
+        if offset > self.length:
+            raise ReplayUnavailable(f"Offset {offset} is beyond the streamed text ({self.length})")
+        pieces = []
+        for chunk_start, text in self._buffer:
+            if chunk_start + len(text) > offset:
+                pieces.append(text[max(offset - chunk_start, 0):])
+        return "".join(pieces), self._first_seq + len(self._buffer)
+
+    def _chunks_since(self, seq: int) -> Tuple[str, int]:
+        if seq < self._first_seq:
+            raise ReplayUnavailable("Reader fell behind the replay buffer")
+        end = self._first_seq + len(self._buffer)
+        return "".join(self._buffer[i - self._first_seq][1] for i in range(seq, end)), end
+
+    async def follow(self, offset: int = 0, on_idle: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncIterator[str]:
+        """
+        Yield the text from ``offset`` on: buffered text first, then live chunks.
+
+        Raises the stream's error if it failed. ``on_idle`` is awaited whenever the
+        reader has caught up; returning True re-checks before waiting.
+        """
+        text, seq = self._seek(offset)
+        self.subscribers += 1
+        try:
+            if text:
+                yield text
+            while True:
+                changed = self._changed
+                if seq < self._first_seq + len(self._buffer):
+                    text, seq = self._chunks_since(seq)
+                    yield text
+                    continue
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                if on_idle is not None and await on_idle():
+                    continue
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
@@ -0,0 +1,10 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap tokenizer-free token estimate.
+
+    BPE vocabularies average roughly four characters per token for English; the
+    word count is used as a floor so short, space-heavy text is not undercounted.
+    """
+    if not text:
+        return 0
+    return max(len(text) // 4, len(text.split()), 1)
@@ -0,0 +1,199 @@
+"""
+End-to-end load test of ``/ws/chat/{session_id}`` against the local fake provider.
+
+Starts the app under uvicorn in a subprocess on a throwaway SQLite database,
+seeds one user/session per socket whose LLM config uses provider ``fake``, then
+drives N concurrent WebSocket clients through several turns each. Reports
+time-to-first-token and full-turn latency (p50/p99), token throughput, error
+count and server memory (RSS at idle and peak).
+
+Usage:
+    python -m benchmarks.chat_load --sockets 200 --turns 3 --ttft-ms 300 --tokens-per-sec 50
+    python -m benchmarks.chat_load --sockets 100 --error-rate 0.05 --coalesce
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix="uni_chat_load_")
+DATABASE_URL = f"sqlite:///{os.path.join(_db_dir, 'load.db')}"
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+import httpx  # noqa: E402
+import websockets  # noqa: E402
+
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.models import User, LLMProvider, UserLLMConfig, ChatSession  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(sockets: int, provider_options: dict):
+    db = SessionLocal()
+    try:
+        provider = LLMProvider(name="fake", display_name="Fake", supported_models=["fake"])
+        db.add(provider)
+        db.flush()
+        session_ids = []
+        for i in range(sockets):
+            user = User(username=f"load{i}", email=f"load{i}@example.com", password_hash="x")
+            db.add(user)
+            db.flush()
+            config = UserLLMConfig(
+                user_id=user.id, provider_id=provider.id, model_name="fake", api_key_encrypted="",
+                config_params={"temperature": 0.7, "provider_options": provider_options},
+            )
+            db.add(config)
+            db.flush()
+            session = ChatSession(user_id=user.id, llm_config_id=config.id)
+            db.add(session)
+            db.flush()
+            session_ids.append(session.id)
+        db.commit()
+        return session_ids
+    finally:
+        db.close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def read_rss_kb(pid: int, field: str = "VmRSS") -> int:
+    """Resident memory of a process from /proc (Linux); 0 where unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def start_server(port: int, sockets: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    # One user per socket; lift the shared limits so the benchmark measures the chat path itself
+    env.setdefault("ADMISSION_MAX_CONCURRENT", str(max(sockets, 64)))
+    env.setdefault("ADMISSION_KEY_RPM", "0")
+    env.setdefault("ADMISSION_MAX_QUEUE", str(max(sockets, 256)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(base_url + "/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+async def drive_socket(uri: str, turns: int, results: dict):
+    async with websockets.connect(uri, max_size=None) as ws:
+        for turn in range(turns):
+            started = time.perf_counter()
+            first = None
+            await ws.send(json.dumps({"message": f"load question {turn}"}))
+            while True:
+                data = json.loads(await ws.recv())
+                if "token" in data:
+                    if first is None:
+                        first = time.perf_counter()
+                        results["ttft"].append(first - started)
+                    results["chars"] += len(data["token"])
+                    results["frames"] += 1
+                elif data.get("end"):
+                    results["turn"].append(time.perf_counter() - started)
+                    break
+                elif "error" in data:
+                    # The server ends the socket after an upstream error
+                    results["errors"] += 1
+                    return
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-sec", type=float, default=100)
+    parser.add_argument("--words", type=int, default=60, help="words per fake answer")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--coalesce", action="store_true", help="request coalesced token frames")
+    args = parser.parse_args()
+
+    provider_options = {
+        "ttft_ms": args.ttft_ms,
+        "tokens_per_sec": args.tokens_per_sec,
+        "error_rate": args.error_rate,
+        "response": " ".join(f"word{i}" for i in range(args.words)),
+    }
+    init_db()
+    session_ids = seed(args.sockets, provider_options)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(port, args.sockets)
+    try:
+        await wait_ready(base_url)
+        idle_kb = read_rss_kb(server.pid)
+        results = {"ttft": [], "turn": [], "chars": 0, "frames": 0, "errors": 0}
+        query = "?coalesce=1" if args.coalesce else ""
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(drive_socket(f"ws://127.0.0.1:{port}/ws/chat/{sid}{query}", args.turns, results) for sid in session_ids),
+            return_exceptions=True,
+        )
+        elapsed = time.perf_counter() - started
+        peak_kb = read_rss_kb(server.pid, "VmHWM")
+        failed_sockets = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    ttft = [t * 1000 for t in results["ttft"]]
+    turn = [t * 1000 for t in results["turn"]]
+    print(
+        f"{args.sockets} sockets x {args.turns} turns in {elapsed:.2f}s | "
+        f"turns ok={len(turn)} errors={results['errors']} failed_sockets={failed_sockets}"
+    )
+    print(f"  ttft  p50={percentile(ttft, 50):.1f}ms p99={percentile(ttft, 99):.1f}ms")
+    print(f"  turn  p50={percentile(turn, 50):.1f}ms p99={percentile(turn, 99):.1f}ms")
+    print(
+        f"  throughput {len(turn) / elapsed:.1f} turns/s, {results['frames'] / elapsed:.0f} frames/s, "
+        f"{results['chars'] / elapsed / 1024:.1f} KiB/s of tokens"
+    )
+    if idle_kb:
+        print(
+            f"  server rss idle={idle_kb / 1024:.1f}MiB peak={peak_kb / 1024:.1f}MiB "
+            f"(~{max(peak_kb - idle_kb, 0) / max(args.sockets, 1):.0f}KiB per socket)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Microbenchmark for building the per-turn prompt from long session histories.
+
+Compares three ways of preparing one turn's messages:
+  full     - send the whole transcript (the previous behaviour)
+  recount  - re-estimate every message's tokens each turn, then truncate
+  cached   - truncate using token counts stored on each message
+
+Usage:
+    python -m benchmarks.context_builder --budget 8192
+"""
+import argparse
+import random
+import timeit
+
+from app.services.context_builder import fit_to_budget
+from app.utils.tokens import estimate_tokens
+
+WORDS = "the quick brown fox jumps over a lazy dog while streaming tokens to the client".split()
+
+
+def make_history(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    history = []
+    for i in range(size):
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 300)))
+        history.append({
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": content,
+            "tokens": estimate_tokens(content),
+        })
+    return history
+
+
+def full(history, budget):
+    return [(m["role"], m["content"]) for m in history]
+
+
+def recount(history, budget):
+    uncounted = [{"role": m["role"], "content": m["content"]} for m in history]
+    for m in uncounted:
+        m["tokens"] = estimate_tokens(m["content"])
+    return [(m["role"], m["content"]) for m in fit_to_budget(uncounted, budget)]
+
+
+def cached(history, budget):
+    return [(m["role"], m["content"]) for m in fit_to_budget(history, budget)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, default=8192)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'full ms':>9} {'recount ms':>11} {'cached ms':>10} {'sent':>6}")
+    for size in args.sizes:
+        history = make_history(size)
+        timings = {}
+        for name, fn in (("full", full), ("recount", recount), ("cached", cached)):
+            per_call = min(timeit.repeat(lambda: fn(history, args.budget), number=1, repeat=args.repeat))
+            timings[name] = per_call * 1000
+        sent = len(cached(history, args.budget))
+        print(f"{size:>8} {timings['full']:>9.3f} {timings['recount']:>11.3f} {timings['cached']:>10.3f} {sent:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Memory and throughput of the streaming NDJSON history export and import.
+
+Seeds a throwaway SQLite file with one user's history, then measures:
+
+- ``naive``: every session loaded with ``get_session_messages`` and dumped as
+  one JSON document, the only option before streaming export existed;
+- ``export``: ``history_transfer.export_chunks`` written to a file;
+- ``import``: that file read back in chunks and imported for a second user.
+
+Python heap peaks come from tracemalloc, so absolute timings are slower than
+without it; compare the peaks across history sizes.
+
+Usage:
+    python -m benchmarks.history_transfer --sessions 200 --messages 500
+    python -m benchmarks.history_transfer --sessions 50 --messages 2000 --answer-bytes 8000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from app.crud import get_session_messages
+from app.migrations import run_migrations
+from app.models import Base, ChatMessage, ChatSession, User, UserLLMConfig
+from app.schemas import ChatMessageResponse
+from app.services.history_transfer import HistoryTransfer, split_lines
+from app.storage import Storage
+
+WORDS = "the borrow checker rejects this because the reference outlives the buffer it points into".split()
+
+
+def seed(storage: Storage, args):
+    Base.metadata.create_all(bind=storage.sync_writer)
+    run_migrations(storage.sync_writer)
+    rng = random.Random(7)
+    db = storage.SessionLocal()
+    try:
+        users = [User(username=f"bench{i}", email=f"bench{i}@example.com", password_hash="x") for i in range(2)]
+        db.add_all(users)
+        db.flush()
+        configs = [UserLLMConfig(user_id=u.id, provider_id=1, model_name="bench", config_params={}) for u in users]
+        db.add_all(configs)
+        db.flush()
+        source_id, target_id = users[0].id, users[1].id
+        source_config, target_config = configs[0].id, configs[1].id
+        start = datetime.now(timezone.utc) - timedelta(days=30)
+        for s in range(args.sessions):
+            chat_session = ChatSession(user_id=source_id, llm_config_id=source_config, title=f"session {s}")
+            db.add(chat_session)
+            db.flush()
+            db.add_all(
+                ChatMessage(
+                    session_id=chat_session.id, role="user" if i % 2 == 0 else "assistant",
+                    content=" ".join(rng.choice(WORDS) for _ in range(rng.randint(10, args.answer_bytes // 6))),
+                    token_count=0, timestamp=start + timedelta(seconds=s * args.messages + i),
+                )
+                for i in range(args.messages)
+            )
+            db.commit()
+            db.expunge_all()
+        return source_id, target_id, target_config
+    finally:
+        db.close()
+
+
+def measure(label, fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    detail = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:<7} {elapsed:6.2f}s  peak heap {peak / 1024 / 1024:8.1f} MiB  {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=500, help="messages per session")
+    parser.add_argument("--answer-bytes", type=int, default=2000, help="upper bound of a message body")
+    parser.add_argument("--batch-size", type=int, default=1000, help="messages per import transaction")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="uni_chat_transfer_")
+    path = os.path.join(directory, "bench.db")
+    storage = Storage(f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}", profile="tuned")
+    source_id, target_id, target_config = seed(storage, args)
+    transfer = HistoryTransfer(batch_size=args.batch_size, chunk_bytes=64 * 1024, max_line_bytes=16 * 1024 * 1024)
+    export_path = os.path.join(directory, "export.ndjson")
+    print(f"sessions={args.sessions} messages/session={args.messages} database {os.path.getsize(path) / 1e6:.0f} MB")
+
+    def naive():
+        db = storage.SessionLocal()
+        try:
+            session_ids = [s.id for s in db.query(ChatSession).filter(ChatSession.user_id == source_id)]
+            document = json.dumps([
+                [ChatMessageResponse.model_validate(m).model_dump(mode="json") for m in get_session_messages(db, s)]
+                for s in session_ids
+            ])
+            return f"{len(document) / 1e6:.0f} MB document"
+        finally:
+            db.close()
+
+    def export():
+        db = storage.SessionLocal()
+        try:
+            with open(export_path, "wb") as f:
+                for chunk in transfer.export_chunks(db, source_id):
+                    f.write(chunk)
+        finally:
+            db.close()
+        return f"{os.path.getsize(export_path) / 1e6:.0f} MB file"
+
+    async def chunks():
+        with open(export_path, "rb") as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def load():
+        async with storage.AsyncSessionLocal() as db:
+            result = await transfer.import_lines(db, target_id, target_config, split_lines(chunks(), 16 * 1024 * 1024))
+        await storage.async_writer.dispose()
+        await storage.async_reader.dispose()
+        return result
+
+    def run_import():
+        result = asyncio.run(load())
+        return f"{result['messages'] / result['seconds']:.0f} messages/s, {result['rejected']} rejected"
+
+    measure("naive", naive)
+    measure("export", export)
+    measure("import", run_import)
+
+
+if __name__ == "__main__":
+    main()
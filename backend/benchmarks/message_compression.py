@@ -0,0 +1,161 @@
+"""
+Storage size and read latency with message compression on and off.
+
+Seeds one throwaway SQLite file per mode with the same sessions: short user
+questions and long reasoning-style assistant answers (prose, numbered steps
+and code blocks drawn from a fixed vocabulary), indexed for search as the app
+does. Reports the database size (and how much of it is messages vs the search
+index), insert time, full-history read latency (bodies loaded and decompressed)
+and metadata-only listing latency (bodies deferred), each as mean/p99 per session.
+
+Usage:
+    python -m benchmarks.message_compression --sessions 50 --messages 200
+    python -m benchmarks.message_compression --threshold 512 --answer-bytes 6000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app.crud import get_session_messages
+from app.migrations import run_migrations
+from app.models import Base, ChatMessage, ChatSession, User, UserLLMConfig
+from app.services.search_index import FTS_TABLE, search_index
+from app.storage import Storage
+
+WORDS = (
+    "the request handler awaits a lock before it reads the buffer so we first check whether the "
+    "cache entry is stale then compare timestamps and fall back to the database when the index "
+    "misses because each worker keeps its own pool of connections and the writer commits in batches "
+    "which means latency depends on queue depth throughput and the size of every page we touch"
+).split()
+CODE = [
+    "async def load(session_id: int):\n    async with pool.acquire() as conn:\n        return await conn.fetch(query, session_id)\n",
+    "for row in rows:\n    if row.timestamp > cutoff:\n        result.append(row.id)\n",
+    "SELECT id, role, timestamp FROM chat_messages WHERE session_id = ? ORDER BY id DESC LIMIT 50;\n",
+]
+
+
+def answer(rng: random.Random, size: int) -> str:
+    parts = []
+    step = 1
+    while sum(len(p) for p in parts) < size:
+        roll = rng.random()
+        if roll < 0.2:
+            parts.append(f"```python\n{rng.choice(CODE)}```\n")
+        elif roll < 0.5:
+            parts.append(f"{step}. " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 30))) + ".\n")
+            step += 1
+        else:
+            parts.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 80))).capitalize() + ".\n\n")
+    return "".join(parts)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def seed(storage: Storage, args):
+    Base.metadata.create_all(bind=storage.sync_writer)
+    run_migrations(storage.sync_writer)
+    rng = random.Random(42)
+    db = storage.SessionLocal()
+    try:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        config = UserLLMConfig(user_id=user.id, provider_id=1, model_name="bench", config_params={})
+        db.add(config)
+        db.flush()
+        sessions = [ChatSession(user_id=user.id, llm_config_id=config.id) for _ in range(args.sessions)]
+        db.add_all(sessions)
+        db.flush()
+        now = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        for chat_session in sessions:
+            messages = [
+                ChatMessage(
+                    session_id=chat_session.id,
+                    role="user" if i % 2 == 0 else "assistant",
+                    content=(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))) + "?") if i % 2 == 0
+                    else answer(rng, rng.randint(args.answer_bytes // 4, args.answer_bytes)),
+                    token_count=0,
+                    timestamp=now,
+                )
+                for i in range(args.messages)
+            ]
+            db.add_all(messages)
+            db.flush()
+            search_index.index(db, messages)
+            db.commit()
+        return [s.id for s in sessions], time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def time_reads(storage: Storage, session_ids, include_content: bool):
+    timings = []
+    db = storage.SessionLocal()
+    try:
+        for session_id in session_ids:
+            started = time.perf_counter()
+            messages = get_session_messages(db, session_id, include_content=include_content)
+            if include_content:
+                sum(len(m.content) for m in messages)
+            timings.append(time.perf_counter() - started)
+            db.expunge_all()
+    finally:
+        db.close()
+    return sum(timings) / len(timings) * 1000, percentile(timings, 99) * 1000
+
+
+def run(mode: str, threshold: int, args):
+    content_type = ChatMessage.__table__.c.content.type
+    content_type.threshold = threshold
+    path = os.path.join(tempfile.mkdtemp(prefix="uni_chat_compression_"), "bench.db")
+    storage = Storage(f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}", profile="tuned")
+    session_ids, insert_seconds = seed(storage, args)
+    with storage.sync_writer.connect() as connection:
+        connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        blobs = connection.execute(text("SELECT count(*) FROM chat_messages WHERE typeof(content) = 'blob'")).scalar()
+        messages_bytes, index_bytes = connection.execute(text(
+            "SELECT sum(CASE WHEN name = 'chat_messages' THEN pgsize ELSE 0 END), "
+            "sum(CASE WHEN name LIKE :fts THEN pgsize ELSE 0 END) FROM dbstat"
+        ), {"fts": f"{FTS_TABLE}%"}).one()
+    size = os.path.getsize(path)
+    # Warm the page cache once so both modes are compared on cached reads
+    time_reads(storage, session_ids, include_content=True)
+    full = time_reads(storage, session_ids, include_content=True)
+    meta = time_reads(storage, session_ids, include_content=False)
+    storage.sync_writer.dispose()
+    storage.sync_reader.dispose()
+    print(
+        f"{mode:<4} size {size / 1024 / 1024:7.2f} MiB (messages {messages_bytes / 1024 / 1024:.2f}, "
+        f"search index {index_bytes / 1024 / 1024:.2f}) | compressed rows {blobs:6d} | insert {insert_seconds:5.2f}s | "
+        f"full history mean={full[0]:6.2f}ms p99={full[1]:6.2f}ms | "
+        f"metadata only mean={meta[0]:6.2f}ms p99={meta[1]:6.2f}ms"
+    )
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200, help="messages per session")
+    parser.add_argument("--answer-bytes", type=int, default=4000, help="upper bound of an assistant answer")
+    parser.add_argument("--threshold", type=int, default=1024, help="compression threshold for the 'on' run")
+    args = parser.parse_args()
+
+    print(f"sessions={args.sessions} messages/session={args.messages} answers up to {args.answer_bytes} bytes")
+    off = run("off", 0, args)
+    on = run("on", args.threshold, args)
+    print(f"size ratio on/off: {on / off:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Server memory per open chat stream: WebSocket (``/ws/chat/{id}``) vs SSE (``/chat/sessions/{id}/stream``).
+
+Starts a fresh uvicorn subprocess per transport on the same throwaway SQLite
+database, opens N concurrent streams against the ``fake`` provider with a long,
+slow answer, and samples the server's RSS once every stream has received its
+first token and again while all of them are still open. Reports the RSS
+growth per open connection, plus time-to-first-token and errors, so the two
+transports can be compared under the same generation pipeline.
+
+Usage:
+    python -m benchmarks.sse_memory --streams 500 --tokens-per-sec 20 --words 200
+    python -m benchmarks.sse_memory --streams 200 --transport sse
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import websockets
+
+from benchmarks.chat_load import free_port, percentile, read_rss_kb, seed, start_server, wait_ready
+from app.auth import create_access_token
+from app.database import SessionLocal, init_db
+from app.models import ChatSession, User
+
+
+async def ws_stream(port: int, session_id: int, username: str, state: dict):
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/chat/{session_id}", max_size=None) as ws:
+        started = time.perf_counter()
+        await ws.send(json.dumps({"message": "memory question"}))
+        while True:
+            data = json.loads(await ws.recv())
+            if "token" in data and started is not None:
+                first_token(state, started)
+                started = None
+            elif data.get("end"):
+                return
+            elif "error" in data:
+                state["errors"] += 1
+                return
+
+
+async def sse_stream(client: httpx.AsyncClient, port: int, session_id: int, username: str, state: dict):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+    url = f"http://127.0.0.1:{port}/chat/sessions/{session_id}/stream"
+    started = time.perf_counter()
+    async with client.stream("POST", url, json={"message": "memory question"}, headers=headers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = json.loads(line[6:])
+            if "token" in data and started is not None:
+                first_token(state, started)
+                started = None
+            elif data.get("end"):
+                return
+            elif "error" in data:
+                state["errors"] += 1
+                return
+
+
+def first_token(state: dict, started: float):
+    state["ttft"].append(time.perf_counter() - started)
+    if len(state["ttft"]) == state["expected"]:
+        state["all_streaming"].set()
+
+
+async def run(transport: str, targets, args) -> dict:
+    port = free_port()
+    server = start_server(port, len(targets))
+    try:
+        await wait_ready(f"http://127.0.0.1:{port}")
+        idle_kb = read_rss_kb(server.pid)
+        state = {"ttft": [], "errors": 0, "expected": len(targets), "all_streaming": asyncio.Event()}
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+            if transport == "ws":
+                streams = [ws_stream(port, sid, name, state) for sid, name in targets]
+            else:
+                streams = [sse_stream(client, port, sid, name, state) for sid, name in targets]
+            tasks = [asyncio.ensure_future(stream) for stream in streams]
+            try:
+                await asyncio.wait_for(state["all_streaming"].wait(), args.timeout)
+            except asyncio.TimeoutError:
+                pass
+            streaming_kb = read_rss_kb(server.pid)
+            await asyncio.sleep(args.hold)
+            open_kb = read_rss_kb(server.pid)
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        peak_kb = read_rss_kb(server.pid, "VmHWM")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {
+        "idle_kb": idle_kb,
+        "streaming_kb": streaming_kb,
+        "open_kb": open_kb,
+        "peak_kb": peak_kb,
+        "ttft": [t * 1000 for t in state["ttft"]],
+        "errors": state["errors"],
+        "failed": sum(1 for outcome in outcomes if isinstance(outcome, Exception)),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=300)
+    parser.add_argument("--transport", choices=["ws", "sse", "both"], default="both")
+    parser.add_argument("--ttft-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-sec", type=float, default=20)
+    parser.add_argument("--words", type=int, default=200, help="words per fake answer; keeps streams open")
+    parser.add_argument("--hold", type=float, default=2.0, help="seconds to hold every stream open before sampling")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for every first token")
+    args = parser.parse_args()
+
+    transports = ["ws", "sse"] if args.transport == "both" else [args.transport]
+    init_db()
+    seed(args.streams * len(transports), {
+        "ttft_ms": args.ttft_ms,
+        "tokens_per_sec": args.tokens_per_sec,
+        "response": " ".join(f"word{i}" for i in range(args.words)),
+    })
+    db = SessionLocal()
+    try:
+        targets = db.query(ChatSession.id, User.username).join(User, User.id == ChatSession.user_id) \
+            .order_by(ChatSession.id).all()
+    finally:
+        db.close()
+
+    print(f"{args.streams} concurrent streams, {args.words} words at {args.tokens_per_sec:g} tokens/s")
+    for i, transport in enumerate(transports):
+        result = await run(transport, targets[i * args.streams:(i + 1) * args.streams], args)
+        per_stream = max(result["open_kb"] - result["idle_kb"], 0) / max(args.streams, 1)
+        print(
+            f"  {transport:<4} rss idle={result['idle_kb'] / 1024:.1f}MiB "
+            f"streaming={result['streaming_kb'] / 1024:.1f}MiB open={result['open_kb'] / 1024:.1f}MiB "
+            f"peak={result['peak_kb'] / 1024:.1f}MiB  ~{per_stream:.0f}KiB per stream | "
+            f"ttft p50={percentile(result['ttft'], 50):.0f}ms p99={percentile(result['ttft'], 99):.0f}ms "
+            f"errors={result['errors']} failed={result['failed']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""
+Concurrent read/write mixes against the ``basic`` and ``tuned`` storage profiles.
+
+Each profile gets its own throwaway SQLite file seeded with chat sessions. For
+every mix, ``--workers`` concurrent tasks on the asyncio engines each run
+``--ops`` operations: a read loads the latest ``--page`` messages of a random
+session, a write inserts one message and commits. Reports throughput, read and
+write latency (p50/p99), mean pool wait per checkout and failed operations.
+
+Usage:
+    python -m benchmarks.storage_mix --workers 32 --ops 200 --mixes 100,90,50,10
+    python -m benchmarks.storage_mix --profiles tuned --sessions 50 --messages 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
+
+from app.migrations import run_migrations
+from app.models import Base, ChatMessage, ChatSession, User, UserLLMConfig
+from app.storage import PROFILES, Storage
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def seed(storage: Storage, sessions: int, messages: int):
+    Base.metadata.create_all(bind=storage.sync_writer)
+    run_migrations(storage.sync_writer)
+    db = storage.SessionLocal()
+    try:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        config = UserLLMConfig(user_id=user.id, provider_id=1, model_name="bench", config_params={})
+        db.add(config)
+        db.flush()
+        chat_sessions = [ChatSession(user_id=user.id, llm_config_id=config.id) for _ in range(sessions)]
+        db.add_all(chat_sessions)
+        db.flush()
+        now = datetime.now(timezone.utc)
+        for chat_session in chat_sessions:
+            db.add_all(
+                ChatMessage(session_id=chat_session.id, role="user" if i % 2 == 0 else "assistant",
+                            content=f"seed message {i} " * 20, token_count=60, timestamp=now)
+                for i in range(messages)
+            )
+        db.commit()
+        return [s.id for s in chat_sessions]
+    finally:
+        db.close()
+
+
+async def read_page(storage: Storage, session_id: int, page: int):
+    async with storage.AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ChatMessage).options(undefer(ChatMessage.content)).filter(ChatMessage.session_id == session_id)
+            .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(page)
+        )
+        return result.scalars().all()
+
+
+async def write_message(storage: Storage, session_id: int):
+    async with storage.AsyncSessionLocal() as db:
+        db.add(ChatMessage(session_id=session_id, role="user", content="benchmark write " * 10, token_count=30,
+                           timestamp=datetime.now(timezone.utc)))
+        await db.commit()
+
+
+async def run_mix(storage: Storage, session_ids, read_pct: int, workers: int, ops: int, page: int):
+    reads, writes = [], []
+    failures = 0
+    rng = random.Random(read_pct)
+
+    async def worker():
+        nonlocal failures
+        for _ in range(ops):
+            session_id = rng.choice(session_ids)
+            is_read = rng.random() * 100 < read_pct
+            started = time.perf_counter()
+            try:
+                if is_read:
+                    await read_page(storage, session_id, page)
+                else:
+                    await write_message(storage, session_id)
+            except Exception:
+                failures += 1
+                continue
+            (reads if is_read else writes).append(time.perf_counter() - started)
+
+    before = storage.stats()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+    after = storage.stats()
+    checkouts = after["checkouts"] - before["checkouts"]
+    waited = after["wait_seconds"] - before["wait_seconds"]
+    return {
+        "ops_per_sec": (len(reads) + len(writes)) / elapsed,
+        "read_p50": percentile(reads, 50) * 1000,
+        "read_p99": percentile(reads, 99) * 1000,
+        "write_p50": percentile(writes, 50) * 1000,
+        "write_p99": percentile(writes, 99) * 1000,
+        "pool_wait": waited / checkouts * 1000 if checkouts else 0.0,
+        "failures": failures,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--mixes", default="100,90,50,10", help="read percentages to run")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=200, help="operations per worker")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=200, help="seeded messages per session")
+    parser.add_argument("--page", type=int, default=50, help="messages per read")
+    args = parser.parse_args()
+
+    mixes = [int(m) for m in args.mixes.split(",")]
+    for profile in args.profiles.split(","):
+        path = os.path.join(tempfile.mkdtemp(prefix="uni_chat_storage_"), "bench.db")
+        storage = Storage(f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}", profile=profile)
+        session_ids = seed(storage, args.sessions, args.messages)
+        print(f"profile={profile} workers={args.workers} ops/worker={args.ops}")
+        for read_pct in mixes:
+            r = await run_mix(storage, session_ids, read_pct, args.workers, args.ops, args.page)
+            print(
+                f"  {read_pct:3d}% reads  {r['ops_per_sec']:8.0f} ops/s | "
+                f"read p50={r['read_p50']:6.2f}ms p99={r['read_p99']:7.2f}ms | "
+                f"write p50={r['write_p50']:6.2f}ms p99={r['write_p99']:7.2f}ms | "
+                f"pool wait {r['pool_wait']:6.2f}ms | failures {r['failures']}"
+            )
+        await storage.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
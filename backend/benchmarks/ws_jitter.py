@@ -0,0 +1,118 @@
+"""
+Token-stream jitter with many concurrent chat sockets, sync vs async CRUD.
+
+Each simulated socket runs the same per-turn sequence as ``chat_websocket``
+(load session, load config, save user message, load history, stream tokens,
+save assistant message). Tokens "arrive" on a fixed interval, so any delay
+beyond that interval is time the event loop spent blocked elsewhere.
+
+Usage:
+    python -m benchmarks.ws_jitter --sockets 500 --turns 3 --tokens 40
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix="uni_chat_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from app.database import SessionLocal, AsyncSessionLocal, storage, init_db  # noqa: E402
+from app.models import User, UserLLMConfig, ChatSession  # noqa: E402
+from app.schemas import ChatMessageCreate  # noqa: E402
+from app import crud  # noqa: E402
+
+
+def seed(sockets: int):
+    db = SessionLocal()
+    try:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        config = UserLLMConfig(user_id=user.id, provider_id=1, model_name="bench", config_params={"temperature": 0})
+        db.add(config)
+        db.flush()
+        sessions = [ChatSession(user_id=user.id, llm_config_id=config.id) for _ in range(sockets)]
+        db.add_all(sessions)
+        db.commit()
+        return [s.id for s in sessions]
+    finally:
+        db.close()
+
+
+async def stream_tokens(tokens: int, interval: float, gaps: list):
+    last = time.perf_counter()
+    for _ in range(tokens):
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        gaps.append(now - last - interval)
+        last = now
+
+
+async def sync_socket(session_id: int, turns: int, tokens: int, interval: float, gaps: list):
+    db = SessionLocal()
+    try:
+        for turn in range(turns):
+            session = crud.get_chat_session(db, session_id)
+            crud.get_llm_config_by_id(db, session.llm_config_id)
+            crud.create_chat_message(db, ChatMessageCreate(role="user", content=f"question {turn}"), session_id)
+            crud.get_session_messages(db, session_id)
+            db.commit()
+            await stream_tokens(tokens, interval, gaps)
+            crud.create_chat_message(db, ChatMessageCreate(role="assistant", content="answer " * tokens), session_id)
+    finally:
+        db.close()
+
+
+async def async_socket(session_id: int, turns: int, tokens: int, interval: float, gaps: list):
+    async with AsyncSessionLocal() as db:
+        for turn in range(turns):
+            session = await crud.get_chat_session_async(db, session_id)
+            await crud.get_llm_config_by_id_async(db, session.llm_config_id)
+            await crud.create_chat_message_async(db, ChatMessageCreate(role="user", content=f"question {turn}"), session_id)
+            await crud.get_session_messages_async(db, session_id)
+            await db.commit()
+            await stream_tokens(tokens, interval, gaps)
+            await crud.create_chat_message_async(db, ChatMessageCreate(role="assistant", content="answer " * tokens), session_id)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+async def run(mode: str, session_ids, turns: int, tokens: int, interval: float):
+    gaps = []
+    socket = sync_socket if mode == "sync" else async_socket
+    start = time.perf_counter()
+    await asyncio.gather(*(socket(sid, turns, tokens, interval, gaps) for sid in session_ids))
+    elapsed = time.perf_counter() - start
+    ms = [g * 1000 for g in gaps]
+    print(
+        f"{mode:>5}: {len(session_ids)} sockets, {len(ms)} tokens in {elapsed:.2f}s | "
+        f"jitter p50={percentile(ms, 50):.1f}ms p99={percentile(ms, 99):.1f}ms "
+        f"max={max(ms):.1f}ms mean={statistics.mean(ms):.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--interval-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    init_db()
+    session_ids = seed(args.sockets)
+    interval = args.interval_ms / 1000
+    await run("sync", session_ids, args.turns, args.tokens, interval)
+    await run("async", session_ids, args.turns, args.tokens, interval)
+    await storage.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
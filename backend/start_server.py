@@ -2,15 +2,54 @@
 """
 Uni Chat Backend Server
 Starts the FastAPI server with configurable host and port from environment variables.
+
+    python start_server.py                # development: one process with auto-reload
+    python start_server.py --workers 4    # production: N worker processes, no reload
 """
 
+import argparse
+import os
+
 import uvicorn
 from app.core.config import settings
 
+
+def run_workers(host: str, port: int, workers: int):
+    from app.database import init_db
+    from app.services.coordination import serve_in_thread
+
+    # Create and migrate the schema once, before the workers race to do it at startup
+    init_db()
+
+    # Generation ownership and session-cache claims must be shared between the workers
+    if settings.COORDINATION_BACKEND == 'inprocess':
+        os.environ['COORDINATION_BACKEND'] = 'local-socket'
+    address = os.environ.setdefault('COORDINATION_ADDRESS', settings.COORDINATION_ADDRESS)
+    if os.environ['COORDINATION_BACKEND'] == 'local-socket':
+        serve_in_thread(address)
+        print(f"Coordinator listening on {address}")
+
+    uvicorn.run("app.main:app", host=host, port=port, workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uni Chat Backend Server")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.WORKERS,
+                        help="worker processes; more than one disables auto-reload")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        run_workers(args.host, args.port, args.workers)
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True
+        )
+
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host=settings.HOST,
-        port=settings.PORT,
-        reload=True
-    )
+    main()
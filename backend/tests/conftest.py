@@ -0,0 +1,107 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before anything imports app.database
+_db_dir = tempfile.mkdtemp(prefix="uni_chat_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+import itertools  # noqa: E402
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import get_current_user  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import ChatSession, LLMProvider, User, UserLLMConfig  # noqa: E402
+from app.services.message_writer import message_writer  # noqa: E402
+
+_ids = itertools.count()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def fake_chat(client):
+    """Factory for a user + session whose LLM config streams from the fake provider"""
+
+    def make(fallbacks=(), **provider_options):
+        db = SessionLocal()
+        try:
+            provider = db.query(LLMProvider).filter(LLMProvider.name == "fake").first()
+            if provider is None:
+                provider = LLMProvider(name="fake", display_name="Fake", supported_models=["fake"])
+                db.add(provider)
+                db.flush()
+            n = next(_ids)
+            user = User(username=f"tester{n}", email=f"tester{n}@example.com", password_hash="x")
+            db.add(user)
+            db.flush()
+            fallback_ids = []
+            for options in fallbacks:
+                fallback = UserLLMConfig(
+                    user_id=user.id, provider_id=provider.id, model_name="fake-fallback",
+                    api_key_encrypted="", config_params={"provider_options": options},
+                )
+                db.add(fallback)
+                db.flush()
+                fallback_ids.append(fallback.id)
+            config = UserLLMConfig(
+                user_id=user.id, provider_id=provider.id, model_name="fake", api_key_encrypted="",
+                config_params={"provider_options": provider_options, "fallback_config_ids": fallback_ids},
+            )
+            db.add(config)
+            db.flush()
+            session = ChatSession(user_id=user.id, llm_config_id=config.id, title="test")
+            db.add(session)
+            db.commit()
+            db.refresh(user)
+            db.expunge(user)
+            return user, session.id
+        finally:
+            db.close()
+
+    return make
+
+
+@pytest.fixture
+def login():
+    """Authenticate HTTP requests as ``user`` without going through JWTs"""
+
+    def as_user(user):
+        app.dependency_overrides[get_current_user] = lambda: user
+
+    return as_user
+
+
+@pytest.fixture
+def converse(client):
+    """Send one message over the chat socket and collect frames until the end (or error) frame"""
+
+    def send(session_id, message, query=""):
+        frames = []
+        with client.websocket_connect(f"/ws/chat/{session_id}{query}") as ws:
+            ws.send_json({"message": message})
+            while True:
+                frame = ws.receive_json()
+                frames.append(frame)
+                if frame.get("end") or "error" in frame:
+                    return frames
+
+    return send
+
+
+@pytest.fixture
+def flush(client):
+    """Wait until the write-behind queue has committed everything queued so far"""
+
+    def wait():
+        client.portal.call(message_writer.flush)
+
+    return wait
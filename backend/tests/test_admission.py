@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected, TokenBucket
+from app.services.fake_provider import FakeProviderError
+
+
+def _controller(**overrides):
+    options = dict(
+        max_concurrent=10, user_max_concurrent=10, key_rate=0, key_burst=1,
+        max_queue=100, backoff_base=0.05, backoff_max=1,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+CONFIG = {"provider": "fake", "api_key": "k"}
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.ready_in(now) == pytest.approx(0.1)
+    assert bucket.ready_in(now + 0.11) == 0
+
+
+def test_user_cap_queues_and_reports_positions():
+    controller = _controller(user_max_concurrent=1)
+    positions = []
+    order = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def first():
+            async with controller.admit("alice", CONFIG):
+                order.append("first")
+                await release.wait()
+
+        async def second():
+            async def on_queued(position):
+                positions.append(position)
+            async with controller.admit("alice", CONFIG, on_queued=on_queued):
+                order.append("second")
+
+        tasks = [asyncio.create_task(first()), asyncio.create_task(second())]
+        await asyncio.sleep(0.01)
+        assert order == ["first"]
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["first", "second"]
+    assert positions == [1]
+    assert controller.active == 0 and controller.queued == 1
+
+
+def test_fair_queue_interleaves_users():
+    controller = _controller(max_concurrent=1)
+    order = []
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def hold():
+            async with controller.admit("busy", CONFIG):
+                await gate.wait()
+
+        async def job(user, n):
+            async with controller.admit(user, CONFIG):
+                order.append((user, n))
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        jobs = [asyncio.create_task(job("heavy", n)) for n in range(3)]
+        await asyncio.sleep(0.01)
+        jobs.append(asyncio.create_task(job("light", 0)))
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(holder, *jobs)
+
+    asyncio.run(run())
+    assert order.index(("light", 0)) <= 1
+
+
+def test_full_queue_rejects():
+    controller = _controller(max_concurrent=1, max_queue=0)
+
+    async def run():
+        async with controller.admit("a", CONFIG):
+            with pytest.raises(AdmissionRejected):
+                async with controller.admit("b", CONFIG):
+                    pass
+
+    asyncio.run(run())
+    assert controller.rejected == 1
+
+
+def test_rate_limit_backs_the_key_off():
+    controller = _controller(backoff_base=0.05)
+
+    async def run():
+        controller.record_outcome(CONFIG, FakeProviderError("slow down", status_code=429))
+        started = time.monotonic()
+        async with controller.admit("a", CONFIG):
+            return time.monotonic() - started
+
+    waited = asyncio.run(run())
+    assert waited >= 0.04
+    assert controller.stats()["upstream_rate_limited"] == 1
+    controller.record_outcome(CONFIG)
+    controller.record_outcome(CONFIG, FakeProviderError("boom", status_code=500))
+    assert controller.stats()["upstream_rate_limited"] == 1
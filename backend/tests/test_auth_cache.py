@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from app import auth
+from app.utils.ttl_cache import TTLCache
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=0)
+    assert cache.get("b") is None
+
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    cache.set("d", 4)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_verify_token_is_cached_until_expiry(monkeypatch):
+    token = auth.create_access_token({"sub": "alice"}, expires_delta=timedelta(minutes=5))
+    assert auth.verify_token(token) == "alice"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("token should come from the cache")
+
+    monkeypatch.setattr(auth.jwt, "decode", fail)
+    assert auth.verify_token(token) == "alice"
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app import cli
+from app.database import SessionLocal
+from app.services.recompression import Recompressor
+from app.utils.compression import compress_text, decompress_text
+
+LONG_ANSWER = " ".join(f"step {i}: check the borrow of buffer {i % 7} before the await" for i in range(60))
+
+
+def _storage_classes(session_id):
+    db = SessionLocal()
+    try:
+        return [row[0] for row in db.execute(
+            text("SELECT typeof(content) FROM chat_messages WHERE session_id = :s ORDER BY id"), {"s": session_id}
+        )]
+    finally:
+        db.close()
+
+
+def test_compress_text_only_packs_large_compressible_bodies():
+    assert compress_text("short", threshold=1024) == "short"
+    assert compress_text(LONG_ANSWER, threshold=0) == LONG_ANSWER
+    packed = compress_text(LONG_ANSWER, threshold=1024)
+    assert isinstance(packed, bytes) and len(packed) < len(LONG_ANSWER) / 3
+    assert decompress_text(packed) == LONG_ANSWER
+    assert decompress_text("plain") == "plain"
+
+
+def test_long_messages_are_stored_compressed_and_read_back(client, fake_chat, login, converse, flush):
+    user, session_id = fake_chat(ttft_ms=1, tokens_per_sec=0, echo=True)
+    converse(session_id, "hi")
+    converse(session_id, LONG_ANSWER)
+    flush()
+    login(user)
+
+    assert _storage_classes(session_id) == ["text", "text", "blob", "blob"]
+    messages = client.get(f"/chat/sessions/{session_id}/messages").json()
+    assert [m["content"] for m in messages][2] == LONG_ANSWER
+
+    summaries = client.get(f"/chat/sessions/{session_id}/messages", params={"include_content": False}).json()
+    assert [m["id"] for m in summaries] == [m["id"] for m in messages]
+    assert "content" not in summaries[0] and summaries[2]["token_count"] > 0
+
+    # The search index tokenizes the plain text at write time (it stores none of it), so compressed rows stay searchable
+    hits = client.get("/chat/search", params={"q": "borrow buffer"}).json()["results"]
+    assert {hit["message_id"] for hit in hits} == {messages[2]["id"], messages[3]["id"]}
+
+
+def test_recompressor_packs_rows_written_as_text(client, fake_chat, login, capsys):
+    user, session_id = fake_chat()
+    db = SessionLocal()
+    try:
+        for content in ["short legacy row", LONG_ANSWER]:
+            db.execute(
+                text("INSERT INTO chat_messages (session_id, role, content, token_count, timestamp) "
+                     "VALUES (:s, 'assistant', :c, 1, :t)"),
+                {"s": session_id, "c": content, "t": datetime.now(timezone.utc)},
+            )
+        db.commit()
+    finally:
+        db.close()
+    assert _storage_classes(session_id) == ["text", "text"]
+
+    other_database = Recompressor(
+        SessionLocal, threshold=1024, level=6, batch_size=1, interval=3600, pause_ms=0, dialect="postgresql"
+    )
+    # typeof() and BLOB bodies are SQLite-only: elsewhere the job stays off
+    other_database.start()
+    assert other_database._task is None and other_database.run_once() == 0
+
+    job = Recompressor(SessionLocal, threshold=1024, level=6, batch_size=1, interval=0, pause_ms=0, dialect="sqlite")
+    assert job.run_once() == 1
+    assert _storage_classes(session_id) == ["text", "blob"]
+    stats = job.stats()
+    assert stats["bytes_before"] == len(LONG_ANSWER) and 0 < stats["ratio"] < 0.5
+    # A second sweep starts after the last scanned row
+    assert job.run_once() == 0 and job.stats()["scanned"] == 1
+
+    login(user)
+    assert client.get(f"/chat/sessions/{session_id}/messages").json()[1]["content"] == LONG_ANSWER
+    assert cli.main(["recompress"]) == 0
+    assert "Recompression complete" in capsys.readouterr().out
@@ -0,0 +1,30 @@
+from app.services.context_builder import fit_to_budget, get_token_budget, MESSAGE_OVERHEAD_TOKENS
+
+
+def _msg(role, tokens):
+    return {"role": role, "content": "x", "tokens": tokens}
+
+
+def test_keeps_newest_messages_within_budget():
+    messages = [_msg("user", 10), _msg("assistant", 10), _msg("user", 10)]
+    per_message = 10 + MESSAGE_OVERHEAD_TOKENS
+
+    assert fit_to_budget(messages, per_message * 3) == messages
+    assert fit_to_budget(messages, per_message * 2) == messages[1:]
+
+
+def test_always_keeps_system_prompt_and_latest_message():
+    messages = [_msg("system", 5), _msg("user", 100), _msg("assistant", 100), _msg("user", 500)]
+    fitted = fit_to_budget(messages, 50)
+    assert fitted == [messages[0], messages[3]]
+
+
+def test_estimates_missing_counts_once():
+    message = {"role": "user", "content": "hello there, how are you today?"}
+    fit_to_budget([message], 1000)
+    assert message["tokens"] > 0
+
+
+def test_budget_prefers_config_override_then_model_window():
+    assert get_token_budget({"context_token_budget": 2000}) == 2000
+    assert get_token_budget({"model_name": "llama3-8b-8192", "max_tokens": 192}) == 8000
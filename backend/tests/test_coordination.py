@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.services.coordination import CoordinatorServer, InProcessCoordinator, LocalSocketCoordinator
+
+
+def _cancel_recorder(cancelled):
+    def on_cancel(generation_id):
+        cancelled.append(generation_id)
+        return True
+    return on_cancel
+
+
+def test_in_process_tracks_and_cancels_own_generations():
+    cancelled = []
+
+    async def run():
+        coordinator = InProcessCoordinator("w1")
+        await coordinator.start(_cancel_recorder(cancelled))
+        await coordinator.register_generation("g1", 7)
+        latest = await coordinator.locate_generation("latest", 7)
+        wrong_session = await coordinator.locate_generation("g1", 8)
+        assert await coordinator.cancel_generation("g1")
+        await coordinator.finish_generation("g1", "cancelled")
+        assert not await coordinator.cancel_generation("g1")
+        # A single worker never sees its session cache go stale
+        claims = [await coordinator.claim_session(7), await coordinator.claim_session(7)]
+        return latest, wrong_session, claims
+
+    latest, wrong_session, claims = asyncio.run(run())
+    assert latest["id"] == "g1" and latest["owner"] == "w1"
+    assert wrong_session is None
+    assert cancelled == ["g1"]
+    assert claims == [False, False]
+
+
+def test_in_process_wait_returns_the_finished_record():
+    async def run():
+        coordinator = InProcessCoordinator("w1")
+        await coordinator.register_generation("g1", 7)
+        asyncio.get_running_loop().call_later(0.01, coordinator.state.finish, "g1", "completed", 42)
+        return await coordinator.wait_generation("g1", timeout=1)
+
+    record = asyncio.run(run())
+    assert record["status"] == "completed" and record["message_id"] == 42
+
+
+@pytest.fixture
+def socket_address(tmp_path):
+    return str(tmp_path / "coord.sock")
+
+
+def test_local_socket_shares_state_between_workers(socket_address):
+    cancelled = []
+
+    async def run():
+        server = CoordinatorServer(socket_address)
+        await server.start()
+        owner = LocalSocketCoordinator(socket_address, worker_id="w1")
+        other = LocalSocketCoordinator(socket_address, worker_id="w2")
+        await owner.start(_cancel_recorder(cancelled))
+        await other.start()
+        try:
+            await owner.register_generation("g1", 7)
+            located = await other.locate_generation("latest", 7)
+
+            # A cancel sent through another worker reaches the owner
+            assert await other.cancel_generation("g1")
+            await asyncio.sleep(0.01)
+
+            waiter = asyncio.ensure_future(other.wait_generation("g1", timeout=1))
+            await asyncio.sleep(0.01)
+            await owner.finish_generation("g1", "completed", 42)
+            finished = await waiter
+
+            claims = [
+                await owner.claim_session(7), await owner.claim_session(7),
+                await other.claim_session(7), await owner.claim_session(7),
+            ]
+            return located, finished, claims
+        finally:
+            await owner.stop()
+            await other.stop()
+            await server.stop()
+
+    located, finished, claims = asyncio.run(run())
+    assert located["id"] == "g1" and located["owner"] == "w1"
+    assert cancelled == ["g1"]
+    assert finished["status"] == "completed" and finished["message_id"] == 42
+    # The owner's cache is stale once the other worker has written to the session
+    assert claims == [False, False, True, True]
+
+
+def test_generations_of_a_lost_worker_are_marked_lost(socket_address):
+    async def run():
+        server = CoordinatorServer(socket_address)
+        await server.start()
+        owner = LocalSocketCoordinator(socket_address, worker_id="w1")
+        other = LocalSocketCoordinator(socket_address, worker_id="w2")
+        await owner.start()
+        await other.start()
+        try:
+            await owner.register_generation("g1", 7)
+            waiter = asyncio.ensure_future(other.wait_generation("g1", timeout=1))
+            await asyncio.sleep(0.01)
+            await owner.stop()
+            return await waiter
+        finally:
+            await other.stop()
+            await server.stop()
+
+    assert asyncio.run(run())["status"] == "lost"
+
+
+def test_unreachable_coordinator_falls_back_to_safe_defaults(socket_address):
+    async def run():
+        coordinator = LocalSocketCoordinator(socket_address, worker_id="w1", timeout=0.1)
+        await coordinator.start()
+        return (
+            await coordinator.claim_session(7),
+            await coordinator.locate_generation("g1", 7),
+            await coordinator.cancel_generation("g1"),
+            coordinator.stats(),
+        )
+
+    stale, located, cancelled, stats = asyncio.run(run())
+    assert stale is True and located is None and cancelled is False
+    assert stats["connected"] is False and stats["errors"] == 3
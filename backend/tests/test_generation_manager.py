@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.services.generation_manager import Generation
+from app.utils.stream_buffer import ReplayUnavailable
+
+
+def _follow(generation, offset=0):
+    async def run():
+        return "".join([text async for text in generation.follow(offset)])
+    return asyncio.run(run())
+
+
+def _generation(parts, buffer_chars=1000):
+    async def build():
+        generation = Generation(session_id=1, user_id=1, buffer_chars=buffer_chars)
+        for part in parts:
+            generation.append(part)
+        generation.finish("completed")
+        return generation
+    return asyncio.run(build())
+
+
+def test_resume_from_an_offset_inside_a_chunk():
+    generation = _generation(["Hello", ", ", "world"])
+    assert _follow(generation) == "Hello, world"
+    assert _follow(generation, 3) == "lo, world"
+    assert _follow(generation, 12) == ""
+
+
+def test_buffer_is_bounded_and_old_offsets_are_refused():
+    generation = _generation(["aaaa", "bbbb", "cccc"], buffer_chars=8)
+    assert _follow(generation, 4) == "bbbbcccc"
+    with pytest.raises(ReplayUnavailable):
+        _follow(generation, 2)
+    with pytest.raises(ReplayUnavailable):
+        _follow(generation, 99)
+
+
+def test_live_followers_see_every_chunk_and_the_error():
+    async def run():
+        generation = Generation(session_id=1, user_id=1, buffer_chars=1000)
+        received = []
+
+        async def reader():
+            async for text in generation.follow():
+                received.append(text)
+
+        task = asyncio.create_task(reader())
+        for part in ("one ", "two ", "three"):
+            generation.append(part)
+            await asyncio.sleep(0)
+        generation.finish("failed", RuntimeError("upstream went away"))
+        with pytest.raises(RuntimeError):
+            await task
+        return "".join(received)
+
+    assert asyncio.run(run()) == "one two three"
@@ -0,0 +1,43 @@
+from app.services.history_cache import SessionHistoryCache
+
+
+def _msg(role, content):
+    return {"role": role, "content": content}
+
+
+def test_append_only_extends_resident_sessions():
+    cache = SessionHistoryCache(max_bytes=1024 * 1024)
+    assert cache.append(1, _msg("user", "hi")) is None
+
+    history = cache.load(1, [_msg("user", "hi")])
+    assert cache.append(1, _msg("assistant", "hello")) is history
+    assert [m["content"] for m in cache.get(1)] == ["hi", "hello"]
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["resident_bytes"] > 0
+
+
+def test_cold_sessions_are_evicted_under_memory_cap():
+    big = "x" * 400
+    probe = SessionHistoryCache(max_bytes=10 ** 6)
+    probe.load(0, [_msg("user", big)])
+    one_session = probe.stats()["resident_bytes"]
+
+    cache = SessionHistoryCache(max_bytes=one_session * 2)
+    cache.load(1, [_msg("user", big)])
+    cache.load(2, [_msg("user", big)])
+    cache.get(1)
+    cache.load(3, [_msg("user", big)])
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.stats()["resident_bytes"] <= one_session * 2
+
+
+def test_oversized_session_is_returned_but_not_retained():
+    cache = SessionHistoryCache(max_bytes=10)
+    history = cache.load(1, [_msg("user", "a long message")])
+    assert history[0]["content"] == "a long message"
+    assert cache.get(1) is None
+    assert cache.stats()["resident_bytes"] == 0
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from app import cli
+from app.services.history_transfer import LineTooLong, split_lines
+
+LONG = "lifetimes outlive the borrow — " * 80
+
+
+async def _collect(chunks, max_line_bytes=64):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+    return [line async for line in split_lines(source(), max_line_bytes)]
+
+
+def test_split_lines_buffers_only_the_partial_line():
+    assert asyncio.run(_collect([b'{"a"', b': 1}\n{"b": 2}\n', b"\n", b'{"c": 3}'])) == [
+        b'{"a": 1}', b'{"b": 2}', b"", b'{"c": 3}'
+    ]
+    # A line trickling in byte by byte, and a newline that opens a chunk
+    assert asyncio.run(_collect([bytes([c]) for c in b"ab\ncd"] + [b"\nef"])) == [b"ab", b"cd", b"ef"]
+    with pytest.raises(LineTooLong):
+        asyncio.run(_collect([b"x" * 40, b"x" * 40]))
+
+
+def test_export_then_import_into_another_account(client, fake_chat, login, converse, flush):
+    source, session_id = fake_chat(ttft_ms=1, tokens_per_sec=0, echo=True)
+    converse(session_id, "héllo 👋")
+    converse(session_id, LONG)
+    flush()
+    login(source)
+
+    response = client.get("/users/me/history/export")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["type"] for r in records] == ["export", "session"] + ["message"] * 4
+    assert records[3]["content"] == "héllo 👋" and records[4]["content"] == LONG
+
+    target, _ = fake_chat()
+    login(target)
+    result = client.post("/users/me/history/import", content=response.content).json()
+    assert (result["sessions"], result["messages"], result["rejected"]) == (1, 4, 0)
+
+    summaries = client.get("/users/me/chat-sessions/summaries").json()["sessions"]
+    imported = next(s for s in summaries if s["message_count"] == 4)
+    messages = client.get(f"/chat/sessions/{imported['id']}/messages").json()
+    assert [m["content"] for m in messages] == [r["content"] for r in records[2:]]
+    assert client.get("/chat/search", params={"q": "outlive"}).json()["results"]
+
+
+def test_import_skips_bad_records_and_keeps_the_rest(client, fake_chat, login):
+    user, _ = fake_chat()
+    login(user)
+    body = "\n".join([
+        json.dumps({"type": "session", "id": "a", "title": "kept"}),
+        "{not json",
+        json.dumps({"type": "message", "session_id": "b", "role": "user", "content": "orphan"}),
+        json.dumps({"type": "message", "session_id": "a", "role": "robot", "content": "bad role"}),
+        json.dumps({"type": "message", "session_id": "a", "role": "user", "content": "fine",
+                    "timestamp": "2024-05-01T10:00:00Z"}),
+        json.dumps({"type": "session", "id": "a"}),
+    ])
+    result = client.post("/users/me/history/import", content=body.encode()).json()
+    assert (result["sessions"], result["messages"], result["rejected"]) == (1, 1, 4)
+    assert [e.split(":")[0] for e in result["errors"]] == ["line 2", "line 3", "line 4", "line 6"]
+    kept = next(s for s in client.get("/users/me/chat-sessions/summaries").json()["sessions"] if s["title"] == "kept")
+    assert kept["preview"] == "fine" and kept["last_activity"].startswith("2024-05-01T10:00:00")
+
+
+def test_cli_exports_a_user(client, fake_chat, tmp_path, capsys, converse, flush):
+    user, session_id = fake_chat(ttft_ms=1, tokens_per_sec=0, echo=True)
+    converse(session_id, "to the file")
+    flush()
+
+    path = tmp_path / "history.ndjson"
+    assert cli.main(["export-history", "--user", user.username, "--output", str(path)]) == 0
+    contents = [json.loads(line)["content"] for line in path.read_text().splitlines()[2:]]
+    assert contents == ["to the file", "to the file"]
+    assert cli.main(["export-history", "--user", "nobody"]) == 1
@@ -0,0 +1,47 @@
+from app.services import llm_client_pool
+from app.services.llm_client_pool import LLMClientRegistry
+
+
+def _registry(monkeypatch, **kwargs):
+    built = []
+
+    def builder(api_key, model, params):
+        built.append((api_key, model))
+        return object()
+
+    monkeypatch.setitem(llm_client_pool.CLIENT_BUILDERS, "test", builder)
+    return LLMClientRegistry(**kwargs), built
+
+
+def test_registry_reuses_clients_for_same_key(monkeypatch):
+    registry, built = _registry(monkeypatch, max_size=4, ttl_seconds=60)
+    first = registry.get("test", "key", "model", {"temperature": 0})
+    second = registry.get("test", "key", "model", {"temperature": 0})
+    other = registry.get("test", "key", "model", {"temperature": 1})
+
+    assert first is second
+    assert other is not first
+    assert len(built) == 2
+    stats = registry.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_registry_evicts_least_recently_used(monkeypatch):
+    registry, built = _registry(monkeypatch, max_size=2, ttl_seconds=60)
+    a = registry.get("test", "a", "model")
+    registry.get("test", "b", "model")
+    registry.get("test", "a", "model")
+    registry.get("test", "c", "model")
+
+    assert registry.get("test", "a", "model") is a
+    registry.get("test", "b", "model")
+    assert len(built) == 4
+    assert registry.stats()["evictions"] == 2
+
+
+def test_registry_expires_entries_after_ttl(monkeypatch):
+    registry, built = _registry(monkeypatch, max_size=2, ttl_seconds=0)
+    registry.get("test", "a", "model")
+    registry.get("test", "a", "model")
+    assert len(built) == 2
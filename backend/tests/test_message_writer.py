@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from app.database import SessionLocal
+from app.models import ChatMessage
+from app.services.message_writer import MessageWriter
+
+
+def _stored(ids):
+    db = SessionLocal()
+    try:
+        return [(m.id, m.role, m.content) for m in db.query(ChatMessage).filter(ChatMessage.id.in_(ids))
+                .order_by(ChatMessage.id)]
+    finally:
+        db.close()
+
+
+def test_concurrent_messages_share_one_commit(client, fake_chat):
+    _, session_id = fake_chat()
+    writer = MessageWriter(flush_interval_ms=1000, max_batch=100)
+
+    async def run():
+        futures = [writer.submit(session_id, "user", f"m{i}") for i in range(5)]
+        # flush() doesn't wait out the interval
+        await asyncio.wait_for(writer.flush(), 0.5)
+        ids = [f.result() for f in futures]
+        await writer.stop()
+        return ids
+
+    ids = client.portal.call(run)
+    assert ids == sorted(ids)
+    assert [content for _, _, content in _stored(ids)] == [f"m{i}" for i in range(5)]
+    stats = writer.stats()
+    assert (stats["commits"], stats["rows"], stats["max_batch_rows"], stats["pending"]) == (1, 5, 5, 0)
+
+
+def test_batches_are_capped_at_max_batch(client, fake_chat):
+    _, session_id = fake_chat()
+    writer = MessageWriter(flush_interval_ms=1000, max_batch=2)
+
+    async def run():
+        for i in range(5):
+            writer.submit(session_id, "user", f"m{i}")
+        await writer.flush()
+        await writer.stop()
+
+    client.portal.call(run)
+    stats = writer.stats()
+    assert (stats["commits"], stats["rows"], stats["max_batch_rows"], stats["last_batch_rows"]) == (3, 5, 2, 1)
+
+
+def test_durable_write_returns_the_committed_id(client, fake_chat):
+    _, session_id = fake_chat()
+    writer = MessageWriter(flush_interval_ms=1, max_batch=100)
+
+    async def run():
+        fire_and_forget = await writer.write(session_id, "user", "later")
+        message_id = await writer.write(session_id, "assistant", "now", durable=True)
+        await writer.stop()
+        return fire_and_forget, message_id
+
+    fire_and_forget, message_id = client.portal.call(run)
+    assert fire_and_forget is None
+    assert _stored([message_id]) == [(message_id, "assistant", "now")]
+
+
+def test_stop_drains_the_queue(client, fake_chat):
+    _, session_id = fake_chat()
+    writer = MessageWriter(flush_interval_ms=60_000, max_batch=100)
+
+    async def run():
+        futures = [writer.submit(session_id, "user", f"m{i}") for i in range(3)]
+        await writer.stop()
+        return [f.result() for f in futures]
+
+    ids = client.portal.call(run)
+    assert len(_stored(ids)) == 3
+
+
+def test_commit_failures_reach_the_callers(client, fake_chat):
+    _, session_id = fake_chat()
+    writer = MessageWriter(flush_interval_ms=1, max_batch=100)
+
+    async def run():
+        # content is NOT NULL, so the whole batch fails
+        doomed = writer.submit(session_id, "user", "fine")
+        with pytest.raises(Exception):
+            await writer.write(session_id, "user", None, token_count=0, durable=True)
+        assert doomed.exception() is not None
+        # The writer keeps going after a failed batch
+        message_id = await writer.write(session_id, "user", "after", durable=True)
+        await writer.stop()
+        return message_id
+
+    message_id = client.portal.call(run)
+    assert _stored([message_id])[0][2] == "after"
+    assert writer.stats()["failed_rows"] == 2
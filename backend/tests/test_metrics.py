@@ -0,0 +1,52 @@
+from sqlalchemy import create_engine, text
+
+from app.services.metrics import DB_QUERY_SECONDS, StreamMeter, TTFT_SECONDS, component_stats_lines, instrument_engine
+from app.utils.metrics import Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("demo_seconds", "Demo", ("provider",), buckets=(0.1, 1))
+    child = histogram.labels("fake")
+    for value in (0.05, 0.1, 0.5, 3):
+        child.observe(value)
+    body = registry.render()
+    assert '# TYPE demo_seconds histogram' in body
+    assert 'demo_seconds_bucket{provider="fake",le="0.1"} 2' in body
+    assert 'demo_seconds_bucket{provider="fake",le="1"} 3' in body
+    assert 'demo_seconds_bucket{provider="fake",le="+Inf"} 4' in body
+    assert 'demo_seconds_count{provider="fake"} 4' in body
+    assert 'demo_seconds_sum{provider="fake"} 3.65' in body
+
+
+def test_counter_gauge_and_label_escaping():
+    registry = Registry()
+    registry.counter("demo_total", "Demo").inc(2)
+    gauge = registry.gauge("demo_open", "Demo", ("endpoint",))
+    gauge.labels('a"b').inc()
+    body = registry.render()
+    assert "demo_total 2" in body
+    assert 'demo_open{endpoint="a\\"b"} 1' in body
+
+
+def test_stream_meter_records_ttft():
+    before = TTFT_SECONDS.labels("fake", "meter-test").counts[:]
+    meter = StreamMeter("fake", "meter-test", started=0)
+    meter.token()
+    meter.finish()
+    assert sum(TTFT_SECONDS.labels("fake", "meter-test").counts) == sum(before) + 1
+
+
+def test_engine_statements_are_timed():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "test")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert sum(DB_QUERY_SECONDS.labels("test", "SELECT").counts) >= 1
+
+
+def test_component_stats_keep_numeric_values():
+    lines = list(component_stats_lines({"cache": {"hits": 3, "enabled": True, "name": "x", "ratio": 0.5}}))
+    assert "unichat_cache_hits 3" in lines
+    assert "unichat_cache_ratio 0.5" in lines
+    assert not any("enabled" in line or "name" in line for line in lines)
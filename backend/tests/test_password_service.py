@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.password_service import PasswordHasher, PasswordPoolOverloaded
+
+
+def test_rejects_work_beyond_pool_capacity():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+
+    async def run():
+        slow = [asyncio.ensure_future(hasher._run(time.sleep, 0.1)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordPoolOverloaded):
+            await hasher._run(time.sleep, 0)
+        await asyncio.gather(*slow)
+
+    asyncio.run(run())
+    hasher.shutdown()
+    stats = hasher.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["outstanding"] == 0
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.services.fake_provider import FakeProviderError
+from app.services.llm_client_pool import client_registry, get_llm_client, resolve_llm_config
+from app.services.provider_router import ProviderRouter, percentile
+
+
+def _fake(model, **options):
+    return resolve_llm_config({"provider": "fake", "model_name": model, "provider_options": options})
+
+
+def _router(default_delay=0.05):
+    return ProviderRouter(hedge_percentile=95, min_samples=3, default_hedge_delay=default_delay, window=50)
+
+
+def _collect(router, candidates, outcome=None):
+    async def run():
+        return "".join([token async for token in router.stream(candidates, outcome)])
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def _fresh_clients():
+    client_registry.clear()
+    yield
+    client_registry.clear()
+
+
+def test_percentile_nearest_rank():
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 95) == 4
+    assert percentile([7], 99) == 7
+
+
+def test_fast_primary_is_not_hedged():
+    router = _router()
+    primary = _fake("fast", ttft_ms=5, tokens_per_sec=0, response="from primary")
+    fallback = _fake("backup", ttft_ms=5, tokens_per_sec=0, response="from fallback")
+    outcome = {}
+    assert _collect(router, [(primary, []), (fallback, [])], outcome) == "from primary"
+    assert outcome["config"] is primary
+    assert router.hedges == 0
+    assert get_llm_client(fallback).started == 0
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    router = _router(default_delay=0.05)
+    primary = _fake("slow", ttft_ms=1000, tokens_per_sec=0, response="from primary")
+    fallback = _fake("backup", ttft_ms=5, tokens_per_sec=0, response="from fallback")
+    outcome = {}
+    assert _collect(router, [(primary, []), (fallback, [])], outcome) == "from fallback"
+    assert outcome["config"] is fallback
+    assert router.hedges == 1 and router.hedge_wins == 1
+    assert get_llm_client(primary).cancelled == 1
+
+
+def test_error_before_first_token_fails_over():
+    router = _router(default_delay=10)
+    primary = _fake("broken", ttft_ms=1, error_rate=1, status_code=503)
+    fallback = _fake("backup", ttft_ms=1, tokens_per_sec=0, response="recovered")
+    assert _collect(router, [(primary, []), (fallback, [])]) == "recovered"
+    assert router.failovers == 1
+    assert router.stats()["providers"]["fake/broken"]["errors"] == 1
+
+
+def test_all_candidates_failing_raises_the_last_error():
+    router = _router()
+    with pytest.raises(FakeProviderError):
+        _collect(router, [(_fake("a", error_rate=1), []), (_fake("b", error_rate=1), [])])
+
+
+def test_hedge_delay_follows_observed_ttft():
+    router = _router(default_delay=5)
+    primary = _fake("steady", ttft_ms=10, tokens_per_sec=0, response="ok")
+    assert router.hedge_delay(primary) == 5
+    for _ in range(3):
+        _collect(router, [(primary, [])])
+    assert 0.005 < router.hedge_delay(primary) < 1
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.services.llm_client_pool import resolve_llm_config
+from app.services.response_cache import ResponseCache, request_fingerprint, replay
+
+
+def _config(**overrides):
+    return resolve_llm_config({"api_key": "k", "model_name": "m", "temperature": 0, **overrides})
+
+
+def test_fingerprint_normalizes_whitespace():
+    a = request_fingerprint([{"role": "user", "content": "Hi there "}], _config())
+    b = request_fingerprint([{"role": "User", "content": " Hi there"}], _config())
+    assert a == b
+
+
+def test_fingerprint_is_scoped_to_the_api_key():
+    a = request_fingerprint([{"role": "user", "content": "Hi"}], _config())
+    assert a != request_fingerprint([{"role": "user", "content": "Hi"}], _config(api_key="other"))
+
+
+def test_fingerprint_changes_with_model_params_and_history():
+    base = request_fingerprint([{"role": "user", "content": "Hi"}], _config())
+    assert base != request_fingerprint([{"role": "user", "content": "Hi"}], _config(model_name="other"))
+    assert base != request_fingerprint([{"role": "user", "content": "Hi"}], _config(max_tokens=10))
+    assert base != request_fingerprint(
+        [{"role": "assistant", "content": "Hello"}, {"role": "user", "content": "Hi"}], _config()
+    )
+
+
+def test_replay_reassembles_the_cached_text():
+    text = "  Paris is\nthe capital.  "
+
+    async def collect():
+        return [piece async for piece in replay(text)]
+
+    pieces = asyncio.run(collect())
+    assert "".join(pieces) == text
+    assert len(pieces) > 1
+
+
+def test_restoring_renews_the_ttl_and_stores_sweep_expired_rows(client):
+    cache = ResponseCache(max_entries=10, ttl_seconds=60)
+
+    def age(key, seconds):
+        db = SessionLocal()
+        try:
+            db.execute(text("UPDATE response_cache SET created_at = :t WHERE key = :k"),
+                       {"t": datetime.now(timezone.utc) - timedelta(seconds=seconds), "k": key})
+            db.commit()
+        finally:
+            db.close()
+
+    def keys():
+        db = SessionLocal()
+        try:
+            return {row[0] for row in db.execute(text("SELECT key FROM response_cache WHERE key LIKE 'ttl-%'"))}
+        finally:
+            db.close()
+
+    async def store(key, answer):
+        cache.put(key, "m", answer)
+        await cache.drain()
+
+    async def lookup(key):
+        cache.memory.clear()
+        return await cache.get(key)
+
+    client.portal.call(store, "ttl-a", "first")
+    client.portal.call(store, "ttl-b", "other")
+    age("ttl-a", 120)
+    age("ttl-b", 120)
+    assert client.portal.call(lookup, "ttl-a") is None
+
+    # Storing again restarts the TTL; the sweep already ran, so ttl-b is still there
+    client.portal.call(store, "ttl-a", "second")
+    assert client.portal.call(lookup, "ttl-a") == "second"
+    assert keys() == {"ttl-a", "ttl-b"}
+
+    cache._next_sweep = 0
+    client.portal.call(store, "ttl-c", "third")
+    assert keys() == {"ttl-a", "ttl-c"}
+    assert cache.stats()["expired_deleted"] == 1
@@ -0,0 +1,92 @@
+from sqlalchemy import text
+
+from app import cli
+from app.database import SessionLocal
+from app.services.search_index import FTS_TABLE, highlight_snippet, match_query
+
+
+def test_match_query_quotes_every_term():
+    assert match_query('tokio "runtime" OR sched*') == '"tokio" "runtime" "OR" "sched"*'
+    assert match_query("(*&^") is None
+
+
+def test_scope_tokens_are_not_searchable(client, fake_chat, login, converse, flush):
+    user, session_id = fake_chat(ttft_ms=1, tokens_per_sec=0, echo=True)
+    converse(session_id, "nothing to see here")
+    flush()
+    login(user)
+    for q in (f"u{user.id}", f"s{session_id}", "scope"):
+        assert client.get("/chat/search", params={"q": q}).json()["results"] == []
+    assert client.get("/chat/search", params={"q": "nothing"}).json()["results"]
+
+
+def test_snippets_mark_matches_in_the_best_window():
+    text = "Intro words here. " + "filler " * 30 + "The Café serves rusty tools and rust removers. " + "tail " * 30
+    snippet = highlight_snippet(text, [("cafe", False), ("rust", True)], "[", "]", 8)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "[Café]" in snippet and "[rusty]" in snippet and "[rust]" in snippet
+    assert highlight_snippet("rust is fine", [("rust", False)], "[", "]", 8) == "[rust] is fine"
+
+
+def test_migration_makes_an_old_index_contentless(tmp_path):
+    from sqlalchemy import create_engine
+    from app.migrations import _chat_messages_fts_contentless
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(content, scope, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE} (rowid, content, scope) VALUES (7, 'quokka island', 'u1 s2')"))
+        _chat_messages_fts_contentless(conn)
+    with engine.connect() as conn:
+        assert "content = ''" in conn.execute(text(f"SELECT sql FROM sqlite_master WHERE name = '{FTS_TABLE}'")).scalar()
+        assert conn.execute(text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'quokka'")).all() == [(7,)]
+    engine.dispose()
+
+
+def test_search_ranks_highlights_and_pages(client, fake_chat, login, converse, flush):
+    user, session_id = fake_chat(ttft_ms=1, tokens_per_sec=0, echo=True)
+    _, other_session = fake_chat(ttft_ms=1, tokens_per_sec=0, echo=True)
+    for question in ["how do lifetimes work in rust", "rust borrow checker and lifetimes", "python generators"]:
+        converse(session_id, question)
+    converse(other_session, "rust lifetimes from someone else")
+    flush()
+    login(user)
+
+    response = client.get("/chat/search", params={"q": "rust lifetimes", "limit": 3}).json()
+    hits = response["results"]
+    # Each question is stored twice (user message and its echo); the stranger's session never shows up
+    assert len(hits) == 3 and response["next_offset"] == 3
+    assert {hit["session_id"] for hit in hits} == {session_id}
+    assert "<mark>rust</mark>" in hits[0]["snippet"] and "<mark>lifetimes</mark>" in hits[0]["snippet"]
+    assert hits == sorted(hits, key=lambda hit: hit["rank"])
+
+    rest = client.get("/chat/search", params={"q": "rust lifetimes", "limit": 3, "offset": 3}).json()
+    assert len(rest["results"]) == 1 and rest["next_offset"] is None
+
+    assert client.get("/chat/search", params={"q": "gener*"}).json()["results"][0]["role"] in ("user", "assistant")
+    assert client.get("/chat/search", params={"q": "rust", "session_id": other_session}).json()["results"] == []
+    assert client.get("/chat/search", params={"q": "?!"}).json() == {"results": [], "next_offset": None}
+
+
+def test_backfill_indexes_existing_messages(client, fake_chat, login, capsys, converse, flush):
+    user, session_id = fake_chat(ttft_ms=1, tokens_per_sec=0, echo=True)
+    converse(session_id, "quokka sightings")
+    flush()
+    login(user)
+
+    db = SessionLocal()
+    try:
+        db.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('delete-all')"))
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/chat/search", params={"q": "quokka"}).json()["results"] == []
+
+    assert cli.main(["backfill-search", "--batch-size", "2"]) == 0
+    assert "Search index backfill complete" in capsys.readouterr().out
+    assert len(client.get("/chat/search", params={"q": "quokka"}).json()["results"]) == 2
+    # Running it again finds nothing left to add
+    assert cli.main(["backfill-search"]) == 0
+    assert "0 messages added" in capsys.readouterr().out
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app import crud
+from app.database import SessionLocal, engine
+from app.migrations import _chat_sessions_activity
+from app.models import ChatMessage, ChatSession
+from app.schemas import ChatMessageCreate
+
+
+def _add_sessions(user, count):
+    db = SessionLocal()
+    try:
+        config_id = db.query(ChatSession).filter(ChatSession.user_id == user.id).first().llm_config_id
+        sessions = [ChatSession(user_id=user.id, llm_config_id=config_id, title=f"extra {i}") for i in range(count)]
+        db.add_all(sessions)
+        db.commit()
+        return [s.id for s in sessions]
+    finally:
+        db.close()
+
+
+def _say(session_id, *contents):
+    db = SessionLocal()
+    try:
+        for content in contents:
+            crud.create_chat_message(db, ChatMessageCreate(role="user", content=content), session_id)
+    finally:
+        db.close()
+
+
+def test_sessions_are_listed_by_activity_with_counts_and_previews(client, fake_chat, login):
+    user, first = fake_chat()
+    second, third = _add_sessions(user, 2)
+    _say(first, "hello", "a question about   keyset\npagination that goes on for quite a while")
+    _say(second, "only one")
+    login(user)
+
+    page = client.get("/users/me/chat-sessions/summaries", params={"limit": 2, "preview_chars": 20}).json()
+    assert [s["id"] for s in page["sessions"]] == [second, first]
+    assert [s["message_count"] for s in page["sessions"]] == [1, 2]
+    assert page["sessions"][0]["preview"] == "only one"
+    assert page["sessions"][1]["preview"] == "a question about ke…"
+
+    rest = client.get("/users/me/chat-sessions/summaries",
+                      params={"limit": 2, "preview_chars": 20, "cursor": page["next_cursor"]}).json()
+    assert rest["next_cursor"] is None
+    [quiet] = rest["sessions"]
+    assert quiet["id"] == third and quiet["message_count"] == 0 and quiet["preview"] == ""
+
+    # A new message moves its session to the top
+    _say(first, "back again")
+    top = client.get("/users/me/chat-sessions/summaries", params={"limit": 1}).json()["sessions"][0]
+    assert top["id"] == first and top["message_count"] == 3 and top["preview"] == "back again"
+
+    assert client.get("/users/me/chat-sessions/summaries", params={"cursor": "nope"}).status_code == 400
+
+
+def test_messages_from_the_websocket_update_the_session(client, fake_chat, login, converse, flush):
+    user, session_id = fake_chat(ttft_ms=1, tokens_per_sec=0, response="pong")
+    converse(session_id, "ping")
+    flush()
+    login(user)
+
+    [summary] = client.get("/users/me/chat-sessions/summaries").json()["sessions"]
+    assert summary["message_count"] == 2 and summary["preview"] == "pong"
+
+
+def test_late_batches_with_older_messages_never_move_activity_back(client, fake_chat):
+    _, session_id = fake_chat()
+    _say(session_id, "now")
+    db = SessionLocal()
+    try:
+        current = db.get(ChatSession, session_id).last_activity
+        late = ChatMessage(session_id=session_id, timestamp=current - timedelta(minutes=5))
+        crud.record_session_activity(db, [late])
+        db.commit()
+        session = db.get(ChatSession, session_id)
+        assert session.last_activity == current and session.message_count == 2
+
+        crud.record_session_activity(db, [ChatMessage(session_id=session_id, timestamp=current + timedelta(minutes=5))])
+        db.commit()
+        db.expire_all()
+        assert db.get(ChatSession, session_id).last_activity == current + timedelta(minutes=5)
+    finally:
+        db.close()
+
+
+def test_listing_query_walks_the_activity_index():
+    query = crud._session_summaries_query(1, 20, (datetime(2026, 1, 1), 5))
+    sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    # Pages come straight off the index; the preview subquery reads the message index
+    assert "ix_chat_sessions_user_id_last_activity" in plan and "TEMP B-TREE" not in plan
+    assert "ix_chat_messages_session_id_timestamp" in plan
+
+
+def test_migration_backfills_activity_from_messages(client, fake_chat):
+    user, session_id = fake_chat()
+    _say(session_id, "one", "two")
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE chat_sessions SET last_activity = NULL, message_count = 0 WHERE id = :id"),
+                     {"id": session_id})
+        _chat_sessions_activity(conn)
+
+    db = SessionLocal()
+    try:
+        rows, _ = crud.get_user_session_summaries(db, user.id)
+    finally:
+        db.close()
+    assert rows[0]["message_count"] == 2 and rows[0]["last_activity"] is not None
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def _upstream(calls, parts=("Hello", " ", "world"), delay=0.01, error=None):
+    async def factory(outcome):
+        calls.append(1)
+        outcome["config"] = "primary"
+        for part in parts:
+            await asyncio.sleep(delay)
+            yield part
+        if error is not None:
+            raise error
+    return factory
+
+
+async def _collect(flight, key, factory, outcome=None):
+    return "".join([text async for text in flight.stream(key, factory, outcome)])
+
+
+def test_concurrent_identical_requests_share_one_upstream():
+    flight = SingleFlight(buffer_chars=1000)
+    calls = []
+
+    async def run():
+        factory = _upstream(calls)
+        leader_outcome, follower_outcome = {}, {}
+        leader = asyncio.create_task(_collect(flight, "k", factory, leader_outcome))
+        await asyncio.sleep(0.015)  # join after the first chunk
+        follower = await _collect(flight, "k", factory, follower_outcome)
+        return await leader, follower, leader_outcome, follower_outcome
+
+    leader, follower, leader_outcome, follower_outcome = asyncio.run(run())
+    assert leader == follower == "Hello world"
+    assert calls == [1]
+    assert leader_outcome == {"config": "primary"} and follower_outcome == {}
+    stats = flight.stats()
+    assert stats["upstream_calls_saved"] == 1 and stats["late_joins"] == 1 and stats["in_flight"] == 0
+
+
+def test_sequential_requests_are_not_merged():
+    flight = SingleFlight(buffer_chars=1000)
+    calls = []
+
+    async def run():
+        await _collect(flight, "k", _upstream(calls))
+        await _collect(flight, "k", _upstream(calls))
+
+    asyncio.run(run())
+    assert calls == [1, 1]
+
+
+def test_errors_reach_every_subscriber():
+    flight = SingleFlight(buffer_chars=1000)
+    calls = []
+
+    async def run():
+        factory = _upstream(calls, error=RuntimeError("boom"))
+        return await asyncio.gather(
+            _collect(flight, "k", factory), _collect(flight, "k", factory), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert calls == [1]
+
+
+def test_only_the_last_subscriber_to_leave_cancels_upstream():
+    flight = SingleFlight(buffer_chars=1000)
+    calls = []
+
+    async def run():
+        factory = _upstream(calls, parts=["a"] * 100)
+        first_outcome, last_outcome = {}, {}
+        first = asyncio.create_task(_collect(flight, "k", factory, first_outcome))
+        last = asyncio.create_task(_collect(flight, "k", factory, last_outcome))
+        await asyncio.sleep(0.03)
+        first.cancel()
+        await asyncio.wait({first})
+        shared = dict(first_outcome)
+        last.cancel()
+        await asyncio.wait({last})
+        return shared, last_outcome
+
+    shared, last_outcome = asyncio.run(run())
+    assert "upstream_cancelled" not in shared
+    assert last_outcome["upstream_cancelled"] is True
+    assert calls == [1]
+
+def test_upstream_is_cancelled_when_everyone_leaves():
+    flight = SingleFlight(buffer_chars=1000)
+    calls = []
+
+    async def run():
+        stream = flight.stream("k", _upstream(calls, parts=["a"] * 100))
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        await asyncio.sleep(0.02)
+        return flight.stats()
+
+    stats = asyncio.run(run())
+    assert stats["abandoned"] == 1 and stats["in_flight"] == 0
+
+
+def test_disabled_layer_passes_through():
+    flight = SingleFlight(buffer_chars=1000, enabled=False)
+    calls = []
+
+    async def run():
+        factory = _upstream(calls)
+        await asyncio.gather(_collect(flight, "k", factory), _collect(flight, "k", factory))
+
+    asyncio.run(run())
+    assert calls == [1, 1]
+
+
+def test_identical_chat_requests_reach_the_provider_once():
+    from app.services.langchain_service import process_query_stream
+    from app.services.llm_client_pool import client_registry, get_llm_client
+
+    llm_config = {
+        "provider": "fake", "api_key": "", "model_name": "fake-sf", "temperature": 0.0,
+        "provider_options": {"ttft_ms": 20, "tokens_per_sec": 200, "response": "one two three"},
+    }
+    messages = [{"role": "user", "content": "same question"}]
+
+    async def ask():
+        return "".join([text async for text in process_query_stream(messages, llm_config)])
+
+    async def run():
+        return await asyncio.gather(ask(), ask(), ask())
+
+    client_registry.clear()
+    answers = asyncio.run(run())
+    assert answers == ["one two three"] * 3
+    assert get_llm_client(llm_config).started == 1
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from app.database import SessionLocal
+from app.models import ChatMessage
+from app.services.sse import generation_events, parse_event_id
+
+
+def _events(response, limit=None):
+    """(id, data) pairs and comment lines of an SSE response, until the end/error event or ``limit`` tokens"""
+    events, event_id, tokens = [], None, 0
+    for line in response.iter_lines():
+        if line.startswith("id: "):
+            event_id = line[4:]
+        elif line.startswith("data: "):
+            data = json.loads(line[6:])
+            events.append((event_id, data))
+            event_id = None
+            tokens += "token" in data
+            if data.get("end") or "error" in data or (limit is not None and tokens >= limit):
+                return events
+        elif line.startswith(":"):
+            events.append((None, line))
+    return events
+
+
+def _text(events):
+    return "".join(data["token"] for _, data in events if isinstance(data, dict) and "token" in data)
+
+
+def test_parse_event_id():
+    assert parse_event_id("a1b2:17") == ("a1b2", 17)
+    for bad in ("17", "abc:", "abc:-1", ":3"):
+        with pytest.raises(ValueError):
+            parse_event_id(bad)
+
+
+def test_post_streams_the_socket_frames_and_persists(client, fake_chat, login, flush):
+    user, session_id = fake_chat(ttft_ms=1, tokens_per_sec=500, response="Paris is the capital.")
+    login(user)
+    with client.stream("POST", f"/chat/sessions/{session_id}/stream", json={"message": "Capital of France?"}) as r:
+        assert r.headers["content-type"].startswith("text/event-stream")
+        events = _events(r)
+
+    first_id, first = events[0]
+    assert first["offset"] == 0 and first_id == f"{first['generation_id']}:0"
+    assert _text(events) == "Paris is the capital."
+    # Every token event id records how much of the answer the client has
+    offsets = [int(event_id.rsplit(":", 1)[1]) for event_id, data in events if "token" in data]
+    assert offsets == sorted(offsets) and offsets[-1] == len("Paris is the capital.")
+    assert events[-1][1] == {"end": True, "generation_id": first["generation_id"], "length": offsets[-1]}
+
+    flush()
+    db = SessionLocal()
+    try:
+        stored = [(m.role, m.content) for m in db.query(ChatMessage).filter(ChatMessage.session_id == session_id)]
+    finally:
+        db.close()
+    assert stored == [("user", "Capital of France?"), ("assistant", "Paris is the capital.")]
+
+
+def test_reconnect_with_last_event_id_continues_the_same_generation(client, fake_chat, login):
+    answer = " ".join(f"word{i}" for i in range(40))
+    user, session_id = fake_chat(ttft_ms=1, tokens_per_sec=400, response=answer)
+    login(user)
+    url = f"/chat/sessions/{session_id}/stream"
+    with client.stream("POST", url, json={"message": "go"}) as r:
+        events = _events(r, limit=5)
+    last_id = [event_id for event_id, data in events if event_id][-1]
+
+    # A browser's EventSource reconnects with GET and the Last-Event-ID header
+    with client.stream("GET", url, headers={"Last-Event-ID": last_id}) as r:
+        rest = _events(r)
+    assert rest[0][1]["generation_id"] == last_id.split(":")[0]
+    assert _text(events) + _text(rest) == answer
+
+    with client.stream("GET", url, params={"generation_id": last_id.split(":")[0], "offset": 0}) as r:
+        assert _text(_events(r)) == answer
+
+
+def test_upstream_failure_ends_the_stream_with_an_error(client, fake_chat, login):
+    user, session_id = fake_chat(ttft_ms=1, error_rate=1)
+    login(user)
+    with client.stream("POST", f"/chat/sessions/{session_id}/stream", json={"message": "hello"}) as r:
+        events = _events(r)
+    generation_id = events[0][1]["generation_id"]
+    assert events[-1][1] == {"error": "Injected fake provider error", "generation_id": generation_id}
+
+
+def test_stream_rejects_bad_requests(client, fake_chat, login):
+    user, session_id = fake_chat()
+    _, other_session = fake_chat()
+    login(user)
+    url = f"/chat/sessions/{session_id}/stream"
+    assert client.get(url).status_code == 400
+    assert client.post(url, json={"message": ""}).status_code == 400
+    assert client.get(url, headers={"Last-Event-ID": "garbage"}).status_code == 400
+    assert client.get(url, headers={"Last-Event-ID": "nope:0"}).status_code == 404
+    assert client.post(f"/chat/sessions/{other_session}/stream", json={"message": "hi"}).status_code == 404
+
+
+def test_slow_reader_is_held_back_and_idle_streams_get_heartbeats(client, fake_chat):
+    _, session_id = fake_chat()
+
+    async def run():
+        from app.services.generation_manager import generation_manager
+        from app.services.sse import sse_stats
+        generation = generation_manager.start(
+            session_id, 0, [{"role": "user", "content": "x"}],
+            {"provider": "fake", "model_name": "fake", "api_key": "",
+             "provider_options": {"ttft_ms": 60, "tokens_per_sec": 100, "response": "one two three four five six"}},
+        )
+        stalls = sse_stats.stalls
+        events = generation_events(generation, heartbeat=0.02, queue_frames=1)
+        head = [await events.__anext__()]
+        while not head[-1].startswith(":"):
+            # Admission may report a queue position first
+            head.append(await events.__anext__())
+        await generation.task
+        # The answer finished while this reader was not consuming: its queue held one frame and
+        # the rest waited in the generation's buffer, to be read back in one piece
+        await asyncio.sleep(0.01)
+        rest = [event async for event in events]
+        return head, rest, sse_stats.stalls - stalls
+
+    head, rest, stalls = client.portal.call(run)
+    assert head[0].startswith("retry: ") and head[-1] == ": keep-alive\n\n"
+    tokens = [json.loads(e.split("data: ", 1)[1])["token"] for e in rest if '"token"' in e]
+    assert "".join(tokens) == "one two three four five six" and '"end":true' in rest[-1]
+    assert len(tokens) <= 3
+    assert stalls >= 1
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+from app.models import Base, User
+from app.storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    path = tmp_path / "storage.db"
+    storage = Storage(f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}", profile="tuned", reader_pool_size=2)
+    Base.metadata.create_all(bind=storage.sync_writer)
+    yield storage
+    asyncio.run(storage.dispose())
+
+
+def test_reads_use_the_reader_pool_until_the_transaction_writes(storage):
+    db = storage.SessionLocal()
+    try:
+        assert db.get_bind(clause=select(User)) is storage.sync_reader
+        db.add(User(username="a", email="a@example.com", password_hash="x"))
+        db.flush()
+        # Uncommitted rows are only visible on the writer, so the transaction stays there
+        assert db.get_bind(clause=select(User)) is storage.sync_writer
+        assert db.query(User).count() == 1
+        db.commit()
+        assert db.get_bind(clause=select(User)) is storage.sync_reader
+        assert db.query(User).count() == 1
+    finally:
+        db.close()
+
+
+def test_reader_connections_are_read_only(storage):
+    with storage.sync_reader.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO users (username, email, password_hash) VALUES ('b', 'b', 'x')"))
+
+
+def test_tuned_pragmas_and_single_writer(storage):
+    with storage.sync_writer.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+    assert storage.sync_writer.pool.size() == 1 and storage.sync_writer.pool._max_overflow == 0
+
+
+def test_async_sessions_route_and_count_pool_checkouts(storage):
+    async def run():
+        async with storage.AsyncSessionLocal() as db:
+            db.add(User(username="c", email="c@example.com", password_hash="x"))
+            await db.commit()
+            return (await db.execute(select(User))).scalars().all()
+
+    users = asyncio.run(run())
+    pools = storage.stats()["pools"]
+    assert [u.username for u in users] == ["c"]
+    assert pools["async_writer"]["checkouts"] == 1 and pools["async_reader"]["checkouts"] == 1
+
+
+def test_basic_profile_shares_one_pool(tmp_path):
+    path = tmp_path / "basic.db"
+    storage = Storage(f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}", profile="basic")
+    assert storage.sync_reader is storage.sync_writer and not storage.split
+    asyncio.run(storage.dispose())
@@ -0,0 +1,32 @@
+import asyncio
+
+from app.services.stream_coalescer import coalesce
+
+
+async def _chunks(items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+def _collect(agen):
+    async def run():
+        return [frame async for frame in agen]
+    return asyncio.run(run())
+
+
+def test_flushes_when_byte_limit_is_reached():
+    frames = _collect(coalesce(_chunks(["ab", "cd", "ef", "g"]), max_bytes=4, max_ms=1000))
+    assert frames == ["abcd", "efg"]
+
+
+def test_flushes_when_time_limit_expires():
+    frames = _collect(coalesce(_chunks(["a", "b", "c"], delay=0.05), max_bytes=1024, max_ms=10))
+    assert "".join(frames) == "abc"
+    assert len(frames) == 3
+
+
+def test_preserves_content_and_skips_empty_chunks():
+    frames = _collect(coalesce(_chunks(["", "hello", "", " world"]), max_bytes=1024, max_ms=1000))
+    assert frames == ["hello world"]
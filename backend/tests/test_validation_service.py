@@ -0,0 +1,72 @@
+import asyncio
+
+import httpx
+
+from app.services import validation_service
+
+
+def _validate(monkeypatch, handler, api_key, model="llama3-8b-8192"):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(validation_service, "_http_client", lambda: client)
+
+    async def run():
+        try:
+            return await validation_service.validate_groq_api_key(api_key, model)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_valid_key_is_probed_once_then_cached(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        assert request.headers["Authorization"] == "Bearer good-key"
+        return httpx.Response(200, json={"data": [{"id": "llama3-8b-8192"}]})
+
+    first = _validate(monkeypatch, handler, "good-key")
+    second = _validate(monkeypatch, handler, "good-key")
+
+    assert first["valid"] and second["valid"]
+    assert second["cached"] is True
+    assert len(calls) == 1
+
+
+def test_rejected_key_and_missing_model(monkeypatch):
+    result = _validate(monkeypatch, lambda request: httpx.Response(401), "bad-key")
+    assert result == {
+        "valid": False,
+        "message": "Invalid API key. Please check your GROQ API key and try again.",
+        "error_type": "authentication",
+    }
+
+    result = _validate(monkeypatch, lambda request: httpx.Response(200, json={"data": []}), "other-key")
+    assert result["error_type"] == "model_access"
+
+
+def test_rate_limits_are_not_cached(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429)
+
+    _validate(monkeypatch, handler, "busy-key")
+    result = _validate(monkeypatch, handler, "busy-key")
+    assert result["error_type"] == "quota"
+    assert len(calls) == 2
+
+
+def test_unreadable_model_list_is_not_cached(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, text="<html>gateway</html>")
+
+    _validate(monkeypatch, handler, "proxied-key")
+    result = _validate(monkeypatch, handler, "proxied-key")
+    assert result["valid"] is False and result["error_type"] == "unknown"
+    assert len(calls) == 2